@@ -0,0 +1,90 @@
+"""
+Benchmark de /admin/products: lista JSON completa vs. streaming NDJSON.
+
+Mide tiempo hasta el primer byte, tiempo total, consultas SQL y memoria
+máxima (tracemalloc) de cada modo con N productos en la plataforma.
+
+Uso (desde la carpeta backend):
+    python bench/bench_admin_stream.py
+    DATABASE_URL=postgresql://... python bench/bench_admin_stream.py 100000 300000
+"""
+import sys
+import time
+import tracemalloc
+
+from common import setup
+setup()
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import event, insert
+
+from src.database import engine, Base, SessionLocal
+from src.migrations import run_migrations
+from src.models import User, Product
+from src.admin_streams import stream_ndjson, product_row, with_owner
+
+CHUNK = 20000
+OWNERS = 500
+
+def seed(db, owner_ids, start, end):
+    for offset in range(start, end, CHUNK):
+        db.execute(insert(Product), [
+            {"barcode": f"B{i}", "name": f"Producto {i}", "stock": i % 50,
+             "cost_price": 100, "sale_price": 150, "user_id": owner_ids[i % len(owner_ids)]}
+            for i in range(offset, min(offset + CHUNK, end))
+        ])
+        db.commit()
+
+def measure(fn):
+    counter = {"n": 0}
+    def _count(*args):
+        counter["n"] += 1
+    event.listen(engine, "before_cursor_execute", _count)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    first_byte = fn(t0)
+    total = (time.perf_counter() - t0) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    event.remove(engine, "before_cursor_execute", _count)
+    return first_byte, total, counter["n"], peak / 1024 / 1024
+
+def json_mode(t0):
+    # Igual que la ruta format=json sin limit: lista completa y luego serializa
+    db = SessionLocal()
+    try:
+        rows = [product_row(p) for p in with_owner(db.query(Product)).order_by(Product.id).all()]
+        body = jsonable_encoder(rows)
+        return (time.perf_counter() - t0) * 1000 if body is not None else 0
+    finally:
+        db.close()
+
+def ndjson_mode(t0):
+    first_byte = None
+    for _ in stream_ndjson(lambda db: with_owner(db.query(Product)).order_by(Product.id), product_row):
+        if first_byte is None:
+            first_byte = (time.perf_counter() - t0) * 1000
+    return first_byte
+
+def run(sizes):
+    Base.metadata.drop_all(bind=engine)
+    run_migrations(engine)
+    db = SessionLocal()
+    owners = [User(email=f"u{i}@local", hashed_password="x", first_name="U", last_name=str(i)) for i in range(OWNERS)]
+    db.add_all(owners)
+    db.commit()
+    owner_ids = [u.id for u in owners]
+
+    seeded = 0
+    print(f"{'productos':>10} {'modo':>7} {'1er byte':>10} {'total':>10} {'consultas':>10} {'memoria':>10}")
+    for size in sizes:
+        seed(db, owner_ids, seeded, size)
+        seeded = size
+        for name, fn in (("json", json_mode), ("ndjson", ndjson_mode)):
+            first_byte, total, queries, peak = measure(fn)
+            print(f"{size:>10} {name:>7} {first_byte:>8.0f}ms {total:>8.0f}ms {queries:>10} {peak:>8.1f}MB")
+    db.close()
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [10000, 50000]
+    run(sizes)
@@ -0,0 +1,108 @@
+"""
+Verifica que las llamadas a la IA no bloqueen el event loop.
+
+Usa un cliente Gemini falso (local, sin red) que tarda AI_FAKE_LATENCY
+segundos en responder. Mientras hay varias llamadas de IA en curso se mide
+la latencia de GET /products autenticado (pasa por la auth, el control de
+admisión y la base); debe mantenerse en milisegundos.
+
+Uso (desde la carpeta backend):
+    python bench/bench_ai_event_loop.py
+"""
+import os
+import time
+import asyncio
+
+from common import setup
+setup()
+
+import httpx
+
+from src import ai
+from src.main import app
+from src.database import engine
+from src.migrations import run_migrations
+
+AI_FAKE_LATENCY = float(os.getenv("AI_FAKE_LATENCY", "1.0"))
+
+class _FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class _FakeModel:
+    def __init__(self, name):
+        self.name = name
+        self.supported_generation_methods = ["generateContent"]
+
+class _FakePager:
+    def __init__(self, items):
+        self._items = list(items)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._items:
+            raise StopAsyncIteration
+        return self._items.pop(0)
+
+class _FakeAsyncModels:
+    async def generate_content(self, model, contents, config=None):
+        await asyncio.sleep(AI_FAKE_LATENCY)
+        return _FakeResponse(f"respuesta de {model}")
+
+    async def list(self, config=None):
+        return _FakePager(_FakeModel(ai._normalize_model_id(m)) for m in ai.PREFERRED_MODELS)
+
+class _FakeAio:
+    models = _FakeAsyncModels()
+
+class FakeClient:
+    aio = _FakeAio()
+
+async def login(http) -> dict:
+    await http.post("/register", json=dict(email="ai-bench@local", password="x", first_name="A", last_name="I", phone="1", address="-"))
+    token = (await http.post("/login", json=dict(email="ai-bench@local", password="x"))).json()["access_token"]
+    headers = {"Authorization": "Bearer " + token}
+    for i in range(20):
+        await http.post("/products", headers=headers, json=dict(
+            barcode=f"AI{i}", name=f"Producto {i}", stock=10, cost_price=100, gain=0.3, sale_price=150))
+    return headers
+
+async def main(ai_calls=8, probes=20):
+    run_migrations(engine) # ASGITransport no corre el lifespan de la app
+    ai.client = FakeClient()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        headers = await login(http)
+
+        async def probe_latency():
+            timings = []
+            for _ in range(probes):
+                t0 = time.perf_counter()
+                response = await http.get("/products", headers=headers)
+                timings.append((time.perf_counter() - t0) * 1000)
+                assert response.status_code == 200, (response.status_code, response.text[:200])
+                await asyncio.sleep(AI_FAKE_LATENCY / probes)
+            return sorted(timings)
+
+        baseline = await probe_latency()
+
+        t0 = time.perf_counter()
+        ai_tasks = [
+            # Contextos distintos para que la caché de insights no los agrupe
+            asyncio.create_task(http.post("/api/gemini/analyze", headers=headers, json={"analysis_type": "costs", "context_data": {"user_fixed_costs": i}}))
+            for i in range(ai_calls)
+        ]
+        under_load = await probe_latency()
+        results = await asyncio.gather(*ai_tasks)
+        ai_elapsed = time.perf_counter() - t0
+
+    print(f"IA falsa: {ai_calls} llamadas de {AI_FAKE_LATENCY}s, concurrencia máx {ai.AI_MAX_CONCURRENCY}")
+    print(f"tiempo total IA: {ai_elapsed:.2f}s  respuestas ok: {sum(1 for r in results if r.status_code == 200)}")
+    print(f"/products sin IA : p50={baseline[len(baseline) // 2]:.1f}ms max={baseline[-1]:.1f}ms")
+    print(f"/products con IA : p50={under_load[len(under_load) // 2]:.1f}ms max={under_load[-1]:.1f}ms")
+    assert under_load[-1] < AI_FAKE_LATENCY * 1000 / 2, "El event loop quedó bloqueado por la IA"
+
+if __name__ == "__main__":
+    asyncio.run(main())
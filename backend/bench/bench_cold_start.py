@@ -0,0 +1,82 @@
+"""
+Tiempo de arranque en frío (cold start) del backend.
+
+Cada medición corre en un proceso nuevo para que nada quede en caché:
+  - import: cuánto tarda `import src.main` (no debe tocar la base ni
+    cargar google.genai / openpyxl)
+  - lifespan: migraciones/chequeo de esquema + precalentado del pool
+  - primera petición: GET /products autenticado, ya con el pool listo
+Además lista los módulos más caros según `python -X importtime`.
+
+Uso (desde la carpeta backend):
+    python bench/bench_cold_start.py [repeticiones]
+"""
+import json
+import os
+import subprocess
+import sys
+
+from common import BACKEND, temp_database_url
+
+_PROBE = r'''
+import json, sys, time
+t0 = time.perf_counter()
+import src.main
+t_import = time.perf_counter() - t0
+heavy = {m: m in sys.modules for m in ("google.genai", "openpyxl")}
+
+from fastapi.testclient import TestClient
+t0 = time.perf_counter()
+with TestClient(src.main.app) as client:
+    t_lifespan = time.perf_counter() - t0
+    client.post("/register", json=dict(email="cold@local", password="x", first_name="C", last_name="S", phone="1", address="-"))
+    token = client.post("/login", json=dict(email="cold@local", password="x")).json()["access_token"]
+    t0 = time.perf_counter()
+    status = client.get("/products", headers={"Authorization": "Bearer " + token}).status_code
+    t_first = time.perf_counter() - t0
+print(json.dumps({"import": t_import, "lifespan": t_lifespan, "first": t_first, "status": status, "heavy": heavy}))
+'''
+
+def _env():
+    env = dict(os.environ)
+    if not env.get("DATABASE_URL"):
+        env["DATABASE_URL"] = temp_database_url() # Base nueva en cada medición
+    return env
+
+def measure() -> dict:
+    out = subprocess.run([sys.executable, "-c", _PROBE], cwd=BACKEND, env=_env(), capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def top_imports(n=10):
+    # -X importtime escribe en stderr: "import time: self | cumulative | módulo"
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import src.main"], cwd=BACKEND, env=_env(), capture_output=True, text=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        if depth == 1: # Imports directos de src.main (el acumulado ya incluye a sus hijos)
+            rows.append((int(parts[1]), name.strip()))
+    return sorted(rows, reverse=True)[:n]
+
+def main(repeats=3):
+    runs = [measure() for _ in range(repeats)]
+    for key, label in (("import", "import src.main"), ("lifespan", "lifespan (esquema+pool)"), ("first", "primera petición")):
+        values = sorted(r[key] * 1000 for r in runs)
+        print(f"{label:<26} p50={values[len(values) // 2]:7.1f}ms  max={values[-1]:7.1f}ms")
+
+    heavy = runs[0]["heavy"]
+    for module, loaded in heavy.items():
+        print(f"{module:<26} {'CARGADO al importar' if loaded else 'diferido'}")
+
+    print("\nImports más caros de src.main (acumulado):")
+    for micros, name in top_imports():
+        print(f"  {micros / 1000:7.1f}ms  {name}")
+
+    assert all(r["status"] == 200 for r in runs), "La primera petición falló"
+    assert not any(heavy.values()), "Un módulo pesado se importa al arrancar"
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 3)
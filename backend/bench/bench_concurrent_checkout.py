@@ -0,0 +1,80 @@
+"""
+Benchmark de ventas concurrentes sobre un mismo producto "caliente".
+
+Lanza muchas ventas en paralelo contra un producto con stock limitado y
+verifica que nunca se venda más de lo que hay (sin sobreventa).
+Para medir bloqueo de filas real usar Postgres:
+
+    DATABASE_URL=postgresql://... python bench/bench_concurrent_checkout.py --workers 32 --checkouts 500 --stock 300
+"""
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from common import setup
+setup()
+
+from fastapi import HTTPException
+
+from src.database import engine, Base, SessionLocal
+from src.models import User, Product, SaleItem
+from src.sales import process_sale
+from src.schemas import SaleCreate, SaleItemSchema
+
+def checkout(user_id, product_id):
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    try:
+        process_sale(db, user_id, SaleCreate(items=[SaleItemSchema(product_id=product_id, quantity=1)]))
+        status = "ok"
+    except HTTPException as e:
+        status = str(e.status_code)
+    except Exception as e:  # p.ej. "database is locked" en SQLite
+        status = type(e).__name__
+    finally:
+        db.close()
+    return status, (time.perf_counter() - t0) * 1000
+
+def run(workers, checkouts, stock):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    db = SessionLocal()
+    user = User(email="bench@local", hashed_password="x")
+    db.add(user)
+    db.commit()
+    hot = Product(barcode="HOT", name="Producto caliente", stock=stock, cost_price=100, sale_price=150, user_id=user.id)
+    db.add(hot)
+    db.commit()
+    user_id, product_id = user.id, hot.id
+    db.close()
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda _: checkout(user_id, product_id), range(checkouts)))
+    elapsed = time.perf_counter() - t0
+
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    latencies = sorted(ms for _, ms in results)
+
+    db = SessionLocal()
+    final_stock = db.query(Product.stock).filter(Product.id == product_id).scalar()
+    sold_units = db.query(SaleItem).filter(SaleItem.product_id == product_id).count()
+    db.close()
+
+    print(f"workers={workers} checkouts={checkouts} stock_inicial={stock}")
+    print(f"resultados: {statuses}")
+    print(f"throughput: {checkouts / elapsed:.1f} ventas/s  p50={latencies[len(latencies) // 2]:.1f}ms  p95={latencies[int(len(latencies) * 0.95) - 1]:.1f}ms")
+    print(f"stock_final={final_stock} unidades_vendidas={sold_units}")
+    assert final_stock >= 0, "Sobreventa: stock negativo"
+    assert final_stock + sold_units == stock, "Descuadre entre stock e items vendidos"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--checkouts", type=int, default=200)
+    parser.add_argument("--stock", type=int, default=150)
+    args = parser.parse_args()
+    run(args.workers, args.checkouts, args.stock)
@@ -0,0 +1,84 @@
+"""
+Benchmark del feed de actividad (/movements): latencia de la primera página
+vs. páginas profundas (recorriendo con el cursor), según tamaño del historial.
+
+Con keyset + índice (user_id, timestamp, id) la página 1 y la página N
+deberían costar prácticamente lo mismo.
+
+Uso (desde la carpeta backend):
+    python bench/bench_movement_feed.py
+    DATABASE_URL=postgresql://... python bench/bench_movement_feed.py 100000 1000000
+"""
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+from common import setup
+setup()
+
+from sqlalchemy import insert
+
+from src.database import engine, Base, SessionLocal
+from src.migrations import run_migrations
+from src.models import User, Product, MovementHistory
+from src.activity import movement_feed_query, movement_page, MOVEMENT_TYPES
+
+PAGE_SIZE = 50
+CHUNK = 20000
+
+def seed(db, user_id, products, n_rows):
+    start = datetime.now() - timedelta(days=365)
+    for offset in range(0, n_rows, CHUNK):
+        db.execute(insert(MovementHistory), [
+            {
+                "product_id": random.choice(products),
+                "user_id": user_id,
+                "movement_type": random.choice(MOVEMENT_TYPES),
+                "quantity_changed": random.randint(1, 10),
+                "final_stock": random.randint(0, 100),
+                "timestamp": start + timedelta(seconds=offset + i),
+            }
+            for i in range(min(CHUNK, n_rows - offset))
+        ])
+        db.commit()
+
+def timed_page(db, user_id, cursor=None, movement_type=None):
+    t0 = time.perf_counter()
+    page = movement_page(movement_feed_query(db, user_id, movement_type), PAGE_SIZE, cursor)
+    return page, (time.perf_counter() - t0) * 1000
+
+def run(sizes, deep_pages=200):
+    Base.metadata.drop_all(bind=engine)
+    run_migrations(engine)
+
+    db = SessionLocal()
+    user = User(email="feed@local", hashed_password="x")
+    db.add(user)
+    db.commit()
+    products = [Product(barcode=f"B{i}", name=f"P{i}", stock=100, user_id=user.id) for i in range(200)]
+    db.add_all(products)
+    db.commit()
+    product_ids = [p.id for p in products]
+    user_id = user.id
+
+    seeded = 0
+    print(f"{'movimientos':>12} {'página 1':>10} {f'página {deep_pages}':>12} {'filtro tipo':>12}")
+    for size in sizes:
+        seed(db, user_id, product_ids, size - seeded)
+        seeded = size
+
+        _, first_ms = timed_page(db, user_id)
+        cursor = None
+        for _ in range(deep_pages):
+            page, deep_ms = timed_page(db, user_id, cursor)
+            cursor = page.next_cursor
+            if not cursor:
+                break
+        _, filtered_ms = timed_page(db, user_id, movement_type="venta")
+        print(f"{size:>12} {first_ms:>8.1f}ms {deep_ms:>10.1f}ms {filtered_ms:>10.1f}ms")
+    db.close()
+
+if __name__ == "__main__":
+    sizes = [int(s) for s in sys.argv[1:]] or [10000, 100000, 300000]
+    run(sizes)
@@ -0,0 +1,128 @@
+"""
+Prueba de carga: throughput vs. cantidad de workers con el pool presupuestado.
+
+Para cada cantidad de workers levanta `uvicorn --workers N` (con
+WEB_CONCURRENCY=N, así cada proceso calcula su parte del presupuesto de
+conexiones, ver src/pool_budget.py) y le manda CLIENTS clientes
+concurrentes durante DURATION segundos contra endpoints de lectura.
+Reporta peticiones/s, p50/p95 y errores: un timeout del pool aparece como
+500, y la prueba falla si hay alguno.
+
+Uso (desde la carpeta backend; idealmente contra Postgres):
+    DATABASE_URL=postgresql://... DB_MAX_CONNECTIONS=40 python bench/bench_pool_workers.py 1 2 4
+Con PgBouncer delante, agregar DB_PGBOUNCER=1 y DATABASE_DIRECT_URL.
+"""
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+from common import BACKEND, setup
+CLIENTS = int(os.getenv("BENCH_CLIENTS", "64"))
+DURATION = float(os.getenv("BENCH_DURATION", "10"))
+N_PRODUCTS = 200
+PATHS = ["/products", "/movements?limit=50", "/dashboard/stats"]
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _env(workers: int) -> dict:
+    env = dict(os.environ)
+    env["WEB_CONCURRENCY"] = str(workers)
+    env["MIGRATE_ON_STARTUP"] = "0" # Se migra una vez antes, no en cada worker
+    return env
+
+def start_server(workers: int):
+    port = _free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.main:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=BACKEND, env=_env(workers)
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            if httpx.get(base_url + "/docs", timeout=1).status_code == 200:
+                return proc, base_url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("uvicorn no respondió a tiempo")
+
+def seed(base_url: str) -> dict:
+    with httpx.Client(base_url=base_url, timeout=30) as http:
+        http.post("/register", json=dict(email="pool@local", password="x", first_name="P", last_name="W", phone="1", address="-"))
+        login = http.post("/login", json=dict(email="pool@local", password="x")).json()
+        headers = {"Authorization": "Bearer " + login["access_token"]}
+        if not http.get("/products", headers=headers, params={"limit": 1}).json():
+            for i in range(N_PRODUCTS):
+                http.post("/products", headers=headers, json=dict(
+                    barcode=f"W{i}", name=f"Producto {i}", stock=100, cost_price=100, gain=0.3, sale_price=150))
+        return headers
+
+def load(base_url: str, headers: dict) -> dict:
+    timings, statuses = [], {}
+    lock = threading.Lock()
+    stop_at = time.time() + DURATION
+
+    def client(n: int):
+        local_t, local_s = [], {}
+        with httpx.Client(base_url=base_url, headers=headers, timeout=60) as http:
+            i = n
+            while time.time() < stop_at:
+                t0 = time.perf_counter()
+                try:
+                    code = http.get(PATHS[i % len(PATHS)]).status_code
+                except httpx.HTTPError:
+                    code = "error"
+                local_t.append(time.perf_counter() - t0)
+                local_s[code] = local_s.get(code, 0) + 1
+                i += 1
+        with lock:
+            timings.extend(local_t)
+            for code, count in local_s.items():
+                statuses[code] = statuses.get(code, 0) + count
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(CLIENTS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    timings.sort()
+    return {
+        "rps": len(timings) / DURATION,
+        "p50": timings[len(timings) // 2] * 1000,
+        "p95": timings[int(len(timings) * 0.95)] * 1000,
+        "statuses": statuses,
+    }
+
+def main(worker_counts):
+    setup() # Los workers heredan la DATABASE_URL (temporal si no se definió)
+    subprocess.run([sys.executable, "-m", "src.migrations"], cwd=BACKEND, check=True, capture_output=True)
+
+    failures = 0
+    print(f"{CLIENTS} clientes, {DURATION:.0f}s por corrida, endpoints: {', '.join(PATHS)}")
+    for workers in worker_counts:
+        proc, base_url = start_server(workers)
+        try:
+            headers = seed(base_url)
+            result = load(base_url, headers)
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+        errors = sum(n for code, n in result["statuses"].items() if code == "error" or code >= 500)
+        failures += errors
+        print(f"workers={workers:<2} {result['rps']:8.1f} req/s  p50={result['p50']:7.1f}ms  p95={result['p95']:7.1f}ms  "
+              f"errores={errors}  {result['statuses']}")
+
+    assert failures == 0, "Hubo respuestas 5xx / timeouts del pool"
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [1, 2, 4])
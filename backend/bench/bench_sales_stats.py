@@ -0,0 +1,81 @@
+"""
+Benchmark de /sales/stats: cantidad de consultas SQL y latencia según volumen de ventas.
+
+Uso (desde la carpeta backend):
+    python bench/bench_sales_stats.py
+    DATABASE_URL=postgresql://... python bench/bench_sales_stats.py 100 1000 10000
+"""
+import sys
+import time
+import random
+from datetime import datetime, timedelta
+
+from common import setup
+setup()
+
+from sqlalchemy import event
+
+from src.database import engine, Base, SessionLocal
+from src.models import User, Product, Sale, SaleItem
+from src.stats import compute_sales_stats
+from src.rollups import rebuild_rollups
+
+def seed(db, user_id, products, n_sales):
+    now = datetime.now()
+    for i in range(n_sales):
+        sale = Sale(
+            user_id=user_id,
+            date=now - timedelta(minutes=random.randint(0, 60 * 24 * 90)),
+            total_amount=0,
+            payment_method=random.choice(["Efectivo", "Débito"])
+        )
+        db.add(sale)
+        db.flush()
+        total = 0
+        for p in random.sample(products, 3):
+            qty = random.randint(1, 4)
+            total += p.sale_price * qty
+            db.add(SaleItem(sale_id=sale.id, product_id=p.id, quantity=qty,
+                            unit_price=p.sale_price, cost_price=p.cost_price))
+        sale.total_amount = int(total * 1.19)
+    db.commit()
+
+def run(sizes, repeat=5):
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+
+    counter = {"n": 0}
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _count(*args):
+        counter["n"] += 1
+
+    db = SessionLocal()
+    user = User(email="bench@local", hashed_password="x")
+    db.add(user)
+    db.commit()
+    products = [Product(barcode=f"B{i}", name=f"P{i}", stock=1000, cost_price=100, sale_price=150, user_id=user.id) for i in range(50)]
+    db.add_all(products)
+    db.commit()
+
+    seeded = 0
+    print(f"{'ventas':>8} {'rango':>8} {'queries':>8} {'ms (p50)':>10}")
+    for size in sizes:
+        seed(db, user.id, products, size - seeded)
+        rebuild_rollups(db, user.id)
+        seeded = size
+        for rng in ("recent", "monthly"):
+            timings = []
+            for _ in range(repeat):
+                db.expire_all()
+                counter["n"] = 0
+                t0 = time.perf_counter()
+                compute_sales_stats(db, user.id, rng)
+                timings.append((time.perf_counter() - t0) * 1000)
+            timings.sort()
+            print(f"{size:>8} {rng:>8} {counter['n']:>8} {timings[len(timings) // 2]:>10.2f}")
+    db.close()
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [100, 1000, 5000]
+    run(sizes)
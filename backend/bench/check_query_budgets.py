@@ -0,0 +1,99 @@
+"""
+Presupuesto de consultas SQL por endpoint (detector de N+1).
+
+Crea datos de prueba a través de la API y luego llama a cada endpoint
+caliente dentro de query_budget(): falla (exit != 0) si alguno ejecuta más
+sentencias de las permitidas o repite la misma consulta por fila.
+Los datos se generan con varias filas por tabla para que un N+1 se note.
+
+Uso (desde la carpeta backend):
+    python bench/check_query_budgets.py
+"""
+import sys
+
+from common import setup
+setup()
+
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.database import engine, SessionLocal
+from src.models import User
+from src.principals import principal_cache
+from src.response_cache import response_cache
+from src.query_profiler import query_budget, QueryBudgetExceeded
+
+N_PRODUCTS = 15
+N_SALES = 12
+N_TICKETS = 8
+MAX_REPEATS = 3 # Una misma forma de consulta más veces que esto = N+1
+
+# endpoint -> máximo de sentencias SQL (autenticación incluida)
+BUDGETS = [
+    ("GET", "/products", {}, 3),
+    ("GET", "/products", {"limit": 5, "include_total": "true"}, 4),
+    ("GET", "/dashboard/stats", {}, 8),
+    ("GET", "/movements", {"limit": 20}, 3),
+    ("GET", "/sales/stats", {"range": "recent"}, 6),
+    ("GET", "/sales/stats", {"range": "monthly"}, 6),
+    ("GET", "/sales/export", {"format": "csv"}, 4),
+    ("GET", "/sales/export", {"format": "xlsx"}, 4),
+    ("GET", "/admin/stats", {}, 2),
+    ("GET", "/admin/products", {}, 2),
+    ("GET", "/admin/products", {"format": "ndjson"}, 2),
+    ("GET", "/admin/tickets", {}, 2),
+    ("GET", "/admin/tickets", {"format": "ndjson"}, 2),
+    ("GET", "/my-tickets", {}, 3),
+    ("GET", "/announcements", {}, 3),
+]
+
+def seed(client):
+    client.post("/register", json=dict(email="budget@local", password="x", first_name="B", last_name="Q", phone="1", address="-"))
+    db = SessionLocal()
+    db.query(User).filter(User.email == "budget@local").update({"is_admin": True})
+    db.commit()
+    db.close()
+    login = client.post("/login", json=dict(email="budget@local", password="x")).json()
+    headers = {"Authorization": "Bearer " + login["access_token"]}
+
+    for i in range(N_PRODUCTS):
+        client.post("/products", headers=headers, json=dict(
+            barcode=f"B{i}", name=f"Producto {i}", stock=100, cost_price=100, gain=0.3, sale_price=150))
+    products = client.get("/products", headers=headers).json()
+    for i in range(N_SALES):
+        items = [{"product_id": p["id"], "quantity": 1} for p in products[i % 5:i % 5 + 3]]
+        client.post("/sales", headers=headers, json=dict(items=items, payment_method="Efectivo"))
+    for i in range(N_TICKETS):
+        client.post("/tickets", json=dict(user_id=login["user_id"], issue_type="bug", message=f"ticket {i}"))
+    client.post("/admin/announce", headers=headers, json=dict(title="Aviso", message="Mantención"))
+    return headers
+
+def main():
+    with TestClient(app) as client: # Corre el lifespan (migraciones)
+        run_budgets(client)
+
+def run_budgets(client):
+    headers = seed(client)
+
+    failures = 0
+    for method, path, params, budget in BUDGETS:
+        # Sin cachés: se mide el costo real del endpoint
+        response_cache.clear()
+        principal_cache.clear()
+        label = f"{method} {path} {params or ''}".strip()
+        try:
+            with query_budget(engine, budget, MAX_REPEATS, label) as profile:
+                response = client.request(method, path, headers=headers, params=params)
+                assert response.status_code == 200, (response.status_code, response.text[:200])
+            print(f"[OK]    {label:<50} {profile.total:>3} / {budget}")
+        except QueryBudgetExceeded as e:
+            failures += 1
+            print(f"[FALLA] {label}\n{e}")
+
+    if failures:
+        print(f"\n{failures} endpoint(s) sobre su presupuesto de consultas")
+        sys.exit(1)
+    print("\nTodos los endpoints dentro de su presupuesto.")
+
+if __name__ == "__main__":
+    main()
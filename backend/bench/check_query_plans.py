@@ -0,0 +1,155 @@
+"""
+Regresión de planes de consulta (EXPLAIN) para las rutas calientes.
+
+Aplica las migraciones sobre una base vacía, ejecuta las consultas reales
+de estadísticas (capturando el SQL que emiten) y verifica con EXPLAIN que
+cada una use el índice compuesto esperado. Falla (exit != 0) si alguna
+consulta vuelve a recorrer la tabla completa, o si una página de
+GET /products (cada orden permitido) ordena el catálogo entero.
+
+Uso (desde la carpeta backend):
+    python bench/check_query_plans.py
+    DATABASE_URL=postgresql://... python bench/check_query_plans.py
+"""
+import re
+import sys
+from datetime import datetime, timedelta
+
+from common import setup
+setup()
+
+from sqlalchemy import event
+
+from src.database import engine, SessionLocal
+from src.migrations import run_migrations
+from src.models import User, Product, Sale, SaleItem, MovementHistory
+from src.rollups import rebuild_rollups
+from src.stats import compute_sales_stats
+from src.inventory import zombie_products
+from src.activity import movement_feed_query, movement_page
+from src.main import PRODUCT_SORTS
+from src.pagination import paginate, parse_sort
+
+# tabla consultada -> índices aceptables (SQLite nombra "autoindex" a los UNIQUE de tabla)
+EXPECTED = {
+    "sales": {"ix_sales_user_date"},
+    "sale_items": {"ix_sales_user_date", "ix_sale_items_sale_id", "ix_sale_items_product_id"},
+    "daily_sales_rollup": {"uq_rollup_user_day_method", "sqlite_autoindex_daily_sales_rollup_1"},
+    "movement_history": {"ix_movements_product_timestamp", "ix_movements_user_timestamp"},
+    # Los índices (user_id, ...) del listado también sirven el filtro por usuario
+    "products": {"uq_products_user_barcode", "ix_products_user_last_sold", "ix_products_user_id_id",
+                 "ix_products_user_name_id", "ix_products_user_stock_id", "ix_products_user_barcode_id"},
+}
+
+# Listado paginado de productos: orden -> índice que debe servir ORDER BY y keyset
+PRODUCT_PAGE_INDEXES = {
+    "id": "ix_products_user_id_id",
+    "name": "ix_products_user_name_id",
+    "-stock": "ix_products_user_stock_id",
+    "barcode": "ix_products_user_barcode_id",
+}
+
+def seed(db):
+    user = User(email="plans@local", hashed_password="x")
+    db.add(user)
+    db.commit()
+    products = [Product(barcode=f"B{i}", name=None if i % 5 == 0 else f"P{i}", stock=50, cost_price=10, sale_price=15, user_id=user.id) for i in range(20)]
+    db.add_all(products)
+    db.commit()
+    now = datetime.now()
+    for i in range(200):
+        sale = Sale(user_id=user.id, date=now - timedelta(hours=i), total_amount=100, payment_method="Efectivo")
+        db.add(sale)
+        db.flush()
+        db.add(SaleItem(sale_id=sale.id, product_id=products[i % 20].id, quantity=1, unit_price=15, cost_price=10))
+        db.add(MovementHistory(product_id=products[i % 20].id, user_id=user.id, movement_type="venta",
+                               quantity_changed=1, final_stock=49, timestamp=sale.date))
+    db.commit()
+    rebuild_rollups(db, user.id)
+    return user, products
+
+def explain(conn, statement, parameters):
+    if engine.dialect.name == "postgresql":
+        conn.exec_driver_sql("SET enable_seqscan = off") # Con tablas chicas el planner prefiere seq scan
+        rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).fetchall()
+    else:
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+    return "\n".join(str(r[-1]) for r in rows)
+
+def sorts_whole_table(plan: str) -> bool:
+    return "TEMP B-TREE" in plan or bool(re.search(r"^\s*(->\s*)?(Incremental )?Sort\b", plan, re.M))
+
+def check_product_pages(db, user_id) -> int:
+    captured = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+
+    failures = 0
+    for sort, index_name in PRODUCT_PAGE_INDEXES.items():
+        sort_key, sort_column, descending = parse_sort(sort, PRODUCT_SORTS)
+        query = db.query(Product).filter(Product.user_id == user_id)
+        event.listen(engine, "before_cursor_execute", capture)
+        first = paginate(query, sort_key, sort_column, Product.id, descending, limit=5)
+        paginate(query, sort_key, sort_column, Product.id, descending, limit=5, cursor=first.next_cursor)
+        event.remove(engine, "before_cursor_execute", capture)
+
+        with engine.connect() as conn:
+            for page, (statement, parameters) in enumerate(captured, start=1):
+                plan = explain(conn, statement, parameters)
+                ok = index_name in plan and not sorts_whole_table(plan)
+                failures += 0 if ok else 1
+                print(f"[{'OK' if ok else 'FALLA'}] products?sort={sort:<8} página {page} con {index_name}")
+                if not ok:
+                    print("       plan:", plan.replace("\n", "\n             "))
+        captured.clear()
+    return failures
+
+def main():
+    run_migrations(engine)
+    db = SessionLocal()
+    user, products = seed(db)
+    user_id, product_id = user.id, products[0].id
+
+    captured = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            captured.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", capture)
+
+    for rng in ("recent", "daily", "monthly"):
+        compute_sales_stats(db, user_id, rng)
+    db.query(Product).filter(Product.user_id == user_id, Product.barcode == "B3").first()
+    db.query(MovementHistory).filter(MovementHistory.product_id == product_id).order_by(
+        MovementHistory.timestamp.desc()).limit(10).all()
+    zombie_products(db, user_id)
+    first = movement_page(movement_feed_query(db, user_id), limit=20)
+    movement_page(movement_feed_query(db, user_id), limit=20, cursor=first.next_cursor)
+
+    event.remove(engine, "before_cursor_execute", capture)
+
+    failures = check_product_pages(db, user_id)
+    db.close()
+
+    with engine.connect() as conn:
+        for statement, parameters in captured:
+            plan = explain(conn, statement, parameters)
+            match = re.search(r"\bFROM\s+\"?(\w+)", statement)
+            main_table = match.group(1) if match else ""
+            expected = EXPECTED.get(main_table)
+            if not expected:
+                continue
+            ok = any(name in plan for name in expected)
+            failures += 0 if ok else 1
+            first_line = " ".join(statement.split())[:90]
+            print(f"[{'OK' if ok else 'FALLA'}] {main_table:<20} {first_line}...")
+            if not ok:
+                print("       plan:", plan.replace("\n", "\n             "))
+
+    if failures:
+        print(f"\n{failures} consulta(s) sin el índice esperado")
+        sys.exit(1)
+    print("\nTodas las consultas calientes usan sus índices.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Verifica el ruteo a la réplica de lectura y el read-your-writes.
+
+Usa dos bases SQLite locales: el primario (DATABASE_URL) y una "réplica"
+(DATABASE_READ_URL) que solo se actualiza cuando el script copia el
+primario encima (replicate()). Así la réplica está atrasada a propósito:
+  1. Los reportes leen de la réplica (no ven una escritura hecha
+     directo en el primario sin pasar por la API).
+  2. Justo después de una escritura propia por la API, el mismo usuario
+     lee del primario (ve su cambio aunque la réplica no lo tenga).
+  3. Pasado READ_YOUR_WRITES_SECONDS vuelve a leer de la réplica.
+  4. El checkout (POST /sales) nunca toca la réplica.
+Con Postgres se prueba igual apuntando DATABASE_READ_URL a una réplica
+real (streaming replication) y salteando replicate().
+
+Uso (desde la carpeta backend):
+    python bench/check_read_replica.py
+"""
+import os
+import sqlite3
+import time
+
+from common import setup, temp_path
+PRIMARY = temp_path(suffix="_primary.db")
+REPLICA = temp_path(suffix="_replica.db")
+os.environ["DATABASE_URL"] = "sqlite:///" + PRIMARY
+os.environ["DATABASE_READ_URL"] = "sqlite:///" + REPLICA
+os.environ["READ_YOUR_WRITES_SECONDS"] = "1"
+setup()
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from src.main import app
+from src.database import engine, read_engine, SessionLocal
+from src.models import Product
+from src.replica import READ_YOUR_WRITES_SECONDS
+from src.response_cache import response_cache
+
+statements = {"primary": 0, "replica": 0}
+event.listen(engine, "after_cursor_execute", lambda *a: statements.__setitem__("primary", statements["primary"] + 1))
+event.listen(read_engine, "after_cursor_execute", lambda *a: statements.__setitem__("replica", statements["replica"] + 1))
+
+def replicate():
+    """Copia el primario a la réplica (lo que haría la replicación de Postgres)."""
+    read_engine.dispose()
+    src, dst = sqlite3.connect(PRIMARY), sqlite3.connect(REPLICA)
+    with dst:
+        src.backup(dst)
+    src.close()
+    dst.close()
+
+def product_count(client, headers, user_id) -> int:
+    # Medir la base, no la caché de respuestas (clear() borraría también la marca de read-your-writes)
+    response_cache.invalidate(user_id)
+    return client.get("/dashboard/stats", headers=headers).json()["total_products"]
+
+def routed(client, method, path, headers, **kwargs):
+    before = dict(statements)
+    response = client.request(method, path, headers=headers, **kwargs)
+    assert response.status_code == 200, (response.status_code, response.text[:200])
+    return {k: statements[k] - before[k] for k in statements}
+
+def main():
+    with TestClient(app) as client:
+        client.post("/register", json=dict(email="replica@local", password="x", first_name="R", last_name="W", phone="1", address="-"))
+        login = client.post("/login", json=dict(email="replica@local", password="x")).json()
+        headers = {"Authorization": "Bearer " + login["access_token"]}
+        user_id = login["user_id"]
+        for i in range(3):
+            client.post("/products", headers=headers, json=dict(
+                barcode=f"R{i}", name=f"Producto {i}", stock=10, cost_price=100, gain=0.3, sale_price=150))
+        replicate()
+        time.sleep(READ_YOUR_WRITES_SECONDS + 0.1)
+
+        # 1. Lecturas de reportes -> réplica
+        db = SessionLocal()
+        db.add(Product(user_id=user_id, barcode="DIRECTO", name="Solo en el primario", stock=1, cost_price=1, gain=0, sale_price=1))
+        db.commit()
+        db.close()
+        assert product_count(client, headers, user_id) == 3, "El reporte no leyó de la réplica"
+        for path in ("/dashboard/stats", "/sales/stats", "/sales/export?format=ndjson"):
+            response_cache.invalidate(user_id)
+            hits = routed(client, "GET", path, headers)
+            assert hits["replica"] > 0, (path, hits)
+            print(f"[OK] {path:<30} réplica={hits['replica']} primario={hits['primary']}")
+
+        # 2. Escritura propia -> el usuario lee del primario
+        products = client.get("/products", headers=headers).json()
+        hits = routed(client, "POST", "/sales", headers, json=dict(items=[{"product_id": products[0]["id"], "quantity": 1}], payment_method="Efectivo"))
+        assert hits["replica"] == 0, hits
+        print(f"[OK] POST /sales solo en el primario ({hits['primary']} sentencias)")
+        assert product_count(client, headers, user_id) == 4, "Read-your-writes no volvió al primario"
+        print("[OK] read-your-writes: tras escribir, el usuario lee del primario")
+
+        # 3. Pasada la ventana -> otra vez la réplica (todavía atrasada)
+        time.sleep(READ_YOUR_WRITES_SECONDS + 0.1)
+        assert product_count(client, headers, user_id) == 3, "Pasada la ventana debería leer de la réplica"
+        replicate()
+        assert product_count(client, headers, user_id) == 4
+        print("[OK] pasada la ventana vuelve a la réplica")
+
+    print("\nRuteo a réplica y read-your-writes correctos.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Preparación compartida por los scripts de bench/.
+
+    from common import setup
+    setup() # antes de importar src.*
+
+- Pone la carpeta backend en sys.path (los scripts se corren como
+  `python bench/<script>.py`).
+- Si no hay DATABASE_URL, apunta a una SQLite nueva dentro de un
+  directorio temporal propio que se borra al terminar el proceso.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_workdir = None
+
+def temp_path(suffix: str = ".db") -> str:
+    """Archivo nuevo (creado con mkstemp, sin carreras) en el directorio temporal del bench."""
+    global _workdir
+    if _workdir is None:
+        # TemporaryDirectory se limpia solo al salir del intérprete
+        _workdir = tempfile.TemporaryDirectory(prefix="bench_")
+    fd, path = tempfile.mkstemp(suffix=suffix, dir=_workdir.name)
+    os.close(fd) # SQLite trata un archivo vacío como una base nueva
+    return path
+
+def temp_database_url(suffix: str = ".db") -> str:
+    return "sqlite:///" + temp_path(suffix)
+
+def setup(env: dict = None) -> str:
+    """backend en sys.path + DATABASE_URL por defecto. Devuelve la DATABASE_URL en uso."""
+    if BACKEND not in sys.path:
+        sys.path.insert(0, BACKEND)
+    env = os.environ if env is None else env
+    if not env.get("DATABASE_URL"):
+        env["DATABASE_URL"] = temp_database_url()
+    return env["DATABASE_URL"]
@@ -0,0 +1,51 @@
+from typing import Dict
+
+from sqlalchemy import func, or_
+from sqlalchemy.orm import Session
+
+from .counters import bump
+from .models import (
+    User, Product, Sale, SaleItem, MovementHistory, SupportTicket,
+    DailySalesRollup, InventoryValuation, CatalogVersion
+)
+
+# ==========================================
+#          BAJA DE CUENTAS
+# ==========================================
+# Borrar un usuario exige borrar antes todo lo que apunta a users.id
+# (Postgres rechaza el DELETE por FK si queda algo): ventas y sus ítems,
+# historial de movimientos, productos y las tablas derivadas (rollup
+# diario, valorización, versión del catálogo). Los tickets de soporte se
+# conservan para el administrador, sin dueño. Los contadores de
+# plataforma se descuentan en la misma transacción (ver counters.py).
+
+def delete_user_account(db: Session, user: User) -> Dict[str, int]:
+    """Borra al usuario y sus datos (no hace commit). Retorna cuántas filas se borraron por tabla."""
+    user_id = user.id
+    sales = db.query(Sale.id).filter(Sale.user_id == user_id)
+    products = db.query(Product.id).filter(Product.user_id == user_id)
+    sales_count, revenue = db.query(
+        func.count(Sale.id), func.coalesce(func.sum(Sale.total_amount), 0)
+    ).filter(Sale.user_id == user_id).one()
+
+    deleted = {
+        "sale_items": db.query(SaleItem).filter(
+            or_(SaleItem.sale_id.in_(sales.scalar_subquery()), SaleItem.product_id.in_(products.scalar_subquery()))
+        ).delete(synchronize_session=False),
+        "movements": db.query(MovementHistory).filter(
+            or_(MovementHistory.user_id == user_id, MovementHistory.product_id.in_(products.scalar_subquery()))
+        ).delete(synchronize_session=False),
+        "sales": db.query(Sale).filter(Sale.user_id == user_id).delete(synchronize_session=False),
+        "products": db.query(Product).filter(Product.user_id == user_id).delete(synchronize_session=False),
+    }
+    db.query(SupportTicket).filter(SupportTicket.user_id == user_id).update(
+        {SupportTicket.user_id: None}, synchronize_session=False
+    )
+    for model in (DailySalesRollup, InventoryValuation, CatalogVersion):
+        db.query(model).filter(model.user_id == user_id).delete(synchronize_session=False)
+
+    # Las filas ya no existen: que el DELETE del usuario no intente tocar sus relaciones
+    db.expire(user, ["products", "sales", "tickets"])
+    db.delete(user)
+    bump(db, users=-1, sales=-sales_count, revenue=-revenue, products=-deleted["products"])
+    return deleted
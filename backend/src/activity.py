@@ -0,0 +1,66 @@
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from .models import MovementHistory, Product
+from .pagination import Page, paginate
+
+# ==========================================
+#     FEED DE ACTIVIDAD (MOVIMIENTOS DE STOCK)
+# ==========================================
+# Una sola consulta trae el movimiento y el nombre del producto (JOIN), en
+# vez de un SELECT extra por fila. El orden es (timestamp, id) descendente
+# sobre el índice (user_id, timestamp, id), así cada página por cursor
+# cuesta lo mismo aunque el historial tenga millones de filas.
+
+MOVEMENT_TYPES = ("suma", "resta", "set", "venta")
+
+def movement_feed_query(
+    db: Session,
+    user_id: int,
+    movement_type: Optional[str] = None,
+    product_id: Optional[int] = None
+):
+    if movement_type is not None and movement_type not in MOVEMENT_TYPES:
+        raise HTTPException(status_code=400, detail=f"Tipo no soportado: {movement_type}. Opciones: {', '.join(MOVEMENT_TYPES)}")
+
+    query = db.query(
+        MovementHistory.id,
+        MovementHistory.product_id,
+        Product.name.label("product"),
+        MovementHistory.movement_type,
+        MovementHistory.quantity_changed,
+        MovementHistory.final_stock,
+        MovementHistory.timestamp,
+    ).join(Product, Product.id == MovementHistory.product_id).filter(
+        # El dueño del producto define a quién pertenece el movimiento; el
+        # filtro por MovementHistory.user_id (igual desde la migración 0008)
+        # mantiene el recorrido sobre el índice (user_id, timestamp, id)
+        Product.user_id == user_id,
+        MovementHistory.user_id == user_id
+    )
+    if movement_type is not None:
+        query = query.filter(MovementHistory.movement_type == movement_type)
+    if product_id is not None:
+        query = query.filter(MovementHistory.product_id == product_id)
+    return query
+
+def movement_page(query, limit: Optional[int], cursor: Optional[str] = None, include_total: bool = False) -> Page:
+    return paginate(query, "timestamp", MovementHistory.timestamp, MovementHistory.id,
+                    descending=True, limit=limit, cursor=cursor, include_total=include_total)
+
+def serialize_movements(rows) -> List[Dict[str, Any]]:
+    # Mismas claves que "recent_movements" del dashboard, más id y stock final
+    return [
+        {
+            "id": row.id,
+            "product_id": row.product_id,
+            "product": row.product,
+            "type": row.movement_type,
+            "quantity": row.quantity_changed,
+            "final_stock": row.final_stock,
+            "date": row.timestamp,
+        }
+        for row in rows
+    ]
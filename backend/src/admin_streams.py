@@ -0,0 +1,70 @@
+import json
+from typing import Any, Callable, Dict, Iterator
+
+from sqlalchemy.orm import Session, joinedload
+
+from .database import SessionLocal
+from .models import Product, SupportTicket
+
+# ==========================================
+#   LISTADOS GLOBALES DE ADMIN EN STREAMING
+# ==========================================
+# /admin/products y /admin/tickets pueden tener cientos de miles de filas.
+# Con ?format=ndjson se responde una fila JSON por línea a medida que se
+# leen de la base:
+#   - El dueño / usuario viene en la misma consulta (joinedload, sin una
+#     consulta por fila).
+#   - yield_per lee por bloques (cursor del lado del servidor en Postgres),
+#     así la memoria no crece con el tamaño del listado y el primer byte
+#     sale de inmediato.
+# El generador abre su propia sesión porque el streaming continúa después
+# de que el endpoint retorna.
+
+STREAM_BATCH_SIZE = 1000
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+def with_owner(query):
+    return query.options(joinedload(Product.owner))
+
+def with_ticket_user(query):
+    return query.options(joinedload(SupportTicket.user))
+
+def product_row(p: Product) -> Dict[str, Any]:
+    owner_name = f"{p.owner.first_name} {p.owner.last_name}" if p.owner else "Desconocido"
+    return {
+        "id": p.id,
+        "barcode": p.barcode,
+        "name": p.name,
+        "stock": p.stock,
+        "owner": owner_name
+    }
+
+def ticket_row(t: SupportTicket) -> Dict[str, Any]:
+    user_email = t.user.email if t.user else "Usuario eliminado"
+    return {
+        "id": t.id,
+        "user": user_email,
+        "issue": t.issue_type,
+        "message": t.message,
+        "status": t.status,
+        "admin_response": t.admin_response
+    }
+
+def stream_ndjson(
+    build_query: Callable[[Session], Any],
+    serialize: Callable[[Any], Dict[str, Any]],
+    session_factory: Callable[[], Session] = SessionLocal
+) -> Iterator[bytes]:
+    """Recorre la consulta por bloques y emite una línea JSON por fila."""
+    db = session_factory()
+    try:
+        buffer = []
+        for row in build_query(db).yield_per(STREAM_BATCH_SIZE):
+            buffer.append(json.dumps(serialize(row), ensure_ascii=False, default=str))
+            if len(buffer) >= 100:
+                yield ("\n".join(buffer) + "\n").encode("utf-8")
+                buffer = []
+        if buffer:
+            yield ("\n".join(buffer) + "\n").encode("utf-8")
+    finally:
+        db.close()
@@ -6,10 +6,18 @@ import random
 import re
 from typing import Dict, Any, Optional, List
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from google import genai
+
+from .ai_cache import insight_cache, prompt_key
+from .ai_health import model_health
+from .ai_context import build_context
+from .auth import get_current_user, get_current_admin
+from .metrics import observe_ai_call
+from .principals import Principal
+from .replica import read_session_factory
 
 load_dotenv()
 
@@ -19,7 +27,9 @@ logger = logging.getLogger("ai")
 router = APIRouter(prefix="/api/gemini", tags=["AI"])
 
 api_key = os.getenv("GEMINI_API_KEY")
-client: Optional[genai.Client] = None
+client: Optional[Any] = None # google.genai.Client, creado en el primer uso (ver _get_client)
+_genai_types: Optional[Any] = None # google.genai.types, cargado junto con el cliente
+_client_error = False
 
 # Modelos preferidos (optimizados para velocidad y costo)
 PREFERRED_MODELS: List[str] = [
@@ -32,6 +42,18 @@ _MODELS_CACHE: List[str] = []
 _MODELS_CACHE_TS: float = 0.0
 _MODELS_CACHE_TTL = 30 * 60
 
+# --- CONTROL DE CONCURRENCIA ---
+# Las llamadas a Gemini usan el cliente async (client.aio), así el event loop
+# sigue atendiendo otras peticiones mientras esperamos al modelo.
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "4"))   # Llamadas simultáneas al modelo
+AI_MAX_QUEUE = int(os.getenv("AI_MAX_QUEUE", "16"))              # Peticiones esperando turno
+AI_CALL_TIMEOUT = float(os.getenv("AI_CALL_TIMEOUT", "20"))      # Segundos por intento
+AI_LIST_TIMEOUT = float(os.getenv("AI_LIST_TIMEOUT", "5"))       # Segundos para listar modelos
+
+_ai_semaphore = asyncio.Semaphore(AI_MAX_CONCURRENCY)
+_ai_pending = 0 # En curso + en cola
+_models_refresh_task: Optional[asyncio.Task] = None
+
 # --- FUNCIONES DE UTILIDAD (Mantenemos tu lógica robusta) ---
 def _normalize_model_id(name: str) -> str:
     return name if name.startswith("models/") else f"models/{name}"
@@ -40,27 +62,42 @@ def _supports_generate_content(m: Any) -> bool:
     methods = getattr(m, "supported_generation_methods", None)
     return bool(methods and "generateContent" in methods)
 
-def _refresh_models_cache() -> List[str]:
+async def _refresh_models_cache() -> List[str]:
     global _MODELS_CACHE, _MODELS_CACHE_TS
     if not client: return []
     now = time.time()
     if _MODELS_CACHE and (now - _MODELS_CACHE_TS) < _MODELS_CACHE_TTL: return _MODELS_CACHE
-    models = []
-    try:
-        for m in client.models.list():
+
+    async def _list_models() -> List[str]:
+        found = []
+        async for m in await client.aio.models.list():
             name = getattr(m, "name", None)
-            if name and _supports_generate_content(m): models.append(name)
+            if name and _supports_generate_content(m): found.append(name)
+        return found
+
+    try:
+        models = await asyncio.wait_for(_list_models(), timeout=AI_LIST_TIMEOUT)
     except Exception:
         models = [_normalize_model_id(x) for x in PREFERRED_MODELS]
     _MODELS_CACHE = models
     _MODELS_CACHE_TS = now
     return models
 
+def _schedule_models_refresh():
+    """Refresca la lista de modelos en segundo plano (nunca en la ruta de la petición)."""
+    global _models_refresh_task
+    if not client: return
+    if _MODELS_CACHE and (time.time() - _MODELS_CACHE_TS) < _MODELS_CACHE_TTL: return
+    if _models_refresh_task and not _models_refresh_task.done(): return
+    _models_refresh_task = asyncio.get_running_loop().create_task(_refresh_models_cache())
+
 def _choose_models_to_try() -> List[str]:
-    available = set(_refresh_models_cache())
+    # Usa la última lista conocida (o la preferida) y la ordena por salud/latencia
+    _schedule_models_refresh()
+    available = set(_MODELS_CACHE)
     preferred = [_normalize_model_id(m) for m in PREFERRED_MODELS]
     chosen = [m for m in preferred if m in available]
-    return chosen if chosen else preferred
+    return model_health.rank(chosen if chosen else preferred)
 
 def _extract_retry_seconds(err: Exception) -> float:
     s = str(err)
@@ -76,17 +113,31 @@ def _is_auth_or_billing(err: Exception) -> bool:
     s = str(err)
     return ("401" in s) or ("403" in s) or ("PERMISSION_DENIED" in s)
 
-if api_key:
+def _get_client():
+    # google.genai tarda ~0.5s en importarse: se carga recién con la primera
+    # petición de IA, no al arrancar el proceso. Es bloqueante, por eso se
+    # llama en el threadpool (ver analyze_business).
+    global client, _genai_types, _client_error
+    if (client is None and not api_key) or _client_error:
+        return client
     try:
-        client = genai.Client(api_key=api_key)
-        logger.info("✅ Cliente Gemini configurado")
+        if _genai_types is None:
+            from google.genai import types
+            _genai_types = types
+        if client is None:
+            from google import genai
+            client = genai.Client(api_key=api_key)
+            logger.info("✅ Cliente Gemini configurado")
     except Exception as e:
         logger.error("❌ Error creando cliente: %s", e)
-        client = None
+        _client_error = True
+    return client
 
 class AIRequest(BaseModel):
     analysis_type: str
-    context_data: Dict[str, Any]
+    # Opcional: el servidor arma el contexto. Solo se usan datos que el
+    # servidor no conoce (ej: user_fixed_costs de la calculadora).
+    context_data: Dict[str, Any] = {}
 
 # --- AQUÍ ESTÁ LA MEJORA CLAVE: PROMPTS OPTIMIZADOS ---
 def _build_prompt(tipo: str, data: Dict[str, Any]) -> str:
@@ -166,41 +217,99 @@ def _build_prompt(tipo: str, data: Dict[str, Any]) -> str:
 
     return "Analiza los datos y da un consejo útil."
 
-@router.post("/analyze")
-async def analyze_business(request: AIRequest):
-    if not client:
-        return {"insight": "Error: IA no configurada."}
-
-    tipo = (request.analysis_type or "").strip().lower()
-    data = request.context_data or {}
-    prompt = _build_prompt(tipo, data)
-    
-    # Selección de modelos
-    models = _choose_models_to_try()
-    
-    # Lógica de Retry Robusta (la tuya estaba muy bien, la mantengo casi igual)
-    for model_id in models:
-        try:
-            resp = client.models.generate_content(
+async def _generate(model_id: str, prompt: str):
+    """Un intento contra un modelo, acotado por semáforo y timeout."""
+    async with _ai_semaphore:
+        return await asyncio.wait_for(
+            client.aio.models.generate_content(
                 model=model_id, 
                 contents=prompt,
-                config=genai.types.GenerateContentConfig(
+                config=_genai_types.GenerateContentConfig(
                     temperature=0.7, # Creatividad controlada
                     max_output_tokens=300 # Limitamos la respuesta para ahorrar y ser concisos
                 )
-            )
-            text = getattr(resp, "text", None) or "Sin respuesta."
-            return {"insight": text, "model_used": model_id}
-
-        except Exception as e:
-            logger.warning(f"Fallo modelo {model_id}: {e}")
-            if _is_rate_limit(e):
-                continue # Prueba el siguiente modelo rápido
-            if _is_auth_or_billing(e):
-                return {"insight": "Error de cuenta Gemini (Cuota/Pago)."}
-            
-            # Pequeño backoff si no es el último modelo
-            if model_id != models[-1]:
-                await asyncio.sleep(1)
-
-    return {"insight": "El sistema está saturado. Intenta en 1 minuto."}
\ No newline at end of file
+            ),
+            timeout=AI_CALL_TIMEOUT
+        )
+
+async def _call_models(prompt: str) -> Dict[str, Any]:
+    global _ai_pending
+    # Si ya hay demasiadas peticiones esperando, respondemos al tiro
+    if _ai_pending >= AI_MAX_CONCURRENCY + AI_MAX_QUEUE:
+        return {"insight": "El sistema está saturado. Intenta en 1 minuto."}
+
+    _ai_pending += 1
+    try:
+        # Selección de modelos: el más sano y rápido primero, sin los de circuito abierto
+        models = _choose_models_to_try()
+        
+        # Si un modelo falla se pasa al siguiente de inmediato; el circuit
+        # breaker evita volver a probarlo hasta que se recupere.
+        for model_id in models:
+            started = time.monotonic()
+            try:
+                resp = await _generate(model_id, prompt)
+                model_health.record_success(model_id, time.monotonic() - started)
+                observe_ai_call(model_id, "ok", time.monotonic() - started)
+                text = getattr(resp, "text", None) or "Sin respuesta."
+                return {"insight": text, "model_used": model_id}
+
+            except asyncio.TimeoutError:
+                logger.warning(f"Timeout modelo {model_id} ({AI_CALL_TIMEOUT}s)")
+                model_health.record_timeout(model_id, time.monotonic() - started)
+                observe_ai_call(model_id, "timeout", time.monotonic() - started)
+                continue
+
+            except Exception as e:
+                logger.warning(f"Fallo modelo {model_id}: {e}")
+                observe_ai_call(model_id, "rate_limit" if _is_rate_limit(e) else "error", time.monotonic() - started)
+                if _is_rate_limit(e):
+                    model_health.record_rate_limit(model_id, _extract_retry_seconds(e))
+                    continue # Prueba el siguiente modelo rápido
+                if _is_auth_or_billing(e):
+                    return {"insight": "Error de cuenta Gemini (Cuota/Pago)."}
+                model_health.record_failure(model_id)
+
+        return {"insight": "El sistema está saturado. Intenta en 1 minuto."}
+    finally:
+        _ai_pending -= 1
+
+def _load_context(user_id: int, tipo: str, context_data: Dict[str, Any]) -> Dict[str, Any]:
+    # Sesión propia y corta: la conexión vuelve al pool antes de esperar al
+    # modelo (una llamada puede tardar decenas de segundos)
+    db = read_session_factory(user_id)()
+    try:
+        return build_context(db, user_id, tipo, context_data)
+    finally:
+        db.close()
+
+@router.post("/analyze")
+async def analyze_business(
+    request: AIRequest,
+    current_user: Principal = Depends(get_current_user)
+):
+    if not await run_in_threadpool(_get_client):
+        return {"insight": "Error: IA no configurada."}
+
+    tipo = (request.analysis_type or "").strip().lower()
+    # Una consulta agregada por tipo, fuera del event loop (ver ai_context.py)
+    data = await run_in_threadpool(_load_context, current_user.id, tipo, request.context_data or {})
+    prompt = _build_prompt(tipo, data)
+
+    # Mismo prompt => misma respuesta (caché + una sola llamada para pedidos simultáneos).
+    # Solo se guardan respuestas reales del modelo, no los mensajes de error.
+    return await insight_cache.get_or_compute(
+        prompt_key(tipo, prompt),
+        tipo,
+        lambda: _call_models(prompt),
+        cacheable=lambda result: "model_used" in result
+    )
+
+# Datos operativos (uso de la caché, estado de los modelos): solo administradores
+@router.get("/cache-stats")
+def get_cache_stats(admin: Principal = Depends(get_current_admin)):
+    return insight_cache.stats()
+
+@router.get("/health")
+def get_models_health(admin: Principal = Depends(get_current_admin)):
+    return model_health.snapshot()
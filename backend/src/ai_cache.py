@@ -0,0 +1,93 @@
+import os
+import asyncio
+import hashlib
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .ttl_cache import TTLCache
+
+# ==========================================
+#     CACHÉ DE INSIGHTS DE IA (POR PROMPT)
+# ==========================================
+# La clave es un hash del prompt ya armado: si los datos de contexto no
+# cambiaron, el prompt es idéntico y reutilizamos la respuesta.
+# - TTL distinto por tipo de análisis (el "general" cambia más seguido).
+# - LRU acotado en memoria.
+# - Single-flight: N peticiones idénticas simultáneas comparten UNA sola
+#   llamada al modelo (las demás esperan el mismo resultado).
+# Vive en el event loop; el LRU con TTL es el común del proceso (ttl_cache.py).
+
+INSIGHT_TTLS: Dict[str, float] = {
+    "general": float(os.getenv("AI_CACHE_TTL_GENERAL", "300")),
+    "growth": float(os.getenv("AI_CACHE_TTL_GROWTH", "1800")),
+    "costs": float(os.getenv("AI_CACHE_TTL_COSTS", "1800")),
+    "cash": float(os.getenv("AI_CACHE_TTL_CASH", "3600")),
+}
+DEFAULT_TTL = float(os.getenv("AI_CACHE_TTL_DEFAULT", "600"))
+INSIGHT_CACHE_SIZE = int(os.getenv("AI_CACHE_SIZE", "256"))
+
+def prompt_key(tipo: str, prompt: str) -> str:
+    return hashlib.sha256(f"{tipo}\n{prompt}".encode("utf-8")).hexdigest()
+
+class InsightCache:
+    def __init__(self, maxsize: int = INSIGHT_CACHE_SIZE, ttls: Optional[Dict[str, float]] = None):
+        self.ttls = ttls if ttls is not None else INSIGHT_TTLS
+        self._data = TTLCache(maxsize)
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_compute(
+        self,
+        key: str,
+        tipo: str,
+        compute: Callable[[], Awaitable[Dict[str, Any]]],
+        cacheable: Callable[[Dict[str, Any]], bool] = lambda r: True
+    ) -> Dict[str, Any]:
+        cached = self._data.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await compute()
+            if cacheable(result):
+                # TTL distinto por tipo de análisis (<= 0: no se guarda)
+                self._data.set(key, result, self.ttls.get(tipo, DEFAULT_TTL))
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Evita el warning "exception was never retrieved" si nadie esperaba
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self._data.evictions,
+            "size": len(self._data),
+            "inflight": len(self._inflight),
+            "hit_ratio": round((self.hits + self.coalesced) / lookups, 3) if lookups else 0.0,
+        }
+
+insight_cache = InsightCache()
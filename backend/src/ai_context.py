@@ -0,0 +1,115 @@
+import calendar
+from datetime import date, timedelta
+from typing import Any, Dict
+
+from sqlalchemy import func, case, select
+from sqlalchemy.orm import Session
+
+from .models import DailySalesRollup, Product
+from .stats import LOW_STOCK_THRESHOLD
+
+# ==========================================
+#     CONTEXTO DE IA ARMADO EN EL SERVIDOR
+# ==========================================
+# Antes el frontend calculaba ventas de hoy, promedio diario, etc. (con
+# llamadas extra a /sales/stats) y las mandaba en context_data. Ahora cada
+# tipo de análisis arma su contexto con UNA consulta agregada sobre el
+# resumen diario del usuario autenticado. Los valores son enteros
+# redondeados para que el prompt sea determinista (y cacheable).
+#
+# Del cliente solo se toma lo que el servidor no puede saber (ej: los
+# costos fijos que escribe el usuario en la calculadora).
+
+AVERAGE_WINDOW_DAYS = 30
+CLOSURES_DAYS = 7
+
+def _general(db: Session, user_id: int, today: date) -> Dict[str, Any]:
+    R = DailySalesRollup
+    low_stock = select(func.count(Product.id)).where(
+        Product.user_id == user_id,
+        Product.stock < LOW_STOCK_THRESHOLD
+    ).scalar_subquery()
+
+    row = db.query(
+        func.coalesce(func.sum(case((R.day == today, R.revenue), else_=0)), 0),
+        func.coalesce(func.sum(case((R.day < today, R.revenue), else_=0)), 0),
+        low_stock
+    ).filter(
+        R.user_id == user_id,
+        R.day >= today - timedelta(days=AVERAGE_WINDOW_DAYS)
+    ).one()
+
+    return {
+        "sales_today": int(row[0]),
+        "daily_average": int(round(row[1] / AVERAGE_WINDOW_DAYS)),
+        "low_stock": int(row[2] or 0),
+    }
+
+def _growth(db: Session, user_id: int, today: date) -> Dict[str, Any]:
+    R = DailySalesRollup
+    month_start = today.replace(day=1)
+    prev_month_end = month_start - timedelta(days=1)
+    prev_month_start = prev_month_end.replace(day=1)
+    # Mismo tramo de días del mes anterior (para comparar peras con peras)
+    prev_cutoff = min(prev_month_start + timedelta(days=(today - month_start).days), prev_month_end)
+
+    in_month = R.day >= month_start
+    in_prev = (R.day >= prev_month_start) & (R.day <= prev_cutoff)
+    row = db.query(
+        func.coalesce(func.sum(case((in_month, R.revenue), else_=0)), 0),
+        func.coalesce(func.sum(case((in_month, R.profit), else_=0)), 0),
+        func.coalesce(func.sum(case((in_prev, R.revenue), else_=0)), 0),
+    ).filter(
+        R.user_id == user_id,
+        R.day >= prev_month_start
+    ).one()
+
+    income, profit, prev_income = int(row[0]), int(round(row[1])), int(row[2])
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    trend = f"Día {today.day} de {days_in_month} del mes."
+    if prev_income > 0:
+        change = (income - prev_income) / prev_income * 100
+        trend += f" Mes anterior al mismo día: ${prev_income} ({change:+.1f}%)."
+    else:
+        trend += " Sin ventas del mes anterior para comparar."
+
+    return {"month_income": income, "month_profit": profit, "trend_desc": trend}
+
+def _costs(db: Session, user_id: int, today: date) -> Dict[str, Any]:
+    R = DailySalesRollup
+    income = db.query(func.coalesce(func.sum(R.revenue), 0)).filter(
+        R.user_id == user_id,
+        R.day >= today.replace(day=1)
+    ).scalar()
+    return {"month_income": int(income)}
+
+def _cash(db: Session, user_id: int, today: date) -> Dict[str, Any]:
+    R = DailySalesRollup
+    since = today - timedelta(days=CLOSURES_DAYS - 1)
+    rows = db.query(R.day, func.sum(R.revenue)).filter(
+        R.user_id == user_id,
+        R.day >= since
+    ).group_by(R.day).all()
+    by_day = {day: int(total or 0) for day, total in rows}
+
+    # Los días sin ventas van con $0 (es justo lo que el auditor debe ver)
+    closures = []
+    for offset in range(CLOSURES_DAYS):
+        day = since + timedelta(days=offset)
+        closures.append(f"{day.strftime('%d/%m')}: ${by_day.get(day, 0)}")
+    return {"recent_closures": ", ".join(closures)}
+
+_BUILDERS = {
+    "general": _general,
+    "growth": _growth,
+    "costs": _costs,
+    "cash": _cash,
+}
+
+def build_context(db: Session, user_id: int, tipo: str, client_data: Dict[str, Any], today: date = None) -> Dict[str, Any]:
+    """Mezcla los datos del cliente con los calculados en el servidor (estos últimos mandan)."""
+    context = dict(client_data or {})
+    builder = _BUILDERS.get(tipo)
+    if builder is not None:
+        context.update(builder(db, user_id, today or date.today()))
+    return context
@@ -0,0 +1,125 @@
+import os
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+# ==========================================
+#   SALUD DE MODELOS (CIRCUIT BREAKER + RUTEO)
+# ==========================================
+# Por cada modelo guardamos las últimas latencias y resultados:
+# - Si responde 429, abrimos su "circuito" por el retryDelay que informa
+#   la API; si hace timeout o falla seguido, lo abrimos con backoff.
+#   Mientras el circuito está abierto el modelo no se intenta.
+# - Al rutear, los modelos sanos se ordenan por tasa de error y p95 de
+#   latencia. Los modelos sin historial se prueban primero, respetando el
+#   orden de PREFERRED_MODELS, para que acumulen datos.
+
+HEALTH_WINDOW = int(os.getenv("AI_HEALTH_WINDOW", "50"))                  # Últimas N llamadas por modelo
+TIMEOUT_COOLDOWN = float(os.getenv("AI_TIMEOUT_COOLDOWN", "30"))          # Segundos fuera tras un timeout
+FAILURE_THRESHOLD = int(os.getenv("AI_FAILURE_THRESHOLD", "3"))           # Fallos seguidos antes de abrir
+FAILURE_COOLDOWN = float(os.getenv("AI_FAILURE_COOLDOWN", "15"))          # Base del backoff
+MAX_COOLDOWN = float(os.getenv("AI_MAX_COOLDOWN", "300"))
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+class _ModelStats:
+    def __init__(self, window: int):
+        self.latencies: Deque[float] = deque(maxlen=window)
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.last_error: Optional[str] = None
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - (sum(self.outcomes) / len(self.outcomes))
+
+class ModelHealth:
+    def __init__(self, window: int = HEALTH_WINDOW):
+        self.window = window
+        self._models: Dict[str, _ModelStats] = {}
+
+    def _stats(self, model_id: str) -> _ModelStats:
+        if model_id not in self._models:
+            self._models[model_id] = _ModelStats(self.window)
+        return self._models[model_id]
+
+    def is_open(self, model_id: str, now: Optional[float] = None) -> bool:
+        stats = self._models.get(model_id)
+        return bool(stats and stats.open_until > (now or time.monotonic()))
+
+    def record_success(self, model_id: str, latency: float):
+        stats = self._stats(model_id)
+        stats.latencies.append(latency)
+        stats.outcomes.append(True)
+        stats.consecutive_failures = 0
+        stats.open_until = 0.0
+
+    def record_rate_limit(self, model_id: str, retry_after: float):
+        stats = self._stats(model_id)
+        stats.outcomes.append(False)
+        stats.consecutive_failures += 1
+        stats.last_error = "rate_limit"
+        stats.open_until = time.monotonic() + retry_after
+
+    def record_timeout(self, model_id: str, latency: float):
+        stats = self._stats(model_id)
+        stats.latencies.append(latency)
+        stats.outcomes.append(False)
+        stats.consecutive_failures += 1
+        stats.last_error = "timeout"
+        stats.open_until = time.monotonic() + TIMEOUT_COOLDOWN
+
+    def record_failure(self, model_id: str):
+        stats = self._stats(model_id)
+        stats.outcomes.append(False)
+        stats.consecutive_failures += 1
+        stats.last_error = "error"
+        if stats.consecutive_failures >= FAILURE_THRESHOLD:
+            exponent = stats.consecutive_failures - FAILURE_THRESHOLD
+            stats.open_until = time.monotonic() + min(MAX_COOLDOWN, FAILURE_COOLDOWN * (2 ** exponent))
+
+    def rank(self, models: List[str]) -> List[str]:
+        """Ordena los modelos del más sano/rápido al peor; los de circuito abierto quedan fuera."""
+        now = time.monotonic()
+
+        def score(item):
+            position, model_id = item
+            stats = self._models.get(model_id)
+            if stats is None or not stats.latencies:
+                return (0, 0.0, position) # Sin datos: explorar en orden de preferencia
+            p95 = _percentile(list(stats.latencies), 95) or 0.0
+            return (1, p95 * (1 + 2 * stats.error_rate()), position)
+
+        closed = [(i, m) for i, m in enumerate(models) if not self.is_open(m, now)]
+        if closed:
+            return [m for _, m in sorted(closed, key=score)]
+
+        # Todos abiertos: probamos igual el que se recupera primero
+        return sorted(models, key=lambda m: self._models[m].open_until)
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        data = {}
+        for model_id, stats in self._models.items():
+            latencies = list(stats.latencies)
+            p50 = _percentile(latencies, 50)
+            p95 = _percentile(latencies, 95)
+            data[model_id] = {
+                "calls": len(stats.outcomes),
+                "error_rate": round(stats.error_rate(), 3),
+                "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+                "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+                "circuit_open": stats.open_until > now,
+                "open_for_s": round(max(0.0, stats.open_until - now), 1),
+                "last_error": stats.last_error,
+            }
+        return data
+
+model_health = ModelHealth()
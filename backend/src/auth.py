@@ -0,0 +1,100 @@
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Query, status
+from fastapi.security import OAuth2PasswordBearer
+from jose import jwt, JWTError
+from sqlalchemy.orm import Session
+
+from .database import get_db, SessionLocal
+from .models import User
+from .principals import Principal, principal_cache
+from .security import SECRET_KEY, ALGORITHM, STREAM_TOKEN_SCOPE
+
+# ==========================================
+#         AUTENTICACIÓN
+# ==========================================
+# Dependencias compartidas por main.py y los routers (ej: ai.py)
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login", auto_error=False)
+
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="No se pudo validar las credenciales",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _decode_token(token: str, scope: Optional[str] = None) -> dict:
+    # Un token de stream solo sirve para /events/stream, y un token de sesión no sirve como token de stream
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise _credentials_exception()
+    if payload.get("sub") is None or payload.get("scope") != scope:
+        raise _credentials_exception()
+    return payload
+
+def _load_principal(payload: dict, db: Session) -> Principal:
+    email: str = payload["sub"]
+    user_id = payload.get("uid")
+
+    # 1. Caché en memoria (la mayoría de las peticiones terminan aquí).
+    # El email se puede reutilizar (cuenta borrada y vuelta a registrar):
+    # el token tiene que ser de la cuenta cacheada (ver Principal.matches).
+    principal = principal_cache.get(email)
+    if principal is not None and principal.matches(payload):
+        return principal
+
+    # 2. Tokens nuevos traen el id: búsqueda por clave primaria
+    if user_id is not None:
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is not None and user.email != email:
+            user = None # El email cambió después de emitir el token
+    else:
+        user = db.query(User).filter(User.email == email).first()
+
+    if user is None:
+        raise _credentials_exception()
+
+    principal = Principal.from_user(user)
+    if not principal.matches(payload):
+        raise _credentials_exception()
+    principal_cache.set(email, principal)
+    # El Principal no depende de la sesión: se devuelve la conexión al pool
+    # (si no, la retendría hasta el final de la petición, ej: durante una llamada a la IA)
+    db.rollback()
+    return principal
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    # Sync: en un fallo de caché consulta la base, y eso corre en el threadpool, no en el event loop
+    return _load_principal(_decode_token(token), db)
+
+def get_stream_user(
+    token: Optional[str] = Depends(optional_oauth2_scheme),
+    stream_token: Optional[str] = Query(None)
+) -> Principal:
+    # EventSource (SSE) del navegador no puede mandar cabeceras: acepta
+    # ?stream_token= con un token corto que solo sirve para esto (POST /events/token),
+    # nunca el token de sesión de 12 horas (quedaría en los logs de acceso).
+    # Función sync (corre en el threadpool) con sesión propia y corta para no
+    # retener una conexión del pool mientras dura el stream.
+    if token:
+        payload = _decode_token(token)
+    elif stream_token:
+        payload = _decode_token(stream_token, scope=STREAM_TOKEN_SCOPE)
+    else:
+        raise _credentials_exception()
+    db = SessionLocal()
+    try:
+        return _load_principal(payload, db)
+    finally:
+        db.close()
+
+def get_current_admin(current_user: Principal = Depends(get_current_user)):
+    if not current_user.is_admin:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, 
+            detail="Se requieren privilegios de administrador"
+        )
+    return current_user
@@ -0,0 +1,71 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request, Response
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .db_utils import upsert_increment
+from .models import CatalogVersion, GlobalMessage, SupportTicket
+
+# ==========================================
+#     GET CONDICIONAL (ETag / 304 Not Modified)
+# ==========================================
+# /products, /announcements y /my-tickets se consultan seguido y casi
+# siempre devuelven lo mismo. Antes de cargar nada se calcula un "token de
+# versión" barato:
+#   - /products:      contador por usuario (catalog_versions) que se
+#                     incrementa en cada escritura de productos o stock.
+#   - /announcements: COUNT + MAX(id) + MAX(created_at) de los anuncios.
+#   - /my-tickets:    COUNT + MAX(id) + MAX(updated_at) de los tickets del
+#                     usuario (índice por user_id).
+# El ETag combina ese token con el usuario y los parámetros de la URL. Si
+# coincide con If-None-Match se responde 304 sin consultar ni serializar
+# el listado. Cache-Control "no-cache" hace que el navegador revalide
+# solo (envía If-None-Match por su cuenta).
+
+CACHE_CONTROL = "private, no-cache"
+
+def bump_catalog_version(db: Session, user_id: Optional[int]):
+    """Marca el catálogo del usuario como modificado (no hace commit: va en la transacción del llamador)."""
+    if user_id is None:
+        return
+
+    upsert_increment(db, CatalogVersion, keys={"user_id": user_id}, increments={"version": 1})
+
+def catalog_version(db: Session, user_id: int) -> int:
+    version = db.query(CatalogVersion.version).filter(CatalogVersion.user_id == user_id).scalar()
+    return version or 0
+
+def announcements_version(db: Session) -> tuple:
+    return tuple(db.query(
+        func.count(GlobalMessage.id), func.max(GlobalMessage.id), func.max(GlobalMessage.created_at)
+    ).one())
+
+def tickets_version(db: Session, user_id: int) -> tuple:
+    return tuple(db.query(
+        func.count(SupportTicket.id), func.max(SupportTicket.id), func.max(SupportTicket.updated_at)
+    ).filter(SupportTicket.user_id == user_id).one())
+
+def make_etag(request: Request, scope: Any, version: Any) -> str:
+    # Los parámetros (limit, cursor, filtros...) cambian el contenido, así que van en el ETag
+    raw = f"{request.url.path}?{sorted(request.query_params.multi_items())}|{scope}|{version}"
+    return 'W/"' + hashlib.sha1(raw.encode("utf-8")).hexdigest()[:20] + '"'
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Comparación débil: W/"x" y "x" son equivalentes
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+def conditional_response(request: Request, response: Response, scope: Any, version: Any) -> Optional[Response]:
+    """Pone ETag en la respuesta; si el cliente ya tiene esta versión retorna el 304 listo para devolver."""
+    etag = make_etag(request, scope, version)
+    if _matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": CACHE_CONTROL})
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    return None
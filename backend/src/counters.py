@@ -0,0 +1,111 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+from typing import Dict
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from .db_utils import upsert_increment
+from .models import PlatformCounter, Product, Sale, User
+
+logger = logging.getLogger("counters")
+
+# ==========================================
+#        CONTADORES GLOBALES DE PLATAFORMA
+# ==========================================
+# /admin/stats lee estos contadores (unas pocas filas) en vez de hacer
+# COUNT(*) / SUM() sobre las tablas completas de todos los usuarios.
+#   - bump() se llama ANTES del commit de registro, alta de productos,
+#     importación, ventas y baja de cuentas (misma transacción).
+#   - reconcile_counters() recalcula desde las tablas base y corrige la
+#     diferencia (ej: escrituras hechas a mano en la base). Se puede correr
+#     por cron o dejarlo en el proceso con COUNTERS_RECONCILE_SECONDS > 0:
+#
+#     python -m src.counters            # reconcilia una vez
+#     python -m src.counters --show     # solo muestra los valores
+
+COUNTERS = ("users", "sales", "products", "revenue")
+COUNTER_SHARDS = int(os.getenv("COUNTER_SHARDS", "8"))
+RECONCILE_SECONDS = float(os.getenv("COUNTERS_RECONCILE_SECONDS", "0"))
+
+def bump(db: Session, **deltas: int):
+    """Suma los deltas (ej: sales=1, revenue=1190) a un shard al azar de cada contador (no hace commit)."""
+    shard = random.randrange(COUNTER_SHARDS)
+    for name, delta in deltas.items():
+        if name not in COUNTERS:
+            raise ValueError(f"Contador desconocido: {name}")
+        if delta:
+            upsert_increment(db, PlatformCounter, keys={"name": name, "shard": shard}, increments={"value": delta})
+
+def read_counters(db: Session) -> Dict[str, int]:
+    rows = db.query(PlatformCounter.name, func.sum(PlatformCounter.value)).group_by(PlatformCounter.name).all()
+    values = {name: int(total or 0) for name, total in rows}
+    return {name: values.get(name, 0) for name in COUNTERS}
+
+def actual_counts(db: Session) -> Dict[str, int]:
+    """Los mismos totales calculados desde las tablas base (recorre todo: solo para reconciliar)."""
+    return {
+        "users": db.query(func.count(User.id)).scalar() or 0,
+        "sales": db.query(func.count(Sale.id)).scalar() or 0,
+        "products": db.query(func.count(Product.id)).scalar() or 0,
+        "revenue": int(db.query(func.coalesce(func.sum(Sale.total_amount), 0)).scalar() or 0),
+    }
+
+def reconcile_counters(db: Session) -> Dict[str, int]:
+    """Corrige la deriva entre contadores y tablas base. Retorna la corrección aplicada por contador."""
+    try:
+        # Bloquea las filas existentes para que ninguna venta se cuele entre lectura y corrección
+        db.query(PlatformCounter).with_for_update().all()
+        actual = actual_counts(db)
+        current = read_counters(db)
+        drift = {name: actual[name] - current[name] for name in COUNTERS}
+        bump(db, **drift)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    corrected = {name: d for name, d in drift.items() if d}
+    if corrected:
+        logger.warning("Contadores de plataforma corregidos: %s", corrected)
+    return drift
+
+async def reconcile_loop(session_factory, interval: float = RECONCILE_SECONDS):
+    """Tarea de fondo: reconcilia cada `interval` segundos (en el threadpool, sin bloquear el loop)."""
+    loop = asyncio.get_running_loop()
+
+    def run_once():
+        db = session_factory()
+        try:
+            reconcile_counters(db)
+        finally:
+            db.close()
+
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await loop.run_in_executor(None, run_once)
+        except Exception as e:
+            logger.error("Falló la reconciliación de contadores: %s", e)
+
+if __name__ == "__main__":
+    from .database import SessionLocal, engine
+    from .migrations import run_migrations
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Reconcilia los contadores globales de plataforma")
+    parser.add_argument("--show", action="store_true", help="Solo muestra los valores actuales")
+    args = parser.parse_args()
+
+    run_migrations(engine)
+    session = SessionLocal()
+    try:
+        if args.show:
+            print(read_counters(session))
+        else:
+            print(f"Corrección aplicada: {reconcile_counters(session)}")
+    finally:
+        session.close()
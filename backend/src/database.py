@@ -2,6 +2,9 @@ import os
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from .pool_budget import pool_settings, driver_args
 
 # 1. Intentamos obtener la URL de Producción (Render/Supabase)
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
@@ -25,18 +28,57 @@ if SQLALCHEMY_DATABASE_URL and SQLALCHEMY_DATABASE_URL.startswith("postgres://")
     SQLALCHEMY_DATABASE_URL = SQLALCHEMY_DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
 # ==============================================================================
-# 4. CREAR EL MOTOR CON OPTIMIZACIÓN (POOLING) - ¡AQUÍ ESTÁ LA SOLUCIÓN!
+# 4. CREAR EL MOTOR CON OPTIMIZACIÓN (POOLING)
 # ==============================================================================
+# El tamaño del pool sale del presupuesto global de conexiones repartido
+# entre los workers (ver pool_budget.py). Con DB_PGBOUNCER=1 el pool lo
+# maneja PgBouncer y aquí se usa NullPool.
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL,
     pool_pre_ping=True,    # Verifica si la conexión sigue viva antes de usarla (evita errores 500)
-    pool_size=20,          # Mantiene 20 conexiones abiertas listas para usar (Login instantáneo)
-    max_overflow=30,       # Permite 30 conexiones extra si hay mucho tráfico de golpe
     pool_recycle=1800,     # Recicla (renueva) las conexiones cada 30 min para evitar timeouts
-    pool_timeout=30        # Espera máximo 30s por una conexión libre
+    connect_args=driver_args(SQLALCHEMY_DATABASE_URL),
+    **pool_settings()
 )
 
+# Conexión directa a Postgres (sin PgBouncer) para migraciones: usan
+# pg_advisory_lock, que necesita una sesión propia
+DATABASE_DIRECT_URL = os.getenv("DATABASE_DIRECT_URL")
+if DATABASE_DIRECT_URL and DATABASE_DIRECT_URL.startswith("postgres://"):
+    DATABASE_DIRECT_URL = DATABASE_DIRECT_URL.replace("postgres://", "postgresql://", 1)
+
+_migration_engine = None
+
+def get_migration_engine():
+    global _migration_engine
+    if not DATABASE_DIRECT_URL:
+        return engine
+    if _migration_engine is None:
+        _migration_engine = create_engine(DATABASE_DIRECT_URL, poolclass=NullPool)
+    return _migration_engine
+
+# ==============================================================================
+# 5. RÉPLICA DE LECTURA OPCIONAL (DATABASE_READ_URL)
+# ==============================================================================
+# Los endpoints de reportes leen de aquí (ver replica.py). Sin réplica,
+# read_engine es el mismo engine principal y no cambia nada.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+if DATABASE_READ_URL and DATABASE_READ_URL.startswith("postgres://"):
+    DATABASE_READ_URL = DATABASE_READ_URL.replace("postgres://", "postgresql://", 1)
+
+if DATABASE_READ_URL:
+    read_engine = create_engine(
+        DATABASE_READ_URL,
+        pool_pre_ping=True,
+        pool_recycle=1800,
+        connect_args=driver_args(DATABASE_READ_URL),
+        **pool_settings() # Mismo presupuesto, contado contra el servidor de la réplica
+    )
+else:
+    read_engine = engine
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
 def get_db():
@@ -0,0 +1,87 @@
+from typing import Any, Dict, Optional
+
+from sqlalchemy import Integer, String, func, literal_column
+from sqlalchemy.orm import Session
+
+# ==========================================
+#     UTILIDADES SQL COMPARTIDAS (UPSERT)
+# ==========================================
+# Las tablas desnormalizadas (rollup diario, valorización, contadores,
+# versión del catálogo) se mantienen sumando deltas dentro de la
+# transacción del llamador. upsert_increment() lo hace en una sola
+# sentencia INSERT ... ON CONFLICT DO UPDATE (Postgres / SQLite), así dos
+# escrituras simultáneas nunca pisan el valor de la otra.
+
+def dialect_insert(db: Session):
+    """Devuelve el insert con soporte ON CONFLICT del motor actual (o None)."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as pg_insert
+        return pg_insert
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+        return sqlite_insert
+    return None
+
+def upsert_increment(
+    db: Session,
+    model,
+    keys: Dict[str, Any],
+    increments: Dict[str, Any],
+    values: Optional[Dict[str, Any]] = None
+):
+    """Crea la fila `keys` o le suma `increments`; `values` se sobrescribe (no hace commit)."""
+    values = values or {}
+    insert = dialect_insert(db)
+    if insert is not None:
+        table = model.__table__
+        stmt = insert(table).values(**keys, **increments, **values)
+        set_ = {col: table.c[col] + stmt.excluded[col] for col in increments}
+        set_.update({col: stmt.excluded[col] for col in values})
+        db.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=set_))
+        return
+
+    # Motores sin ON CONFLICT: buscamos la fila bloqueándola y la incrementamos.
+    # El flush deja el cambio en la base al momento: la sesión no hace
+    # autoflush, y un segundo llamado en la misma transacción debe ver la
+    # fila (y no pisar el incremento pendiente)
+    row = db.query(model).filter_by(**keys).with_for_update().first()
+    if row is None:
+        db.add(model(**keys, **increments, **values))
+    else:
+        for col, delta in increments.items():
+            setattr(row, col, getattr(model, col) + delta)
+        for col, value in values.items():
+            setattr(row, col, value)
+    db.flush()
+
+# ==========================================
+#     ORDEN SOBRE COLUMNAS CON NULL
+# ==========================================
+# El keyset (col, id) > (:valor, :id) nunca es verdadero con col NULL, así
+# que las columnas de orden que admiten NULL se usan como
+# coalesce(col, centinela), con un centinela menor que cualquier valor real
+# (los NULL quedan primero, igual en SQLite y Postgres). El centinela va
+# escrito en el SQL (no como parámetro) para que la consulta sea idéntica
+# a la expresión de los índices declarados en models.py y los use.
+
+_NULL_SENTINELS = [
+    # (tipo, valor en Python, literal SQL)
+    (String, "", "''"),
+    (Integer, -2**31, str(-2**31)),
+]
+
+def null_sentinel(column_type) -> Any:
+    for type_, sentinel, _ in _NULL_SENTINELS:
+        if isinstance(column_type, type_):
+            return sentinel
+    raise ValueError(f"Sin centinela para ordenar por una columna {column_type!r} que admite NULL")
+
+def sortable(column):
+    """La columna tal cual si es NOT NULL; si no, coalesce(columna, centinela) con el mismo tipo."""
+    if not column.nullable:
+        return column
+    for type_, _, sql_literal in _NULL_SENTINELS:
+        if isinstance(column.type, type_):
+            return func.coalesce(column, literal_column(sql_literal), type_=column.type)
+    raise ValueError(f"Sin centinela para ordenar por una columna {column.type!r} que admite NULL")
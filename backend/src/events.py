@@ -0,0 +1,167 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("events")
+
+# ==========================================
+#     EVENTOS EN VIVO (PUB/SUB + SSE)
+# ==========================================
+# Los endpoints que escriben (ventas, stock, productos) publican, DESPUÉS
+# del commit, un evento chico con el cambio (id de producto, stock nuevo,
+# total de la venta...). Cada pestaña abierta del usuario está suscrita a
+# su canal por Server-Sent Events (GET /events/stream) y actualiza la
+# pantalla sin volver a pedir los endpoints pesados.
+#
+# El bus es intercambiable (interfaz EventBus). InProcessBus reparte los
+# eventos dentro del proceso: con varios workers cada uno solo ve sus
+# propias escrituras, así que para eso hay que implementar EventBus sobre
+# un broker compartido (ej: Redis PUBLISH/SUBSCRIBE) y asignarlo a
+# event_bus al arrancar.
+#
+# Los endpoints sync corren en el threadpool, por eso publish() es seguro
+# entre hilos y entrega en el loop de cada suscriptor con
+# call_soon_threadsafe.
+
+SSE_QUEUE_SIZE = int(os.getenv("SSE_QUEUE_SIZE", "100"))
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+
+class EventBus:
+    """Interfaz del bus: publish() desde cualquier hilo, subscribe() desde el event loop."""
+
+    def publish(self, channel: str, event: Dict[str, Any]):
+        raise NotImplementedError
+
+    def subscribe(self, channel: str) -> "Subscription":
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription: "Subscription"):
+        raise NotImplementedError
+
+class Subscription:
+    def __init__(self, channel: str, maxsize: int = SSE_QUEUE_SIZE):
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def _offer(self, message: Tuple[int, Dict[str, Any]]):
+        # Corre en el loop del suscriptor. Cliente lento: se descarta lo más
+        # viejo y se le avisa que debe recargar (evento "resync")
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            message = (message[0], {"type": "resync"})
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout: float) -> Optional[Tuple[int, Dict[str, Any]]]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+class InProcessBus(EventBus):
+    def __init__(self):
+        self._subscribers: Dict[str, List[Subscription]] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.published = 0
+
+    def publish(self, channel: str, event: Dict[str, Any]):
+        with self._lock:
+            targets = list(self._subscribers.get(channel, ()))
+            event_id = next(self._ids)
+            self.published += 1
+        for sub in targets:
+            try:
+                sub.loop.call_soon_threadsafe(sub._offer, (event_id, event))
+            except RuntimeError:
+                pass # El loop del suscriptor ya se cerró
+
+    def subscribe(self, channel: str) -> Subscription:
+        sub = Subscription(channel)
+        with self._lock:
+            self._subscribers.setdefault(channel, []).append(sub)
+        return sub
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subs = self._subscribers.get(subscription.channel, [])
+            if subscription in subs:
+                subs.remove(subscription)
+            if not subs:
+                self._subscribers.pop(subscription.channel, None)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "channels": len(self._subscribers),
+                "subscribers": sum(len(s) for s in self._subscribers.values()),
+                "published": self.published,
+            }
+
+event_bus: EventBus = InProcessBus()
+
+def user_channel(user_id: int) -> str:
+    return f"user:{user_id}"
+
+def publish_user_event(user_id: Optional[int], event: Dict[str, Any]):
+    """Publica un evento al canal del usuario. Nunca hace fallar la escritura que lo origina."""
+    if user_id is None:
+        return
+    try:
+        event_bus.publish(user_channel(user_id), event)
+    except Exception as e:
+        logger.warning("No se pudo publicar el evento %s: %s", event.get("type"), e)
+
+# --- Eventos compactos de cada escritura ---
+def stock_event(changes: List[Tuple[int, int]]) -> Dict[str, Any]:
+    return {"type": "stock", "changes": [{"product_id": pid, "stock": stock} for pid, stock in changes]}
+
+def sale_event(sale, stock_changes: List[Tuple[int, int]]) -> Dict[str, Any]:
+    return {
+        "type": "sale",
+        "sale_id": sale.id,
+        "total": sale.total_amount,
+        "payment_method": sale.payment_method,
+        "date": sale.date.isoformat(),
+        "changes": [{"product_id": pid, "stock": stock} for pid, stock in stock_changes],
+    }
+
+def product_event(product) -> Dict[str, Any]:
+    return {
+        "type": "product",
+        "product_id": product.id,
+        "barcode": product.barcode,
+        "name": product.name,
+        "stock": product.stock,
+        "sale_price": product.sale_price,
+    }
+
+def catalog_event(inserted: int) -> Dict[str, Any]:
+    # Importación masiva: demasiadas filas para mandarlas una a una, el cliente recarga
+    return {"type": "catalog", "inserted": inserted}
+
+def _format_sse(event_id: int, event: Dict[str, Any]) -> str:
+    return f"id: {event_id}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+async def sse_stream(request, user_id: int, bus: EventBus = None) -> AsyncIterator[str]:
+    """Generador SSE del usuario: eventos del bus + comentario de heartbeat para mantener viva la conexión."""
+    bus = bus or event_bus
+    sub = bus.subscribe(user_channel(user_id))
+    try:
+        yield "retry: 3000\n\n" # El navegador reconecta solo a los 3s si se corta
+        while True:
+            message = await sub.get(SSE_HEARTBEAT_SECONDS)
+            if await request.is_disconnected():
+                break
+            if message is None:
+                yield ": ping\n\n"
+                continue
+            yield _format_sse(*message)
+    finally:
+        bus.unsubscribe(sub)
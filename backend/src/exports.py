@@ -0,0 +1,131 @@
+import csv
+import io
+import json
+import tempfile
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterator, Optional, Tuple
+
+from sqlalchemy.orm import Session, selectinload
+
+from .database import SessionLocal
+from .models import Sale, SaleItem
+
+# ==========================================
+#      EXPORTACIÓN DE VENTAS EN STREAMING
+# ==========================================
+# - Las ventas se leen en bloques con yield_per (cursor del lado del
+#   servidor en Postgres) y los items + producto se cargan por bloque con
+#   selectinload, sin consultas por fila.
+# - Excel usa el modo write-only de openpyxl (las filas van directo a un
+#   archivo temporal) y luego se envía en trozos.
+# - CSV y NDJSON se generan fila a fila.
+# Cada generador abre su propia sesión (de session_factory: la réplica de
+# lectura si hay, ver replica.py) porque el streaming continúa después de
+# que el endpoint retorna. openpyxl se importa recién al pedir
+# un Excel (acelera el arranque del proceso).
+
+BATCH_SIZE = 500
+CHUNK_SIZE = 64 * 1024
+
+HEADERS = ["ID Venta", "Fecha", "Total", "Productos"]
+DATE_FORMAT = "%d/%m/%Y %H:%M:%S"
+
+def _sales_query(db: Session, user_id: int, date_from: Optional[date], date_to: Optional[date]):
+    query = db.query(Sale).options(
+        selectinload(Sale.items).selectinload(SaleItem.product)
+    ).filter(Sale.user_id == user_id)
+
+    if date_from:
+        query = query.filter(Sale.date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        # date_to es inclusivo (todo el día)
+        query = query.filter(Sale.date < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+
+    return query.order_by(Sale.date.desc(), Sale.id.desc()).yield_per(BATCH_SIZE)
+
+def iter_sales(
+    user_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+    session_factory: Callable[[], Session] = SessionLocal
+) -> Iterator[Tuple]:
+    """Recorre las ventas del usuario por bloques: (id, fecha, total, productos)."""
+    db = session_factory()
+    try:
+        for sale in _sales_query(db, user_id, date_from, date_to):
+            items_str = " + ".join(
+                f"{item.product.name if item.product else 'Producto eliminado'} ({item.quantity})"
+                for item in sale.items
+            )
+            yield sale.id, sale.date, sale.total_amount, items_str
+    finally:
+        db.close()
+
+def stream_sales_xlsx(
+    user_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+    session_factory: Callable[[], Session] = SessionLocal
+) -> Iterator[bytes]:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Reporte de Ventas")
+
+    ws.column_dimensions['A'].width = 10
+    ws.column_dimensions['B'].width = 22
+    ws.column_dimensions['C'].width = 15
+    ws.column_dimensions['D'].width = 50
+
+    header = []
+    for title in HEADERS:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = Font(bold=True)
+        header.append(cell)
+    ws.append(header)
+
+    for sale_id, sale_date, total, items_str in iter_sales(user_id, date_from, date_to, session_factory):
+        ws.append([sale_id, sale_date.strftime(DATE_FORMAT), total, items_str])
+
+    with tempfile.TemporaryFile() as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+def stream_sales_csv(
+    user_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+    session_factory: Callable[[], Session] = SessionLocal
+) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(HEADERS)
+
+    for sale_id, sale_date, total, items_str in iter_sales(user_id, date_from, date_to, session_factory):
+        writer.writerow([sale_id, sale_date.strftime(DATE_FORMAT), total, items_str])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+
+    yield buffer.getvalue()
+
+def stream_sales_ndjson(
+    user_id: int, date_from: Optional[date] = None, date_to: Optional[date] = None,
+    session_factory: Callable[[], Session] = SessionLocal
+) -> Iterator[str]:
+    for sale_id, sale_date, total, items_str in iter_sales(user_id, date_from, date_to, session_factory):
+        yield json.dumps({
+            "id": sale_id,
+            "date": sale_date.isoformat(),
+            "total": total,
+            "products": items_str
+        }, ensure_ascii=False) + "\n"
+
+# formato -> (generador, media_type, nombre de archivo)
+EXPORT_FORMATS = {
+    "xlsx": (stream_sales_xlsx, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", "reporte_ventas.xlsx"),
+    "csv": (stream_sales_csv, "text/csv; charset=utf-8", "reporte_ventas.csv"),
+    "ndjson": (stream_sales_ndjson, "application/x-ndjson", "reporte_ventas.ndjson"),
+}
@@ -0,0 +1,106 @@
+import argparse
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.orm import Session
+
+from .db_utils import upsert_increment
+from .models import InventoryValuation, Product, Sale, SaleItem
+
+# ==========================================
+#   VALORIZACIÓN Y PRODUCTOS SIN MOVIMIENTO
+# ==========================================
+# Dos datos desnormalizados para el dashboard:
+#   - Product.last_sold_at: lo escribe process_sale en el mismo UPDATE que
+#     descuenta el stock. Los "zombies" salen de un rango sobre el índice
+#     (user_id, last_sold_at) en vez de un NOT IN contra todas las ventas.
+#   - InventoryValuation: SUM(stock * cost_price) por usuario, ajustado con
+#     adjust_valuation() en cada movimiento de stock o cambio de costo
+#     (siempre antes del commit del llamador).
+# backfill_inventory() recalcula ambos desde cero; se ejecuta en la
+# migración y se puede relanzar si se sospecha de un descuadre:
+#
+#     python -m src.inventory            # todos los usuarios
+#     python -m src.inventory --user 7   # solo un usuario
+
+ZOMBIE_DAYS = 30
+
+def stock_value(stock: Optional[int], cost_price: Optional[float]) -> float:
+    return (stock or 0) * (cost_price or 0)
+
+def adjust_valuation(db: Session, user_id: Optional[int], delta: float):
+    """Suma delta a la valorización del usuario con un UPSERT atómico (no se hace commit aquí)."""
+    if user_id is None or not delta:
+        return
+
+    upsert_increment(
+        db, InventoryValuation,
+        keys={"user_id": user_id},
+        increments={"value": delta},
+        values={"updated_at": datetime.now()}
+    )
+
+def inventory_value(db: Session, user_id: int) -> float:
+    value = db.query(InventoryValuation.value).filter(InventoryValuation.user_id == user_id).scalar()
+    return value or 0
+
+def zombie_products(db: Session, user_id: int, now: datetime = None, limit: int = 5) -> List[Dict[str, Any]]:
+    """Productos con stock pero sin ventas en los últimos ZOMBIE_DAYS días."""
+    since = (now or datetime.now()) - timedelta(days=ZOMBIE_DAYS)
+    rows = db.query(Product.name, Product.stock).filter(
+        Product.user_id == user_id,
+        or_(Product.last_sold_at.is_(None), Product.last_sold_at < since),
+        Product.stock > 0
+    ).limit(limit).all()
+    return [{"name": name, "stock": stock} for name, stock in rows]
+
+def backfill_inventory(db: Session, user_id: Optional[int] = None) -> Dict[str, int]:
+    """Recalcula last_sold_at y la valorización desde las tablas base."""
+    # 1. Última venta de cada producto (subconsulta correlacionada, un solo UPDATE)
+    last_sale = select(func.max(Sale.date)).join(
+        SaleItem, SaleItem.sale_id == Sale.id
+    ).where(SaleItem.product_id == Product.id).scalar_subquery()
+    stmt = update(Product).values(last_sold_at=last_sale)
+    if user_id is not None:
+        stmt = stmt.where(Product.user_id == user_id)
+    products = db.execute(stmt.execution_options(synchronize_session=False)).rowcount
+
+    # 2. Valorización por usuario
+    delete_q = db.query(InventoryValuation)
+    if user_id is not None:
+        delete_q = delete_q.filter(InventoryValuation.user_id == user_id)
+    delete_q.delete(synchronize_session=False)
+
+    totals_q = db.query(
+        Product.user_id,
+        func.coalesce(func.sum(Product.stock * func.coalesce(Product.cost_price, 0)), 0)
+    ).filter(Product.user_id.isnot(None))
+    if user_id is not None:
+        totals_q = totals_q.filter(Product.user_id == user_id)
+
+    now = datetime.now()
+    rows = [
+        {"user_id": uid, "value": value, "updated_at": now}
+        for uid, value in totals_q.group_by(Product.user_id)
+    ]
+    if rows:
+        db.execute(InventoryValuation.__table__.insert(), rows)
+    db.commit()
+    return {"products": products, "users": len(rows)}
+
+if __name__ == "__main__":
+    from .database import SessionLocal, engine
+    from .migrations import run_migrations
+
+    parser = argparse.ArgumentParser(description="Recalcula last_sold_at y la valorización de inventario")
+    parser.add_argument("--user", type=int, default=None, help="ID de usuario (por defecto todos)")
+    args = parser.parse_args()
+
+    run_migrations(engine)
+    session = SessionLocal()
+    try:
+        result = backfill_inventory(session, args.user)
+        print(f"Productos actualizados: {result['products']}, usuarios valorizados: {result['users']}")
+    finally:
+        session.close()
@@ -1,29 +1,57 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+import asyncio
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Request, Response, UploadFile, File
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, not_
 from pydantic import BaseModel
 from typing import List, Optional  # <--- CORRECCIÓN 1: Agregado Optional
-from jose import jwt, JWTError
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta 
-from openpyxl import Workbook
-from openpyxl.styles import Font
-from sqlalchemy import extract
-import csv
-import io
-from fastapi.responses import StreamingResponse
+from datetime import date
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from fastapi.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from .ai import router as ai_router
 from . import models
-from .database import engine, Base, get_db
-from .models import User, Product, SupportTicket, MovementHistory, Sale, SaleItem, GlobalMessage
-from .security import get_password_hash, verify_password, create_access_token, SECRET_KEY, ALGORITHM
+from .database import engine, read_engine, get_db, SessionLocal, get_migration_engine
+from .replica import get_read_db, note_write, read_session_factory
+from .models import User, Product, SupportTicket, MovementHistory, GlobalMessage
+from .security import get_password_hash, verify_password, create_access_token, create_stream_token, session_key, STREAM_TOKEN_EXPIRE_SECONDS
 from .schemas import SaleCreate, SaleResponse
+from .stats import compute_sales_stats, LOW_STOCK_THRESHOLD
+from .sales import process_sale
+from .stock import apply_stock_batch, MAX_BATCH_SIZE
+from .product_import import import_products
+from .accounts import delete_user_account
+from .inventory import adjust_valuation, stock_value, inventory_value, zombie_products
+from .activity import movement_feed_query, movement_page, serialize_movements
+from .response_cache import response_cache, GLOBAL_SCOPE
+from .counters import bump, read_counters, reconcile_loop, RECONCILE_SECONDS
+from .conditional import conditional_response, bump_catalog_version, catalog_version, announcements_version, tickets_version
+from .events import publish_user_event, stock_event, product_event, catalog_event, sse_stream, event_bus
+from .metrics import MetricsMiddleware, instrument_engine, register_collector, gauge_lines, render as render_metrics
+from .query_profiler import QUERY_PROFILING, QueryProfilerMiddleware, install_profiler
+from .admin_streams import stream_ndjson, product_row, ticket_row, with_owner, with_ticket_user, NDJSON_MEDIA_TYPE
+from .exports import EXPORT_FORMATS
+from .principals import Principal, principal_cache
+from .auth import get_current_user, get_current_admin, get_stream_user
+from .startup import prepare_database
+from .pool_budget import PoolAdmissionMiddleware, admission_stats
+from .pagination import paginate, order_by_sort, parse_sort, prefix_pattern, set_page_headers, PAGE_HEADERS, MAX_PAGE_SIZE
 from fastapi.security import OAuth2PasswordRequestForm
-from src.security import verify_password, create_access_token
 
-Base.metadata.create_all(bind=engine)
-app = FastAPI(title="Inventory API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nada toca la base al importar: migraciones/chequeo de esquema y
+    # precalentado del pool ocurren aquí, antes de aceptar peticiones (ver startup.py)
+    await run_in_threadpool(prepare_database, engine, get_migration_engine())
+
+    # Reconciliación periódica de contadores dentro del proceso (opcional, ver counters.py)
+    reconcile_task = None
+    if RECONCILE_SECONDS > 0:
+        reconcile_task = asyncio.create_task(reconcile_loop(SessionLocal, RECONCILE_SECONDS))
+    yield
+    if reconcile_task:
+        reconcile_task.cancel()
+
+app = FastAPI(title="Inventory API", lifespan=lifespan)
 app.include_router(ai_router)
 
 origins = [
@@ -32,15 +60,67 @@ origins = [
     "*" # (TEMPORAL: Pon esto mientras configuras para que no te falle nada)
 ]
 
+# Orden de los middlewares: el último agregado es el más externo. De afuera hacia adentro:
+#   CORS -> métricas -> admisión al pool -> perfilado -> la app
+# Así la latencia medida incluye la espera por una conexión del pool, y los
+# preflight de CORS se responden sin ocupar un turno de la base.
+
+# Modo perfilado (QUERY_PROFILING=1): avisa de N+1 y consultas lentas por endpoint (ver query_profiler.py)
+if QUERY_PROFILING:
+    install_profiler(engine)
+    if read_engine is not engine:
+        install_profiler(read_engine)
+    app.add_middleware(QueryProfilerMiddleware)
+
+# No más peticiones en curso que conexiones en el pool de este worker: las
+# demás esperan turno en vez de terminar en timeout del pool (ver pool_budget.py).
+# Las rutas de IA quedan fuera: usan la base un instante (sesión propia) y
+# luego esperan al modelo, acotadas por su propio semáforo (ver ai.py)
+app.add_middleware(
+    PoolAdmissionMiddleware, engine=engine,
+    skip_paths=("/metrics", "/events/stream"), skip_prefixes=(ai_router.prefix,)
+)
+
+# Métricas Prometheus: latencia por ruta, SQL por petición, pool e IA (ver metrics.py).
+# Los streams SSE quedan fuera (duran lo que dure la conexión).
+app.add_middleware(MetricsMiddleware, skip_paths=("/metrics", "/events/stream"))
+instrument_engine(engine)
+if read_engine is not engine:
+    instrument_engine(read_engine, pool_gauges=False) # SQL de la réplica también cuenta por petición
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins, # Usar la lista de arriba
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=PAGE_HEADERS + ["ETag"], # Cabeceras de paginación/versión visibles para el navegador
 )
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
+def _collect_app_stats():
+    cache = response_cache.stats()
+    lines = gauge_lines("response_cache_hits_total", "Aciertos de la caché de respuestas", cache["hits"], "counter")
+    lines += gauge_lines("response_cache_misses_total", "Fallos de la caché de respuestas", cache["misses"], "counter")
+    lines += gauge_lines("response_cache_invalidations_total", "Invalidaciones por escritura", cache["invalidations"], "counter")
+    if hasattr(event_bus, "stats"):
+        bus = event_bus.stats()
+        lines += gauge_lines("sse_subscribers", "Conexiones SSE abiertas", bus["subscribers"])
+        lines += gauge_lines("sse_events_published_total", "Eventos publicados al bus", bus["published"], "counter")
+    admission = admission_stats()
+    lines += gauge_lines("db_admission_in_flight", "Peticiones con turno de conexión", admission["in_flight"])
+    lines += gauge_lines("db_admission_waiting", "Peticiones esperando turno de conexión", admission["waiting"])
+    return lines
+
+register_collector(_collect_app_stats)
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Columnas por las que se puede ordenar cada listado (?sort=name / ?sort=-name)
+PRODUCT_SORTS = {"id": Product.id, "name": Product.name, "stock": Product.stock, "barcode": Product.barcode}
+USER_SORTS = {"id": User.id, "email": User.email}
+TICKET_SORTS = {"id": SupportTicket.id, "status": SupportTicket.status}
 
 # --- SCHEMAS ---
 class ProductCreate(BaseModel):
@@ -70,10 +150,14 @@ class TicketCreate(BaseModel):
 
 class StockUpdate(BaseModel):
     barcode: str
-    user_id: int
+    user_id: Optional[int] = None # Ignorado: siempre se usa el usuario autenticado (se acepta por compatibilidad)
     movement_type: str 
     quantity: int 
 
+class StockBatchUpdate(BaseModel):
+    movements: List[StockUpdate]
+    all_or_nothing: bool = False # Si una línea falla, no se aplica ninguna
+
 class UserLoginSchema(BaseModel):
     email: str
     password: str
@@ -97,54 +181,53 @@ class AnnouncementCreate(BaseModel):
 #         AUTENTICACIÓN
 # ==========================================
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="No se pudo validar las credenciales",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
-        raise credentials_exception
-    return user
-
-def get_current_admin(current_user: User = Depends(get_current_user)):
-    if not current_user.is_admin:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
-            detail="Se requieren privilegios de administrador"
-        )
-    return current_user
+def _token_claims(user: User) -> dict:
+    return {"uid": user.id, "sid": session_key(user.hashed_password)}
 
 # ==========================================
 #         ENDPOINTS DE ADMINISTRADOR
 # ==========================================
 
-@app.get("/admin/stats")
-def get_admin_stats(db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
-    total_users = db.query(User).count()
-    total_sales = db.query(Sale).count()
-    total_products = db.query(Product).count()
-    total_revenue = db.query(func.sum(Sale.total_amount)).scalar() or 0
+def _admin_stats(db: Session):
+    # Contadores mantenidos en cada escritura: pocas filas sin importar el tamaño de la plataforma
+    counters = read_counters(db)
     
     return {
-        "total_users": total_users,
-        "total_sales": total_sales,
-        "total_products": total_products,
-        "platform_revenue": total_revenue
+        "total_users": counters["users"],
+        "total_sales": counters["sales"],
+        "total_products": counters["products"],
+        "platform_revenue": counters["revenue"]
     }
 
+@app.get("/admin/stats")
+def get_admin_stats(db: Session = Depends(get_read_db), admin: Principal = Depends(get_current_admin)):
+    # Cacheado hasta la próxima escritura de cualquier usuario (ver response_cache.py)
+    return response_cache.get_or_compute(GLOBAL_SCOPE, "admin_stats", lambda: _admin_stats(db))
+
+@app.get("/admin/cache-stats")
+def get_cache_stats(admin: Principal = Depends(get_current_admin)):
+    # Efectividad de la caché de respuestas (hit ratio, invalidaciones)
+    return response_cache.stats()
+
 @app.get("/admin/users")
-def get_all_users(db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
-    users = db.query(User).all()
+def get_all_users(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    email_prefix: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_read_db),
+    admin: Principal = Depends(get_current_admin)
+):
+    query = db.query(User)
+    if email_prefix:
+        query = query.filter(User.email.ilike(prefix_pattern(email_prefix), escape="\\"))
+
+    sort_key, sort_column, descending = parse_sort(sort, USER_SORTS)
+    page = paginate(query, sort_key, sort_column, User.id, descending, limit, cursor, include_total)
+    set_page_headers(response, page)
+    users = page.items
     return [
         {
             "id": u.id, 
@@ -160,42 +243,71 @@ def get_all_users(db: Session = Depends(get_db), admin: User = Depends(get_curre
 
 # --- CORRECCIÓN 4: Endpoint faltante para el Admin Dashboard (Inventario Global) ---
 @app.get("/admin/products")
-def get_all_products_global(db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
-    products = db.query(Product).all()
-    data = []
-    for p in products:
-        owner_name = f"{p.owner.first_name} {p.owner.last_name}" if p.owner else "Desconocido"
-        data.append({
-            "id": p.id,
-            "barcode": p.barcode,
-            "name": p.name,
-            "stock": p.stock,
-            "owner": owner_name
-        })
-    return data
+def get_all_products_global(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    name_prefix: Optional[str] = None,
+    low_stock: bool = False,
+    include_total: bool = False,
+    format: str = "json",
+    db: Session = Depends(get_read_db),
+    admin: Principal = Depends(get_current_admin)
+):
+    sort_key, sort_column, descending = parse_sort(sort, PRODUCT_SORTS)
+
+    if format == "ndjson":
+        # Todo el listado en streaming (sin limit/cursor), memoria constante (ver admin_streams.py)
+        def build_query(stream_db: Session):
+            query = with_owner(_filter_products(stream_db.query(Product), name_prefix, low_stock))
+            return query.order_by(*order_by_sort(sort_column, Product.id, descending))
+        return StreamingResponse(stream_ndjson(build_query, product_row, read_session_factory(admin.id)), media_type=NDJSON_MEDIA_TYPE)
+    if format != "json":
+        raise HTTPException(status_code=400, detail="Formato no soportado (json o ndjson)")
+
+    query = with_owner(_filter_products(db.query(Product), name_prefix, low_stock))
+    page = paginate(query, sort_key, sort_column, Product.id, descending, limit, cursor, include_total)
+    set_page_headers(response, page)
+    return [product_row(p) for p in page.items]
 
 @app.get("/admin/tickets")
-def get_all_tickets(db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
-    tickets = db.query(SupportTicket).all()
-    data = []
-    for t in tickets:
-        user_email = t.user.email if t.user else "Usuario eliminado"
-        data.append({
-            "id": t.id,
-            "user": user_email,
-            "issue": t.issue_type,
-            "message": t.message,
-            "status": t.status,
-            "admin_response": t.admin_response
-        })
-    return data
+def get_all_tickets(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    ticket_status: Optional[str] = Query(None, alias="status"),
+    include_total: bool = False,
+    format: str = "json",
+    db: Session = Depends(get_read_db),
+    admin: Principal = Depends(get_current_admin)
+):
+    def filter_tickets(query):
+        if ticket_status:
+            query = query.filter(SupportTicket.status == ticket_status)
+        return with_ticket_user(query)
+
+    sort_key, sort_column, descending = parse_sort(sort, TICKET_SORTS)
+
+    if format == "ndjson":
+        # Todo el listado en streaming (sin limit/cursor), memoria constante (ver admin_streams.py)
+        def build_query(stream_db: Session):
+            return filter_tickets(stream_db.query(SupportTicket)).order_by(*order_by_sort(sort_column, SupportTicket.id, descending))
+        return StreamingResponse(stream_ndjson(build_query, ticket_row, read_session_factory(admin.id)), media_type=NDJSON_MEDIA_TYPE)
+    if format != "json":
+        raise HTTPException(status_code=400, detail="Formato no soportado (json o ndjson)")
+
+    page = paginate(filter_tickets(db.query(SupportTicket)), sort_key, sort_column, SupportTicket.id, descending, limit, cursor, include_total)
+    set_page_headers(response, page)
+    return [ticket_row(t) for t in page.items]
 
 @app.put("/admin/tickets/{ticket_id}/close")
 def close_ticket(
     ticket_id: int, 
     resolve_data: TicketResolveSchema, 
     db: Session = Depends(get_db), 
-    admin: User = Depends(get_current_admin)
+    admin: Principal = Depends(get_current_admin)
 ):
     ticket = db.query(SupportTicket).filter(SupportTicket.id == ticket_id).first()
     if not ticket:
@@ -203,14 +315,16 @@ def close_ticket(
     
     ticket.status = "closed"
     ticket.admin_response = resolve_data.response_text
-    db.commit()
+    db.commit() # updated_at cambia solo (onupdate) -> nuevo ETag en /my-tickets
+    note_write(admin.id)
     return {"message": "Ticket cerrado y respuesta guardada"}
 
 @app.post("/admin/announce")
-def create_announcement(data: AnnouncementCreate, db: Session = Depends(get_db), admin: User = Depends(get_current_admin)):
+def create_announcement(data: AnnouncementCreate, db: Session = Depends(get_db), admin: Principal = Depends(get_current_admin)):
     new_msg = GlobalMessage(title=data.title, message=data.message)
     db.add(new_msg)
     db.commit()
+    note_write(admin.id)
     return {"message": "Anuncio global enviado"}
 
 # ==========================================
@@ -234,7 +348,9 @@ def register_user(user_data: UserRegisterSchema, db: Session = Depends(get_db)):
         address=user_data.address
     )
     db.add(new_user)
+    bump(db, users=1)
     db.commit()
+    response_cache.invalidate(GLOBAL_SCOPE)
     return {"message": "Usuario creado con éxito"}
 
 @app.post("/login") 
@@ -243,7 +359,7 @@ def login(user_data: UserLoginSchema, db: Session = Depends(get_db)):
     if not user or not verify_password(user_data.password, user.hashed_password):
         raise HTTPException(status_code=401, detail="Credenciales incorrectas")
     
-    access_token = create_access_token(subject=user.email)
+    access_token = create_access_token(subject=user.email, claims=_token_claims(user))
     
     return {
         "access_token": access_token, 
@@ -255,7 +371,7 @@ def login(user_data: UserLoginSchema, db: Session = Depends(get_db)):
     }
 
 @app.get("/user/me")
-def get_me(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_me(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     return {
         "first_name": current_user.first_name,
         "last_name": current_user.last_name,
@@ -265,7 +381,7 @@ def get_me(db: Session = Depends(get_db), current_user: User = Depends(get_curre
     }
 
 @app.put("/user/update")
-def update_user(user_data: UserRegisterSchema, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def update_user(user_data: UserRegisterSchema, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     user = db.query(User).filter(User.id == current_user.id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Usuario no encontrado")
@@ -285,24 +401,58 @@ def update_user(user_data: UserRegisterSchema, db: Session = Depends(get_db), cu
         user.hashed_password = get_password_hash(user_data.password)
 
     db.commit()
+    principal_cache.invalidate(current_user.email)
     return {"message": "Datos actualizados correctamente"}
 
 @app.delete("/user/delete")
-def delete_account(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    db.delete(current_user)
-    db.commit()
+def delete_account(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    user = db.query(User).filter(User.id == current_user.id).first()
+    if user:
+        # Ventas, movimientos, productos y tablas derivadas + contadores (ver accounts.py)
+        delete_user_account(db, user)
+        db.commit()
+    principal_cache.invalidate(current_user.email)
+    response_cache.invalidate_user(current_user.id)
+    note_write(current_user.id)
     return {"message": "Cuenta eliminada"}
 
 # ==========================================
 #            ENDPOINTS PRODUCTOS
 # ==========================================
 
+def _filter_products(query, name_prefix: Optional[str], low_stock: bool):
+    if name_prefix:
+        query = query.filter(Product.name.ilike(prefix_pattern(name_prefix), escape="\\"))
+    if low_stock:
+        query = query.filter(Product.stock < LOW_STOCK_THRESHOLD)
+    return query
+
 @app.get("/products", response_model=List[ProductResponse])
-def get_products(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return db.query(Product).filter(Product.user_id == current_user.id).all()
+def get_products(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = "id",
+    name_prefix: Optional[str] = None,
+    low_stock: bool = False,
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    # 304 si el catálogo no cambió desde la última vez (ver conditional.py)
+    not_modified = conditional_response(request, response, current_user.id, catalog_version(db, current_user.id))
+    if not_modified:
+        return not_modified
+
+    query = _filter_products(db.query(Product).filter(Product.user_id == current_user.id), name_prefix, low_stock)
+    sort_key, sort_column, descending = parse_sort(sort, PRODUCT_SORTS)
+    page = paginate(query, sort_key, sort_column, Product.id, descending, limit, cursor, include_total)
+    set_page_headers(response, page)
+    return page.items
 
 @app.post("/products", response_model=ProductResponse)
-def create_product(product: ProductCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_product(product: ProductCreate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
     # 1. Verificar si ya existe
     existing = db.query(Product).filter(Product.barcode == product.barcode, Product.user_id == current_user.id).first()
     if existing:
@@ -311,6 +461,9 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db), curren
     # 2. Crear el Producto
     new_product = Product(**product.dict(), user_id=current_user.id)
     db.add(new_product)
+    adjust_valuation(db, current_user.id, stock_value(new_product.stock, new_product.cost_price))
+    bump(db, products=1)
+    bump_catalog_version(db, current_user.id)
     db.commit()
     db.refresh(new_product)
 
@@ -326,8 +479,32 @@ def create_product(product: ProductCreate, db: Session = Depends(get_db), curren
         db.add(initial_movement)
         db.commit()
 
+    response_cache.invalidate_user(current_user.id)
+    note_write(current_user.id)
+    publish_user_event(current_user.id, product_event(new_product))
     return new_product
 
+@app.post("/products/import")
+def import_products_file(file: UploadFile = File(...), db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    filename = (file.filename or "").lower()
+    if not filename.endswith((".csv", ".xlsx", ".xlsm")):
+        raise HTTPException(status_code=400, detail="Formato no soportado (usa .csv o .xlsx)")
+
+    # Lectura por filas, deduplicado por bloques e inserts masivos (ver product_import.py)
+    try:
+        result = import_products(db, current_user.id, file.file, filename)
+    finally:
+        # Los bloques ya confirmados cuentan aunque el archivo falle a la mitad
+        response_cache.invalidate_user(current_user.id)
+        note_write(current_user.id)
+
+    if result["inserted"]:
+        publish_user_event(current_user.id, catalog_event(result["inserted"]))
+    if result.get("file_error") and not result["processed"]:
+        # No se pudo leer ni una fila: no hay resultado parcial que informar
+        raise HTTPException(status_code=400, detail=result["file_error"])
+    return result
+
 # --- CORRECCIÓN 5: Endpoint para modificar precios/nombre ---
 @app.put("/products/{product_id}")
 def update_product(product_id: int, product_update: ProductUpdate, db: Session = Depends(get_db)):
@@ -337,6 +514,9 @@ def update_product(product_id: int, product_update: ProductUpdate, db: Session =
         raise HTTPException(status_code=404, detail="Producto no encontrado")
 
     if product_update.cost_price is not None:
+        # El stock existente pasa a valorizarse con el nuevo costo
+        adjust_valuation(db, db_product.user_id, stock_value(
+            db_product.stock, product_update.cost_price) - stock_value(db_product.stock, db_product.cost_price))
         db_product.cost_price = product_update.cost_price
     if product_update.sale_price is not None:
         db_product.sale_price = product_update.sale_price
@@ -345,17 +525,26 @@ def update_product(product_id: int, product_update: ProductUpdate, db: Session =
     if product_update.name is not None:
         db_product.name = product_update.name
 
+    bump_catalog_version(db, db_product.user_id)
     db.commit()
     db.refresh(db_product)
+    response_cache.invalidate_user(db_product.user_id)
+    note_write(db_product.user_id)
+    publish_user_event(db_product.user_id, product_event(db_product))
     
     return db_product
 
 @app.post("/update-stock")
-def update_stock(update: StockUpdate, db: Session = Depends(get_db)):
-    product = db.query(Product).filter(Product.barcode == update.barcode).first()
+def update_stock(update: StockUpdate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    # Solo productos del usuario autenticado: el mismo código de barras puede existir en otra cuenta
+    product = db.query(Product).filter(
+        Product.user_id == current_user.id,
+        Product.barcode == update.barcode
+    ).first()
     if not product:
         raise HTTPException(status_code=404, detail="No encontrado")
 
+    previous_stock = product.stock
     if update.movement_type == "suma":
         product.stock += update.quantity
     elif update.movement_type == "resta":
@@ -366,313 +555,163 @@ def update_stock(update: StockUpdate, db: Session = Depends(get_db)):
 
     history = MovementHistory(
         product_id=product.id,
-        user_id=update.user_id,
+        user_id=product.user_id,
         movement_type=update.movement_type,
         quantity_changed=update.quantity,
         final_stock=product.stock
     )
     db.add(history)
+    adjust_valuation(db, product.user_id, stock_value(product.stock - previous_stock, product.cost_price))
+    bump_catalog_version(db, product.user_id)
+    owner_id, product_id, new_stock = product.user_id, product.id, product.stock
     db.commit()
+    response_cache.invalidate_user(owner_id)
+    note_write(owner_id)
+    publish_user_event(owner_id, stock_event([(product_id, new_stock)]))
     return {"message": "Stock actualizado"}
 
+@app.post("/update-stock/batch")
+def update_stock_batch(batch: StockBatchUpdate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    if not batch.movements:
+        raise HTTPException(status_code=400, detail="No hay movimientos")
+    if len(batch.movements) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Máximo {MAX_BATCH_SIZE} movimientos por lote")
+
+    # Un IN para todos los códigos, UPDATE e INSERT en lote y un solo commit (ver stock.py)
+    result = apply_stock_batch(db, current_user.id, batch.movements, batch.all_or_nothing)
+    if result["applied"]:
+        response_cache.invalidate_user(current_user.id)
+        note_write(current_user.id)
+    return result
+
 # ==========================================
-#              VENTAS (SALES)
+#          EVENTOS EN VIVO (SSE)
 # ==========================================
 
-@app.post("/sales", response_model=SaleResponse)
-def create_sale(sale_data: SaleCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    
-    # 1. Crear la estructura de la venta con el método de pago seleccionado
-    new_sale = Sale(user_id=current_user.id, total_amount=0, payment_method=sale_data.payment_method)
-    db.add(new_sale)
-    db.commit()
-    db.refresh(new_sale)
+@app.post("/events/token")
+def create_events_token(current_user: Principal = Depends(get_current_user)):
+    # Token corto para abrir el EventSource (no puede mandar cabeceras y lo lleva en la URL)
+    return {
+        "stream_token": create_stream_token(current_user.email, current_user.id, current_user.session_key),
+        "expires_in": STREAM_TOKEN_EXPIRE_SECONDS
+    }
 
-    net_amount = 0 # Acumulador del valor Neto (suma de precios de productos)
+@app.get("/events/stream")
+async def stream_events(request: Request, current_user: Principal = Depends(get_stream_user)):
+    # Cambios de stock/ventas/productos del usuario en vivo (ver events.py)
+    return StreamingResponse(
+        sse_stream(request, current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-    try:
-        for item in sale_data.items:
-            product = db.query(Product).filter(Product.id == item.product_id).first()
-            
-            if not product:
-                raise HTTPException(status_code=404, detail=f"Producto {item.product_id} no encontrado")
-            
-            if product.stock < item.quantity:
-                raise HTTPException(status_code=400, detail=f"Stock insuficiente para {product.name}")
-
-            # Calculamos subtotal neto de esta línea
-            subtotal = product.sale_price * item.quantity 
-            net_amount += subtotal
-
-            # Creamos el registro del item vendido
-            sale_item = SaleItem(
-                sale_id=new_sale.id,
-                product_id=product.id,
-                quantity=item.quantity,
-                unit_price=product.sale_price,
-                cost_price=product.cost_price
-            )
-            db.add(sale_item)
-
-            # Descontamos stock
-            product.stock -= item.quantity
-            
-            # Registramos el movimiento en el historial
-            history = MovementHistory(
-                product_id=product.id,
-                movement_type="venta", 
-                quantity_changed=item.quantity, 
-                user_id=current_user.id,
-                final_stock=product.stock 
-            )
-            db.add(history)
-
-        # --- CÁLCULO FINAL CON IVA (19%) ---
-        iva_amount = net_amount * 0.19
-        total_final = net_amount + iva_amount
-
-        # Actualizamos la venta con el Total Final (Neto + IVA)
-        new_sale.total_amount = int(total_final)
-        
-        db.commit()
-        db.refresh(new_sale)
-        
-        return new_sale
+# ==========================================
+#              VENTAS (SALES)
+# ==========================================
 
+@app.post("/sales", response_model=SaleResponse)
+def create_sale(sale_data: SaleCreate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    # Carga en lote con bloqueo de filas, descuento atómico e inserts masivos
+    # en una sola transacción (ver sales.py)
+    try:
+        new_sale = process_sale(db, current_user.id, sale_data)
     except Exception as e:
-        db.rollback()
         print(f"ERROR: {e}") 
         raise e
 
+    # Invalidar después del commit: nadie puede volver a cachear datos viejos
+    response_cache.invalidate_user(current_user.id)
+    note_write(current_user.id) # Sus reportes leen del primario un rato (ver replica.py)
+    return new_sale
+
 # ==========================================
 #          DASHBOARD / ESTADÍSTICAS
 # ==========================================
 
 # 1. ESTADÍSTICAS DE INVENTARIO (ACTUALIZADO: ZOMBIES + VALORIZACION)
-@app.get("/dashboard/stats")
-def get_dashboard_stats(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def _dashboard_stats(db: Session, user_id: int):
     # Totales Básicos
-    total_products = db.query(Product).filter(Product.user_id == current_user.id).count()
+    total_products = db.query(Product).filter(Product.user_id == user_id).count()
     
     low_stock = db.query(Product).filter(
-        Product.user_id == current_user.id, 
-        Product.stock < 5
+        Product.user_id == user_id, 
+        Product.stock < LOW_STOCK_THRESHOLD
     ).count()
     
-    # OPCION X: Valorización Bodega (Costo Total)
-    inventory_value = db.query(func.sum(Product.stock * Product.cost_price)).filter(
-        Product.user_id == current_user.id
-    ).scalar() or 0
-
-    # OPCION Y: Productos "Zombies" (Stock > 0 pero sin ventas en 30 días)
-    thirty_days_ago = datetime.now() - timedelta(days=30)
-    
-    # Subquery: IDs de productos vendidos en los últimos 30 días
-    sold_product_ids = db.query(SaleItem.product_id).join(Sale).filter(
-        Sale.user_id == current_user.id,
-        Sale.date >= thirty_days_ago
-    ).distinct()
-
-    # Productos que tienen stock, NO están en la lista de vendidos y pertenecen al usuario
-    zombie_products = db.query(Product.name, Product.stock).filter(
-        Product.user_id == current_user.id,
-        Product.stock > 0,
-        Product.id.notin_(sold_product_ids)
-    ).limit(5).all()
-
-    zombies_list = [{"name": z[0], "stock": z[1]} for z in zombie_products]
-
-    # Movimientos Recientes
-    recent_movements = db.query(MovementHistory).join(Product).filter(
-        Product.user_id == current_user.id
-    ).order_by(MovementHistory.timestamp.desc()).limit(5).all()
-
-    movements_data = []
-    for mov in recent_movements:
-        product_name = db.query(Product.name).filter(Product.id == mov.product_id).scalar()
-        
-        movements_data.append({
-            "product": product_name,
-            "type": mov.movement_type, 
-            "quantity": mov.quantity_changed,
-            "date": mov.timestamp
-        })
+    # OPCION X: Valorización Bodega (Costo Total), mantenida en cada movimiento
+    total_value = inventory_value(db, user_id)
+
+    # OPCION Y: Productos "Zombies" (Stock > 0 pero sin ventas en 30 días),
+    # por rango sobre Product.last_sold_at (ver inventory.py)
+    zombies_list = zombie_products(db, user_id)
+
+    # Movimientos Recientes (nombre del producto en la misma consulta)
+    recent = movement_page(movement_feed_query(db, user_id), limit=5)
+    movements_data = [
+        {key: m[key] for key in ("product", "type", "quantity", "date")}
+        for m in serialize_movements(recent.items)
+    ]
 
     return {
         "total_products": total_products,
         "low_stock": low_stock,
-        "inventory_value": inventory_value,
+        "inventory_value": total_value,
         "recent_movements": movements_data,
         "zombie_products": zombies_list # Nuevo Campo
     }
 
+@app.get("/dashboard/stats")
+def get_dashboard_stats(db: Session = Depends(get_read_db), current_user: Principal = Depends(get_current_user)):
+    # Cacheado por usuario hasta su próxima venta/movimiento/cambio de producto
+    return response_cache.get_or_compute(current_user.id, "dashboard", lambda: _dashboard_stats(db, current_user.id))
+
+# 2. FEED DE ACTIVIDAD: todos los movimientos de stock, paginados por cursor
+@app.get("/movements")
+def get_movements(
+    response: Response,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    movement_type: Optional[str] = Query(None, alias="type"),
+    product_id: Optional[int] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    query = movement_feed_query(db, current_user.id, movement_type, product_id)
+    page = movement_page(query, limit, cursor, include_total)
+    set_page_headers(response, page)
+    return serialize_movements(page.items)
+
 @app.get("/sales/stats")
 def get_sales_statistics(
     range: str = "recent", 
-    db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db), 
+    current_user: Principal = Depends(get_current_user)
 ):
-    now = datetime.now()
-    
-    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    start_of_week = start_of_day - timedelta(days=start_of_day.weekday())
-
-    # 1. Ingresos Básicos
-    sales_today = db.query(func.sum(Sale.total_amount)).filter(
-        Sale.user_id == current_user.id,
-        Sale.date >= start_of_day
-    ).scalar() or 0
-
-    sales_month = db.query(func.sum(Sale.total_amount)).filter(
-        Sale.user_id == current_user.id,
-        Sale.date >= start_of_month
-    ).scalar() or 0
-
-    # 2. Utilidad (Ganancia)
-    month_profit = db.query(
-        func.sum((SaleItem.unit_price - func.coalesce(SaleItem.cost_price, Product.cost_price)) * SaleItem.quantity)
-    ).join(Product).join(Sale).filter(
-        Sale.user_id == current_user.id,
-        Sale.date >= start_of_month
-    ).scalar() or 0
-
-    total_profit = db.query(
-        func.sum((SaleItem.unit_price - func.coalesce(SaleItem.cost_price, Product.cost_price)) * SaleItem.quantity)
-    ).join(Product).join(Sale).filter(
-        Sale.user_id == current_user.id
-    ).scalar() or 0
-
-    # 3. KPIs de Eficiencia
-    total_transactions = db.query(Sale).filter(
-        Sale.user_id == current_user.id, Sale.date >= start_of_month
-    ).count()
-
-    total_items_sold = db.query(func.sum(SaleItem.quantity)).join(Sale).filter(
-        Sale.user_id == current_user.id, Sale.date >= start_of_month
-    ).scalar() or 0
-
-    items_per_basket = round(total_items_sold / total_transactions, 1) if total_transactions > 0 else 0
-    margin_percent = round((month_profit / sales_month * 100), 1) if sales_month > 0 else 0
-    
-    # 4. CÁLCULO REAL DE MEDIOS DE PAGO (CORREGIDO)
-    # Filtramos las ventas del mes para el gráfico
-    month_sales_query = db.query(Sale).filter(
-        Sale.user_id == current_user.id,
-        Sale.date >= start_of_month
-    ).all()
-    
-    # Contamos manualmente para ser flexibles con mayúsculas/tildes
-    cash_count = 0
-    debit_count = 0
-    
-    for s in month_sales_query:
-        pm = (s.payment_method or "").lower() # Normalizamos a minúsculas
-        if "efectivo" in pm:
-            cash_count += 1
-        elif "debito" in pm or "débito" in pm: # Detecta con o sin tilde
-            debit_count += 1
-            
-    payment_methods = {
-        "efectivo": cash_count,
-        "debito": debit_count
-    }
-
-    # 5. Historial de Ventas
-    history_query = db.query(Sale).filter(
-        Sale.user_id == current_user.id
-    ).order_by(Sale.date.desc())
-
-    if range == "daily":
-        sales_results = history_query.filter(Sale.date >= start_of_day).all()
-    elif range == "weekly":
-        sales_results = history_query.filter(Sale.date >= start_of_week).all()
-    elif range == "monthly":
-        sales_results = history_query.filter(Sale.date >= start_of_month).all()
-    else: 
-        sales_results = history_query.limit(20).all() # Aumenté el límite a 20
-
-    history = []
-    for sale in sales_results:
-        item_count = sum(item.quantity for item in sale.items)
-
-        sale_profit = sum(
-            (item.unit_price - (item.cost_price or 0)) * item.quantity 
-            for item in sale.items
-        )
-
-        history.append({
-            "id": sale.id,
-            "date": sale.date,
-            "total": sale.total_amount,
-            "items_count": item_count,
-            "payment_method": sale.payment_method or "Efectivo", # AQUÍ AGREGAMOS EL DATO FALTANTE
-            "profit": sale_profit
-        })
-
-    # 6. Top Productos
-    top_products_query = db.query(
-        Product.name,
-        func.sum(SaleItem.quantity).label("total_sold")
-    ).join(SaleItem.product).join(SaleItem.sale).filter(
-        Sale.user_id == current_user.id,
-        Sale.date >= start_of_month
-    ).group_by(Product.name).order_by(desc("total_sold")).limit(5).all()
-
-    top_products = [{"name": t[0], "sold": t[1]} for t in top_products_query]
-
-    return {
-        "today_income": sales_today,
-        "month_income": sales_month,
-        "month_profit": month_profit, 
-        "total_profit": total_profit,
-        "sales_history": history,
-        "top_products": top_products,
-        "items_per_basket": items_per_basket,
-        "margin_percent": margin_percent,
-        "payment_methods": payment_methods
-    }
+    # Todo el cálculo vive en stats.py (consultas agrupadas, sin N+1) y la
+    # respuesta queda cacheada hasta la próxima venta del usuario
+    return response_cache.get_or_compute(
+        current_user.id, "sales_stats",
+        lambda: compute_sales_stats(db, current_user.id, range),
+        range=range
+    )
 
 @app.get("/sales/export")
-def export_sales_excel(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    sales = db.query(Sale).filter(Sale.user_id == current_user.id).order_by(Sale.date.desc()).all()
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = "Reporte de Ventas"
-
-    headers = ["ID Venta", "Fecha", "Total", "Productos"]
-    ws.append(headers)
-
-    for cell in ws[1]:
-        cell.font = Font(bold=True)
-
-    for sale in sales:
-        items_list = []
-        for item in sale.items:
-            items_list.append(f"{item.product.name} ({item.quantity})")
-        items_str = " + ".join(items_list)
-        
-        ws.append([
-            sale.id,
-            sale.date.strftime("%d/%m/%Y %H:%M:%S"), 
-            sale.total_amount,
-            items_str
-        ])
-
-    ws.column_dimensions['A'].width = 10 
-    ws.column_dimensions['B'].width = 22 
-    ws.column_dimensions['C'].width = 15 
-    ws.column_dimensions['D'].width = 50 
-
-    output = io.BytesIO()
-    wb.save(output)
-    output.seek(0)
+def export_sales_excel(
+    format: str = "xlsx",
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    current_user: Principal = Depends(get_current_user)
+):
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail="Formato no soportado (xlsx, csv o ndjson)")
 
+    # Se exporta en streaming y con memoria constante (ver exports.py)
+    generator, media_type, filename = EXPORT_FORMATS[format]
     return StreamingResponse(
-        output,
-        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=reporte_ventas.xlsx"}
+        generator(current_user.id, date_from, date_to, read_session_factory(current_user.id)),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 @app.post("/tickets")
@@ -692,11 +731,35 @@ def create_ticket(ticket: TicketCreate, db: Session = Depends(get_db)):
     return {"message": "Ticket creado exitosamente"}
 
 @app.get("/my-tickets")
-def get_my_tickets(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    return db.query(SupportTicket).filter(SupportTicket.user_id == current_user.id).order_by(SupportTicket.id.desc()).all()
+def get_my_tickets(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    sort: str = "-id",
+    ticket_status: Optional[str] = Query(None, alias="status"),
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_user)
+):
+    not_modified = conditional_response(request, response, current_user.id, tickets_version(db, current_user.id))
+    if not_modified:
+        return not_modified
+
+    query = db.query(SupportTicket).filter(SupportTicket.user_id == current_user.id)
+    if ticket_status:
+        query = query.filter(SupportTicket.status == ticket_status)
+
+    sort_key, sort_column, descending = parse_sort(sort, TICKET_SORTS)
+    page = paginate(query, sort_key, sort_column, SupportTicket.id, descending, limit, cursor, include_total)
+    set_page_headers(response, page)
+    return page.items
 
 @app.get("/announcements")
-def get_announcements(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_announcements(request: Request, response: Response, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_user)):
+    not_modified = conditional_response(request, response, "global", announcements_version(db))
+    if not_modified:
+        return not_modified
     return db.query(GlobalMessage).order_by(GlobalMessage.created_at.desc()).limit(5).all()
 
 @app.post("/token")
@@ -713,7 +776,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
         )
     
     # Si todo está bien, creamos el token nuevo
-    access_token = create_access_token(subject=user.email)
+    access_token = create_access_token(subject=user.email, claims=_token_claims(user))
     
     # Retornamos el JSON que espera el Frontend
     return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
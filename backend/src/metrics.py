@@ -0,0 +1,217 @@
+import bisect
+import contextvars
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ==========================================
+#        MÉTRICAS (FORMATO PROMETHEUS)
+# ==========================================
+# Sin dependencias externas: contadores e histogramas en memoria del
+# proceso, expuestos en texto Prometheus en GET /metrics.
+#   - http_request_duration_seconds  (histograma por método + ruta)
+#   - http_requests_total            (por método + ruta + status)
+#   - db_statements_per_request / db_time_per_request_seconds
+#                                    (histogramas por ruta, vía eventos del engine)
+#   - db_pool_*                      (gauges leídos del pool al scrapear)
+#   - ai_call_duration_seconds       (por modelo + resultado)
+#   - response_cache_* / sse_*       (lo que ya cuentan esos módulos)
+# La ruta es la plantilla ("/products/{product_id}"), no la URL real, para
+# no explotar la cantidad de series. Cada observación es una búsqueda
+# binaria en los buckets + sumas bajo un lock: costo despreciable.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+AI_BUCKETS = (0.25, 0.5, 1.0, 2.0, 4.0, 8.0, 15.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+
+LabelValues = Tuple[str, ...]
+_INF_LABEL = 'le="+Inf"'
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+def _fmt(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = ()):
+        self.name, self.help, self.label_names = name, help_text, label_names
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {_fmt(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.label_names = name, help_text, label_names
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, list] = {} # labels -> [conteo por bucket..., suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = 'le="%s"' % _fmt(float(bound))
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, _INF_LABEL)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_fmt(float(series[-2]))}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {series[-1]}")
+        return lines
+
+# --- Métricas de la aplicación ---
+http_latency = Histogram("http_request_duration_seconds", "Latencia de las peticiones HTTP", ("method", "route"))
+http_requests = Counter("http_requests_total", "Peticiones HTTP atendidas", ("method", "route", "status"))
+db_statements = Histogram("db_statements_per_request", "Sentencias SQL por petición", ("route",), COUNT_BUCKETS)
+db_time = Histogram("db_time_per_request_seconds", "Tiempo en la base de datos por petición", ("route",))
+db_statements_total = Counter("db_statements_total", "Sentencias SQL ejecutadas (todas, con o sin petición)")
+db_seconds_total = Counter("db_statement_seconds_total", "Tiempo total en sentencias SQL")
+ai_latency = Histogram("ai_call_duration_seconds", "Latencia de cada intento contra un modelo de IA", ("model", "outcome"), AI_BUCKETS)
+
+_METRICS = [http_latency, http_requests, db_statements, db_time, db_statements_total, db_seconds_total, ai_latency]
+_collectors: List[Callable[[], List[str]]] = []
+
+def register_collector(collect: Callable[[], List[str]]):
+    """Agrega una función que genera líneas Prometheus al momento de scrapear (gauges)."""
+    _collectors.append(collect)
+
+def gauge_lines(name: str, help_text: str, value: float, kind: str = "gauge") -> List[str]:
+    return [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}", f"{name} {_fmt(value)}"]
+
+def observe_ai_call(model_id: str, outcome: str, seconds: float):
+    ai_latency.observe(seconds, model_id, outcome)
+
+# --- SQL por petición (eventos del engine) ---
+class _RequestDB:
+    __slots__ = ("statements", "seconds")
+
+    def __init__(self):
+        self.statements = 0
+        self.seconds = 0.0
+
+# El middleware crea un acumulador por petición; los endpoints sync corren en
+# el threadpool con una copia del contexto, así que ven el mismo objeto.
+_current_request: contextvars.ContextVar[Optional[_RequestDB]] = contextvars.ContextVar("metrics_request_db", default=None)
+
+def instrument_engine(engine: Engine, pool_gauges: bool = True):
+    """Cuenta sentencias y tiempo SQL (global y de la petición en curso) y expone gauges del pool."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("metrics_started")
+        if not started:
+            return
+        elapsed = time.perf_counter() - started.pop()
+        db_statements_total.inc()
+        db_seconds_total.inc(amount=elapsed)
+        current = _current_request.get()
+        if current is not None:
+            current.statements += 1
+            current.seconds += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def _error(context):
+        conn = context.connection
+        if conn is not None and conn.info.get("metrics_started"):
+            conn.info["metrics_started"].pop()
+
+    def collect_pool() -> List[str]:
+        pool = engine.pool
+        lines = []
+        for name, attr, help_text in (
+            ("db_pool_size", "size", "Tamaño configurado del pool"),
+            ("db_pool_checked_out", "checkedout", "Conexiones prestadas en este momento"),
+            ("db_pool_checked_in", "checkedin", "Conexiones libres en el pool"),
+            ("db_pool_overflow", "overflow", "Conexiones sobre pool_size (negativo = cupo sin abrir)"),
+        ):
+            method = getattr(pool, attr, None)
+            if callable(method):
+                lines += gauge_lines(name, help_text, method())
+        return lines
+
+    if pool_gauges:
+        register_collector(collect_pool)
+
+# --- Middleware ASGI ---
+class MetricsMiddleware:
+    """Mide cada petición HTTP (ASGI puro: no envuelve el body, así el streaming no se ve afectado)."""
+
+    def __init__(self, app, skip_paths: Tuple[str, ...] = ("/metrics",)):
+        self.app = app
+        self.skip_paths = skip_paths
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["code"] = message["status"]
+            await send(message)
+
+        request_db = _RequestDB()
+        token = _current_request.set(request_db)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current_request.reset(token)
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            http_latency.observe(elapsed, method, route_path)
+            http_requests.inc(method, route_path, str(status_holder["code"]))
+            db_statements.observe(request_db.statements, route_path)
+            db_time.observe(request_db.seconds, route_path)
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines += metric.render()
+    for collect in _collectors:
+        try:
+            lines += collect()
+        except Exception:
+            continue # Un colector roto no debe tumbar /metrics
+    return "\n".join(lines) + "\n"
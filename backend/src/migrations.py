@@ -0,0 +1,232 @@
+import argparse
+import logging
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+
+from .database import Base
+from . import models  # noqa: F401  (registra las tablas en Base.metadata)
+
+logger = logging.getLogger("migrations")
+
+# ==========================================
+#        MIGRACIONES VERSIONADAS
+# ==========================================
+# Reemplaza al Base.metadata.create_all del arranque. Cada migración tiene
+# un número de versión y se aplica UNA vez (queda registrada en la tabla
+# schema_migrations). Las migraciones son idempotentes: revisan si el
+# índice/columna ya existe, así sirven tanto para bases nuevas como para
+# bases que venían del create_all anterior.
+#
+#     python -m src.migrations            # aplica las pendientes
+#     python -m src.migrations --status   # muestra qué está aplicado
+#
+# Para agregar una migración: escribir la función y sumarla al final de
+# MIGRATIONS con el siguiente número. Nunca renumerar las existentes.
+
+MIGRATIONS_TABLE = "schema_migrations"
+_PG_LOCK_ID = 472001 # pg_advisory_lock: evita que dos workers migren a la vez
+
+class MigrationError(RuntimeError):
+    """La base tiene datos que impiden aplicar una migración (se corrigen a mano y se reintenta)."""
+
+# --- Utilidades para migraciones idempotentes ---
+def _index_names(conn: Connection, table_name: str) -> set:
+    if conn.dialect.name == "sqlite":
+        # La reflexión de SQLite omite los índices por expresión (ej: coalesce)
+        rows = conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t"), {"t": table_name})
+        return {name for (name,) in rows}
+    return {ix["name"] for ix in inspect(conn).get_indexes(table_name)}
+
+def create_index_if_missing(conn: Connection, table_name: str, index_name: str):
+    """Crea un índice declarado en models.py si aún no existe en la base."""
+    table = Base.metadata.tables[table_name]
+    if index_name in _index_names(conn, table_name):
+        return
+    index = next(ix for ix in table.indexes if ix.name == index_name)
+    index.create(bind=conn)
+    logger.info("Índice creado: %s", index_name)
+
+def add_column_if_missing(conn: Connection, table_name: str, column_name: str):
+    """Agrega una columna declarada en models.py si la tabla aún no la tiene."""
+    existing = {col["name"] for col in inspect(conn).get_columns(table_name)}
+    if column_name in existing:
+        return
+    column = Base.metadata.tables[table_name].c[column_name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f'ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}'))
+    logger.info("Columna agregada: %s.%s", table_name, column_name)
+
+# --- Migraciones ---
+def m0001_initial_schema(conn: Connection):
+    # Crea las tablas que falten (bases nuevas o tablas agregadas después)
+    Base.metadata.create_all(bind=conn)
+
+MAX_LISTED_DUPLICATES = 20
+
+def _check_duplicate_barcodes(conn: Connection):
+    """Falla con la lista de (user_id, barcode) repetidos: el índice UNIQUE no se podría crear."""
+    rows = conn.execute(text(
+        "SELECT user_id, barcode, COUNT(*) AS n, MIN(id) AS first_id, MAX(id) AS last_id "
+        "FROM products WHERE barcode IS NOT NULL "
+        "GROUP BY user_id, barcode HAVING COUNT(*) > 1 "
+        "ORDER BY user_id, barcode"
+    )).all()
+    if not rows:
+        return
+    listed = "\n".join(
+        f"  user_id={user_id} barcode={barcode!r}: {n} productos (ids {first_id}..{last_id})"
+        for user_id, barcode, n, first_id, last_id in rows[:MAX_LISTED_DUPLICATES]
+    )
+    more = f"\n  ... y {len(rows) - MAX_LISTED_DUPLICATES} más" if len(rows) > MAX_LISTED_DUPLICATES else ""
+    raise MigrationError(
+        f"No se puede crear uq_products_user_barcode: hay {len(rows)} códigos de barras "
+        f"repetidos dentro de un mismo usuario (altas simultáneas de la versión anterior).\n"
+        f"{listed}{more}\n"
+        "Unifica o renombra esos productos (ej: UPDATE products SET barcode = barcode || '-' || id "
+        "WHERE id = ...) y vuelve a correr: python -m src.migrations"
+    )
+
+def m0002_hot_path_indexes(conn: Connection):
+    # Índices compuestos según los accesos reales de dashboard/estadísticas
+    create_index_if_missing(conn, "sales", "ix_sales_user_date")
+    if "uq_products_user_barcode" not in _index_names(conn, "products"):
+        # La verificación anterior (consultar y luego insertar) permitía duplicados
+        _check_duplicate_barcodes(conn)
+    create_index_if_missing(conn, "products", "uq_products_user_barcode")
+    create_index_if_missing(conn, "movement_history", "ix_movements_product_timestamp")
+    create_index_if_missing(conn, "sale_items", "ix_sale_items_sale_id")
+    create_index_if_missing(conn, "sale_items", "ix_sale_items_product_id")
+    create_index_if_missing(conn, "support_tickets", "ix_support_tickets_user_id")
+
+def m0003_last_sold_and_valuation(conn: Connection):
+    # Datos desnormalizados del dashboard (ver inventory.py) + carga inicial
+    from .inventory import backfill_inventory
+
+    add_column_if_missing(conn, "products", "last_sold_at")
+    create_index_if_missing(conn, "products", "ix_products_user_last_sold")
+    Base.metadata.tables["inventory_valuation"].create(bind=conn, checkfirst=True)
+    backfill_inventory(Session(bind=conn))
+
+def m0004_movement_feed_index(conn: Connection):
+    # Movimientos antiguos sin usuario quedan asignados al dueño del producto
+    conn.execute(text(
+        "UPDATE movement_history SET user_id = "
+        "(SELECT products.user_id FROM products WHERE products.id = movement_history.product_id) "
+        "WHERE user_id IS NULL"
+    ))
+    create_index_if_missing(conn, "movement_history", "ix_movements_user_timestamp")
+
+def m0005_platform_counters(conn: Connection):
+    # Totales de /admin/stats (ver counters.py) + carga inicial
+    from .counters import reconcile_counters
+
+    Base.metadata.tables["platform_counters"].create(bind=conn, checkfirst=True)
+    reconcile_counters(Session(bind=conn))
+
+def m0006_conditional_get_versions(conn: Connection):
+    # Tokens de versión para ETag (ver conditional.py)
+    add_column_if_missing(conn, "support_tickets", "updated_at")
+    Base.metadata.tables["catalog_versions"].create(bind=conn, checkfirst=True)
+
+def m0007_backfill_daily_sales_rollup(conn: Connection):
+    # stats.rollup_kpis y el contexto de la IA solo leen el rollup: las
+    # ventas anteriores a él deben quedar cargadas (ver rollups.py)
+    from .rollups import rebuild_rollups
+
+    Base.metadata.tables["daily_sales_rollup"].create(bind=conn, checkfirst=True)
+    rebuild_rollups(Session(bind=conn))
+
+def m0008_movement_owner(conn: Connection):
+    # /update-stock guardaba el user_id enviado por el cliente: cada
+    # movimiento queda asignado al dueño de su producto
+    conn.execute(text(
+        "UPDATE movement_history SET user_id = "
+        "(SELECT products.user_id FROM products WHERE products.id = movement_history.product_id) "
+        "WHERE product_id IS NOT NULL AND user_id IS DISTINCT FROM "
+        "(SELECT products.user_id FROM products WHERE products.id = movement_history.product_id)"
+    ))
+
+def m0009_product_sort_indexes(conn: Connection):
+    # GET /products paginado: (user_id, <orden>, id) para cada orden permitido,
+    # así cada página lee solo sus filas sin ordenar todo el catálogo
+    create_index_if_missing(conn, "products", "ix_products_user_id_id")
+    create_index_if_missing(conn, "products", "ix_products_user_name_id")
+    create_index_if_missing(conn, "products", "ix_products_user_stock_id")
+    create_index_if_missing(conn, "products", "ix_products_user_barcode_id")
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "initial_schema", m0001_initial_schema),
+    (2, "hot_path_indexes", m0002_hot_path_indexes),
+    (3, "last_sold_and_valuation", m0003_last_sold_and_valuation),
+    (4, "movement_feed_index", m0004_movement_feed_index),
+    (5, "platform_counters", m0005_platform_counters),
+    (6, "conditional_get_versions", m0006_conditional_get_versions),
+    (7, "backfill_daily_sales_rollup", m0007_backfill_daily_sales_rollup),
+    (8, "movement_owner", m0008_movement_owner),
+    (9, "product_sort_indexes", m0009_product_sort_indexes),
+]
+
+# --- Ejecución ---
+def _ensure_migrations_table(conn: Connection):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ("
+        "version INTEGER PRIMARY KEY, "
+        "name VARCHAR(200) NOT NULL, "
+        "applied_at TIMESTAMP NOT NULL)"
+    ))
+
+def applied_versions(conn: Connection) -> List[int]:
+    _ensure_migrations_table(conn)
+    return sorted(row[0] for row in conn.execute(text(f"SELECT version FROM {MIGRATIONS_TABLE}")))
+
+def pending_migrations(engine: Engine) -> List[Tuple[int, str, Callable]]:
+    with engine.begin() as conn:
+        done = set(applied_versions(conn))
+    return [m for m in MIGRATIONS if m[0] not in done]
+
+def run_migrations(engine: Engine) -> List[int]:
+    """Aplica las migraciones pendientes (cada una en su transacción). Retorna las versiones aplicadas."""
+    applied = []
+    is_postgres = engine.dialect.name == "postgresql"
+    with engine.connect() as lock_conn:
+        if is_postgres:
+            lock_conn.execute(text("SELECT pg_advisory_lock(:id)"), {"id": _PG_LOCK_ID})
+            lock_conn.commit()
+        try:
+            for version, name, migrate in MIGRATIONS:
+                with engine.begin() as conn:
+                    if version in applied_versions(conn):
+                        continue
+                    logger.info("Aplicando migración %04d_%s", version, name)
+                    migrate(conn)
+                    conn.execute(
+                        text(f"INSERT INTO {MIGRATIONS_TABLE} (version, name, applied_at) VALUES (:v, :n, :t)"),
+                        {"v": version, "n": name, "t": datetime.now()}
+                    )
+                applied.append(version)
+        finally:
+            if is_postgres:
+                lock_conn.execute(text("SELECT pg_advisory_unlock(:id)"), {"id": _PG_LOCK_ID})
+                lock_conn.commit()
+    return applied
+
+if __name__ == "__main__":
+    from .database import get_migration_engine
+
+    engine = get_migration_engine()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Migraciones de la base de datos")
+    parser.add_argument("--status", action="store_true", help="Solo muestra el estado")
+    args = parser.parse_args()
+
+    if args.status:
+        pending = {m[0] for m in pending_migrations(engine)}
+        for version, name, _ in MIGRATIONS:
+            print(f"{version:04d}_{name}: {'pendiente' if version in pending else 'aplicada'}")
+    else:
+        done = run_migrations(engine)
+        print(f"Migraciones aplicadas: {done or 'ninguna (al día)'}")
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Boolean, Float, ForeignKey, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, Float, ForeignKey, DateTime, Date, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
+from .db_utils import sortable
 
 # --- TABLA DE USUARIOS ---
 class User(Base):
@@ -25,6 +26,12 @@ class User(Base):
 # --- TABLA DE PRODUCTOS ---
 class Product(Base):
     __tablename__ = "products"
+    __table_args__ = (
+        # Un código de barras es único dentro del inventario de cada usuario
+        Index("uq_products_user_barcode", "user_id", "barcode", unique=True),
+        # Productos "zombie": rango por fecha de última venta dentro del usuario
+        Index("ix_products_user_last_sold", "user_id", "last_sold_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     barcode = Column(String, index=True)
@@ -33,12 +40,23 @@ class Product(Base):
     cost_price = Column(Float, default=0.0)
     gain = Column(Float, default=0.0) 
     sale_price = Column(Float, default=0.0)
+    last_sold_at = Column(DateTime, nullable=True) # Se actualiza en cada venta
     user_id = Column(Integer, ForeignKey("users.id")) #fk
     owner = relationship("User", back_populates="products")
 
+# Listado paginado de productos del usuario (GET /products?sort=...): un índice
+# por orden, con la misma expresión que usa el keyset (ver db_utils.sortable)
+Index("ix_products_user_id_id", Product.user_id, Product.id)
+Index("ix_products_user_name_id", Product.user_id, sortable(Product.name), Product.id)
+Index("ix_products_user_stock_id", Product.user_id, sortable(Product.stock), Product.id)
+Index("ix_products_user_barcode_id", Product.user_id, sortable(Product.barcode), Product.id)
+
 # --- 3. TICKETS DE SOPORTE ---
 class SupportTicket(Base):
     __tablename__ = "support_tickets"
+    __table_args__ = (
+        Index("ix_support_tickets_user_id", "user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"))
@@ -46,12 +64,18 @@ class SupportTicket(Base):
     message = Column(String)
     status = Column(String, default="pendiente")
     admin_response = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now) # Para ETag de /my-tickets
 
     user = relationship("User", back_populates="tickets")
 
 # --- 4. HISTORIAL DE MOVIMIENTOS ---
 class MovementHistory(Base):
     __tablename__ = "movement_history"
+    __table_args__ = (
+        Index("ix_movements_product_timestamp", "product_id", "timestamp"),
+        # Feed de actividad: orden (timestamp, id) dentro del usuario
+        Index("ix_movements_user_timestamp", "user_id", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
@@ -64,6 +88,9 @@ class MovementHistory(Base):
 
 class Sale(Base):
     __tablename__ = "sales"
+    __table_args__ = (
+        Index("ix_sales_user_date", "user_id", "date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     date = Column(DateTime, default=datetime.now)
@@ -75,6 +102,10 @@ class Sale(Base):
 
 class SaleItem(Base):
     __tablename__ = "sale_items"
+    __table_args__ = (
+        Index("ix_sale_items_sale_id", "sale_id"),
+        Index("ix_sale_items_product_id", "product_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     sale_id = Column(Integer, ForeignKey("sales.id"))
@@ -93,4 +124,55 @@ class GlobalMessage(Base):
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String)  # Ej: "Mantenimiento Programado"
     message = Column(String) # Ej: "El sistema se actualizará el viernes..."
-    created_at = Column(DateTime, default=datetime.now)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.now)
+
+# --- RESUMEN DIARIO DE VENTAS (ROLLUP) ---
+# Una fila por usuario / día / medio de pago. Se actualiza en la misma
+# transacción que create_sale, así las estadísticas leen pocas filas
+# en vez de recorrer todas las ventas e items.
+class DailySalesRollup(Base):
+    __tablename__ = "daily_sales_rollup"
+    __table_args__ = (
+        UniqueConstraint("user_id", "day", "payment_method", name="uq_rollup_user_day_method"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    day = Column(Date, nullable=False)
+    payment_method = Column(String, nullable=False, default="efectivo")
+
+    revenue = Column(Integer, nullable=False, default=0)      # Suma de total_amount (con IVA)
+    profit = Column(Float, nullable=False, default=0.0)       # (precio - costo) * cantidad
+    units = Column(Integer, nullable=False, default=0)        # Unidades vendidas
+    transactions = Column(Integer, nullable=False, default=0) # Cantidad de ventas
+
+# --- VALORIZACIÓN DE INVENTARIO POR USUARIO ---
+# SUM(stock * cost_price) mantenido en cada movimiento de stock o cambio de
+# costo, así el dashboard lee una fila en vez de recorrer todo el inventario.
+class InventoryValuation(Base):
+    __tablename__ = "inventory_valuation"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    value = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.now)
+
+# --- CONTADORES DE PLATAFORMA (ADMIN) ---
+# Totales globales (usuarios, ventas, productos, ingresos) mantenidos en la
+# misma transacción que cada escritura. Cada contador se reparte en varias
+# filas ("shards") para que las ventas simultáneas no compitan por el
+# bloqueo de una sola fila; el valor real es la suma de sus shards.
+class PlatformCounter(Base):
+    __tablename__ = "platform_counters"
+
+    name = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    value = Column(BigInteger, nullable=False, default=0)
+
+# --- VERSIÓN DEL CATÁLOGO POR USUARIO (ETag) ---
+# Se incrementa en la misma transacción que cualquier escritura de productos
+# o stock; GET /products responde 304 si el cliente ya tiene esa versión.
+class CatalogVersion(Base):
+    __tablename__ = "catalog_versions"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(BigInteger, nullable=False, default=0)
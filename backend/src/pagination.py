@@ -0,0 +1,119 @@
+import base64
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from sqlalchemy import DateTime, tuple_
+
+from .db_utils import null_sentinel, sortable
+
+# ==========================================
+#      PAGINACIÓN POR CURSOR (KEYSET)
+# ==========================================
+# En vez de OFFSET (que se vuelve más lento mientras más avanzas) se usa
+# el último valor visto: WHERE (col, id) > (:valor, :id) ORDER BY col, id.
+# Así cada página cuesta lo mismo, sea la primera o la número 1.000.
+#
+# El cuerpo de la respuesta sigue siendo la misma lista de siempre (el
+# frontend no cambia); los datos de paginación viajan en cabeceras:
+#   X-Next-Cursor  -> cursor para pedir la página siguiente (si hay)
+#   X-Total-Count  -> total de filas con los filtros (solo con include_total)
+# Sin ?limit= el endpoint responde todo como antes.
+#
+# Columnas que admiten NULL (ej: products.name, users.email): se ordena y
+# compara por coalesce(col, centinela) (ver db_utils.sortable). Los índices
+# (user_id, <columna>, id) de products usan esa misma expresión.
+
+MAX_PAGE_SIZE = 500
+PAGE_HEADERS = ["X-Next-Cursor", "X-Total-Count"]
+
+@dataclass
+class Page:
+    items: List[Any]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
+
+def encode_cursor(sort_value: Any, row_id: int) -> str:
+    raw = json.dumps([sort_value, row_id], default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[Any, int]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return sort_value, int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+
+def parse_sort(sort: str, allowed: Dict[str, Any]):
+    """'name' -> ascendente, '-name' -> descendente. Solo columnas permitidas (ver sortable)."""
+    descending = sort.startswith("-")
+    key = sort.lstrip("-")
+    if key not in allowed:
+        raise HTTPException(status_code=400, detail=f"Orden no soportado: {key}. Opciones: {', '.join(allowed)}")
+    return key, sortable(allowed[key]), descending
+
+def prefix_pattern(prefix: str) -> str:
+    # Escapa comodines para que el prefijo se busque literal
+    escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"{escaped}%"
+
+def order_by_sort(sort_column, id_column, descending: bool = False) -> List[Any]:
+    """ORDER BY estable: columna + id (solo id si el orden ya es por id)."""
+    order = [id_column] if sort_column is id_column else [sort_column, id_column]
+    return [col.desc() if descending else col.asc() for col in order]
+
+def paginate(
+    query,
+    sort_key: str,
+    sort_column,
+    id_column,
+    descending: bool = False,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    include_total: bool = False
+) -> Page:
+    """Aplica orden estable (columna + id), cursor y límite a una consulta ya filtrada."""
+    total = query.order_by(None).count() if include_total else None
+
+    by_id = sort_column is id_column # Orden solo por id: sin ORDER BY id, id ni tupla en el keyset
+
+    if cursor:
+        sort_value, last_id = decode_cursor(cursor)
+        if isinstance(sort_column.type, DateTime) and isinstance(sort_value, str):
+            # Las fechas viajan como texto dentro del cursor
+            try:
+                sort_value = datetime.fromisoformat(sort_value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Cursor inválido")
+        if by_id:
+            query = query.filter(id_column < last_id if descending else id_column > last_id)
+        else:
+            key = tuple_(sort_column, id_column)
+            query = query.filter(key < (sort_value, last_id) if descending else key > (sort_value, last_id))
+
+    query = query.order_by(*order_by_sort(sort_column, id_column, descending))
+
+    if limit is None:
+        return Page(items=query.all(), total=total)
+
+    limit = min(limit, MAX_PAGE_SIZE)
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        sort_value = getattr(last, sort_key)
+        if sort_value is None:
+            sort_value = null_sentinel(sort_column.type) # Mismo valor que usa coalesce en la consulta
+        next_cursor = encode_cursor(sort_value, last.id)
+
+    return Page(items=rows, next_cursor=next_cursor, total=total)
+
+def set_page_headers(response: Response, page: Page):
+    if page.next_cursor:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    if page.total is not None:
+        response.headers["X-Total-Count"] = str(page.total)
@@ -0,0 +1,129 @@
+import asyncio
+import os
+from typing import Any, Dict, Tuple
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+# ==========================================
+#   PRESUPUESTO DE CONEXIONES POR WORKER
+# ==========================================
+# Cada proceso (worker de uvicorn/gunicorn) tiene su propio pool. Con un
+# pool fijo de 20+30 por proceso, 4 workers ya piden 200 conexiones y
+# Postgres (max_connections=100 por defecto) las rechaza antes de que la
+# CPU se sature. Ahora el pool sale de un presupuesto global:
+#
+#   por worker = (DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS) / WEB_CONCURRENCY
+#                (con tope DB_MAX_POOL_PER_WORKER)
+#   pool_size  = la mitad (conexiones que quedan abiertas)
+#   overflow   = el resto (se abren en picos y se cierran al devolverse)
+#
+# WEB_CONCURRENCY es la misma variable que usan uvicorn --workers y gunicorn
+# para la cantidad de workers: definirla una vez sirve para ambos.
+# DB_POOL_SIZE / DB_MAX_OVERFLOW siguen funcionando como override manual.
+#
+# Control de admisión (PoolAdmissionMiddleware): como mucho tantas
+# peticiones en curso como conexiones tenga el pool del worker; las demás
+# esperan turno en el event loop. Sin esto, con más clientes que
+# conexiones los hilos quedan esperando pool_timeout y la petición termina
+# en 500 (y la sesión de una petición ya respondida, que aún no se cierra,
+# puede quedar bloqueada detrás de ellas). Limitar el threadpool no basta:
+# la sesión de get_db sigue con la conexión tomada entre el endpoint y su
+# cierre, que corre en otro turno del threadpool.
+#
+# Modo PgBouncer (DB_PGBOUNCER=1, pooling por transacción):
+#   - El pool lo lleva PgBouncer: SQLAlchemy usa NullPool (una conexión
+#     cliente por checkout, se cierra al devolverla).
+#   - Sin prepared statements del lado del servidor (psycopg 3 los crea
+#     solo tras N ejecuciones; se desactiva). psycopg2 nunca los usa.
+#   - Nada de estado de sesión: las migraciones usan pg_advisory_lock, así
+#     que van contra DATABASE_DIRECT_URL (Postgres sin PgBouncer) si existe.
+
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "100"))          # max_connections del servidor (o del plan)
+DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS", "10"))  # psql, migraciones, réplicas, superusuario
+DB_MAX_POOL_PER_WORKER = int(os.getenv("DB_MAX_POOL_PER_WORKER", "50"))    # Un worker no usa más que su threadpool
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+WEB_CONCURRENCY = max(int(os.getenv("WEB_CONCURRENCY", "1")), 1)
+DB_PGBOUNCER = os.getenv("DB_PGBOUNCER", "0").lower() in ("1", "true", "yes")
+
+def connections_per_worker(
+    max_connections: int = DB_MAX_CONNECTIONS,
+    reserved: int = DB_RESERVED_CONNECTIONS,
+    workers: int = WEB_CONCURRENCY,
+    cap: int = DB_MAX_POOL_PER_WORKER
+) -> int:
+    share = (max_connections - reserved) // max(workers, 1)
+    return max(min(share, cap), 2)
+
+def pool_settings(per_worker: int = None) -> Dict[str, Any]:
+    """Argumentos de create_engine para el pool de este proceso."""
+    if DB_PGBOUNCER:
+        return {"poolclass": NullPool}
+
+    per_worker = per_worker or connections_per_worker()
+    pool_size = int(os.getenv("DB_POOL_SIZE", "0")) or max(per_worker // 2, 1)
+    max_overflow = int(os.getenv("DB_MAX_OVERFLOW", "-1"))
+    if max_overflow < 0:
+        max_overflow = max(per_worker - pool_size, 0)
+    return {
+        "pool_size": pool_size,
+        "max_overflow": max_overflow,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+def driver_args(url: str) -> Dict[str, Any]:
+    """connect_args según el driver (solo cambia algo en modo PgBouncer)."""
+    if DB_PGBOUNCER and make_url(url).get_driver_name() == "psycopg":
+        return {"prepare_threshold": None} # psycopg 3: sin prepared statements
+    return {}
+
+def pool_capacity(engine) -> int:
+    """Conexiones que el pool puede prestar a la vez (0 = sin límite propio, ej: NullPool)."""
+    pool = engine.pool
+    size = getattr(pool, "size", None)
+    if not callable(size):
+        return 0
+    return size() + max(getattr(pool, "_max_overflow", 0), 0)
+
+def describe(engine) -> str:
+    if DB_PGBOUNCER:
+        return f"modo PgBouncer (NullPool), {WEB_CONCURRENCY} worker(s)"
+    return (
+        f"pool {engine.pool.size()}+{engine.pool._max_overflow} por worker, "
+        f"{WEB_CONCURRENCY} worker(s), presupuesto {DB_MAX_CONNECTIONS - DB_RESERVED_CONNECTIONS}"
+    )
+
+# --- Control de admisión (middleware ASGI) ---
+_admission = {"in_flight": 0, "waiting": 0}
+
+def admission_stats() -> Dict[str, int]:
+    return dict(_admission)
+
+class PoolAdmissionMiddleware:
+    """Limita las peticiones HTTP simultáneas a la capacidad del pool (ASGI puro)."""
+
+    def __init__(self, app, engine, skip_paths: Tuple[str, ...] = (), skip_prefixes: Tuple[str, ...] = ()):
+        self.app = app
+        self.skip_paths = skip_paths
+        self.skip_prefixes = skip_prefixes
+        self.limit = pool_capacity(engine)
+        self._semaphore = asyncio.Semaphore(self.limit) if self.limit else None
+
+    async def __call__(self, scope, receive, send):
+        if (self._semaphore is None or scope["type"] != "http" or scope["path"] in self.skip_paths
+                or scope["path"].startswith(self.skip_prefixes)):
+            await self.app(scope, receive, send)
+            return
+
+        _admission["waiting"] += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            _admission["waiting"] -= 1
+        _admission["in_flight"] += 1
+        try:
+            # Se libera al terminar la respuesta completa (incluye streams y el cierre de la sesión)
+            await self.app(scope, receive, send)
+        finally:
+            _admission["in_flight"] -= 1
+            self._semaphore.release()
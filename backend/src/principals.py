@@ -0,0 +1,51 @@
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from .models import User
+from .security import session_key
+from .ttl_cache import TTLCache
+
+# ==========================================
+#    CACHÉ DE USUARIOS AUTENTICADOS
+# ==========================================
+# get_current_user se ejecuta en TODAS las peticiones. En vez de ir a la
+# tabla users cada vez, guardamos una "foto" del usuario (Principal) en un
+# LRU con expiración, indexado por el 'sub' del token.
+# - /user/update y /user/delete invalidan la entrada de inmediato.
+# - Con varios workers, los demás procesos se enteran al expirar el TTL.
+
+PRINCIPAL_CACHE_TTL = float(os.getenv("PRINCIPAL_CACHE_TTL", "60"))        # segundos
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "10000"))     # entradas
+
+@dataclass(frozen=True)
+class Principal:
+    """Datos del usuario autenticado que usan los endpoints (no es un objeto de sesión)."""
+    id: int
+    email: str
+    is_admin: bool
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    phone: Optional[str] = None
+    address: Optional[str] = None
+    session_key: Optional[str] = None # Ver security.session_key (claim 'sid')
+
+    @classmethod
+    def from_user(cls, user: User) -> "Principal":
+        return cls(
+            id=user.id,
+            email=user.email,
+            is_admin=bool(user.is_admin),
+            first_name=user.first_name,
+            last_name=user.last_name,
+            phone=user.phone,
+            address=user.address,
+            session_key=session_key(user.hashed_password)
+        )
+
+    def matches(self, payload: dict) -> bool:
+        """El token es de esta cuenta (no de una borrada con el mismo email, ni anterior a un cambio de contraseña)."""
+        user_id, sid = payload.get("uid"), payload.get("sid")
+        return (user_id is None or user_id == self.id) and (sid is None or sid == self.session_key)
+
+principal_cache = TTLCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL) # email ('sub') -> Principal
@@ -0,0 +1,215 @@
+import csv
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .conditional import bump_catalog_version
+from .counters import bump
+from .inventory import adjust_valuation, stock_value
+from .models import Product, MovementHistory
+
+# ==========================================
+#     IMPORTACIÓN MASIVA DE PRODUCTOS
+# ==========================================
+# Para cargar un catálogo completo (miles de SKUs) en una sola subida:
+#   1. El archivo (CSV o XLSX) se lee fila a fila, sin cargarlo entero
+#      (XLSX usa el modo read-only de openpyxl).
+#   2. Cada bloque de filas se valida y se compara contra los códigos ya
+#      existentes del usuario con un solo IN (...).
+#   3. Productos e historial inicial se insertan en bloque (INSERT masivo
+#      con RETURNING), se ajusta la valorización y se hace commit por bloque.
+# El resultado informa cada fila con error o duplicada.
+#
+# Si el archivo no se puede leer a la mitad (CSV que no es UTF-8, XLSX
+# corrupto) se confirma lo ya validado y el resultado trae "file_error":
+# los bloques anteriores ya tienen commit y el cliente necesita saberlo.
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+# Encabezados aceptados (en minúsculas) -> campo del producto
+COLUMN_ALIASES = {
+    "barcode": "barcode", "codigo": "barcode", "código": "barcode",
+    "name": "name", "nombre": "name",
+    "stock": "stock",
+    "cost_price": "cost_price", "costo": "cost_price",
+    "gain": "gain", "ganancia": "gain",
+    "sale_price": "sale_price", "precio": "sale_price", "precio_venta": "sale_price",
+}
+
+class ImportFileError(ValueError):
+    """El archivo no se puede leer (codificación, formato o contenido corrupto)."""
+
+class ImportRow(BaseModel):
+    barcode: str
+    name: str
+    stock: int = 0
+    cost_price: float = 0.0
+    gain: float = 0.0
+    sale_price: float = 0.0
+
+def _normalize_header(header: List[Any]) -> List[str]:
+    return [COLUMN_ALIASES.get(str(h or "").strip().lower(), "") for h in header]
+
+def _rows_from_csv(raw) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    # Se decodifica línea a línea (no por bloques) para que un error de
+    # codificación corte justo en esa línea y el mensaje la indique bien
+    current = {"line": 0}
+
+    def decoded_lines():
+        for number, line in enumerate(raw, start=1):
+            current["line"] = number
+            yield line.decode("utf-8-sig" if number == 1 else "utf-8")
+
+    reader = csv.reader(decoded_lines())
+    try:
+        header = _normalize_header(next(reader, []))
+        for line_number, values in enumerate(reader, start=2):
+            if not any(v.strip() for v in values):
+                continue
+            yield line_number, {k: v.strip() for k, v in zip(header, values) if k and v.strip() != ""}
+    except UnicodeDecodeError:
+        raise ImportFileError(f"El CSV no está en UTF-8 (línea {current['line']}). Guárdalo como \"CSV UTF-8\"")
+    except csv.Error as e:
+        raise ImportFileError(f"CSV inválido en la línea {current['line']}: {e}")
+
+def _rows_from_xlsx(raw) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    from openpyxl import load_workbook
+
+    try:
+        wb = load_workbook(raw, read_only=True, data_only=True)
+    except Exception as e: # BadZipFile, InvalidFileException, KeyError de partes faltantes...
+        raise ImportFileError(f"No se pudo abrir el XLSX: {e}") from e
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        header = _normalize_header(list(next(rows, [])))
+        for line_number, values in enumerate(rows, start=2):
+            if not any(v not in (None, "") for v in values):
+                continue
+            data = {k: v for k, v in zip(header, values) if k and v not in (None, "")}
+            # Excel suele guardar los códigos de barras como número
+            if isinstance(data.get("barcode"), float) and data["barcode"].is_integer():
+                data["barcode"] = int(data["barcode"])
+            if "barcode" in data:
+                data["barcode"] = str(data["barcode"]).strip()
+            yield line_number, data
+    except ImportFileError:
+        raise
+    except Exception as e: # XML interno corrupto
+        raise ImportFileError(f"XLSX corrupto: {e}") from e
+    finally:
+        wb.close()
+
+def iter_import_rows(raw, filename: str) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    if (filename or "").lower().endswith((".xlsx", ".xlsm")):
+        return _rows_from_xlsx(raw)
+    return _rows_from_csv(raw)
+
+def _flush_batch(db: Session, user_id: int, batch: List[Tuple[int, ImportRow]], report: Dict[str, Any]):
+    barcodes = [row.barcode for _, row in batch]
+    existing = {
+        b for (b,) in db.query(Product.barcode).filter(
+            Product.user_id == user_id,
+            Product.barcode.in_(barcodes)
+        )
+    }
+
+    to_insert = []
+    for line_number, row in batch:
+        if row.barcode in existing:
+            _add_error(report, line_number, row.barcode, "duplicate", "Ya existe un producto con este código")
+            continue
+        to_insert.append({**row.model_dump(), "user_id": user_id})
+
+    if not to_insert:
+        return
+
+    try:
+        created = db.execute(
+            insert(Product).returning(Product.id, Product.stock, Product.cost_price),
+            to_insert
+        ).all()
+    except IntegrityError:
+        # Otra petición creó alguno de estos códigos entre el IN y el INSERT:
+        # se reintenta fila a fila y las que choquen quedan como duplicadas
+        db.rollback()
+        created = _insert_one_by_one(db, batch, to_insert, report)
+        if not created:
+            return
+
+    now = datetime.now()
+    movements = [
+        {"product_id": pid, "user_id": user_id, "movement_type": "suma",
+         "quantity_changed": stock, "final_stock": stock, "timestamp": now}
+        for pid, stock, _ in created if stock and stock > 0
+    ]
+    if movements:
+        db.execute(insert(MovementHistory), movements)
+    adjust_valuation(db, user_id, sum(stock_value(stock, cost) for _, stock, cost in created))
+    bump(db, products=len(created))
+    bump_catalog_version(db, user_id)
+
+    db.commit()
+    report["inserted"] += len(created)
+
+def _insert_one_by_one(db: Session, batch: List[Tuple[int, ImportRow]], to_insert: List[Dict[str, Any]], report: Dict[str, Any]):
+    line_numbers = {row.barcode: line_number for line_number, row in batch}
+    created = []
+    for values in to_insert:
+        try:
+            with db.begin_nested():
+                created.append(db.execute(
+                    insert(Product).values(**values).returning(Product.id, Product.stock, Product.cost_price)
+                ).one())
+        except IntegrityError:
+            _add_error(report, line_numbers[values["barcode"]], values["barcode"], "duplicate", "Ya existe un producto con este código")
+    return created
+
+def _add_error(report: Dict[str, Any], line_number: int, barcode: Any, status: str, detail: str):
+    report["failed" if status == "error" else "duplicates"] += 1
+    if len(report["errors"]) < MAX_REPORTED_ERRORS:
+        report["errors"].append({"row": line_number, "barcode": barcode, "status": status, "detail": detail})
+
+def import_products(db: Session, user_id: int, raw, filename: str, batch_size: int = IMPORT_BATCH_SIZE) -> Dict[str, Any]:
+    """Importa productos desde CSV/XLSX. Retorna totales y el detalle de filas con problemas."""
+    report = {"processed": 0, "inserted": 0, "duplicates": 0, "failed": 0, "errors": []}
+    seen = set()
+    batch: List[Tuple[int, ImportRow]] = []
+
+    try:
+        for line_number, data in iter_import_rows(raw, filename):
+            report["processed"] += 1
+            try:
+                row = ImportRow(**data)
+            except ValidationError as e:
+                fields = ", ".join(str(err["loc"][0]) for err in e.errors())
+                _add_error(report, line_number, data.get("barcode"), "error", f"Datos inválidos: {fields}")
+                continue
+
+            if row.barcode in seen:
+                _add_error(report, line_number, row.barcode, "duplicate", "Código repetido en el archivo")
+                continue
+            seen.add(row.barcode)
+
+            batch.append((line_number, row))
+            if len(batch) >= batch_size:
+                _flush_batch(db, user_id, batch, report)
+                batch = []
+
+        if batch:
+            _flush_batch(db, user_id, batch, report)
+    except ImportFileError as e:
+        # Lo leído antes del error es válido: se confirma y se informa dónde se cortó
+        if batch:
+            _flush_batch(db, user_id, batch, report)
+        report["file_error"] = str(e)
+    except Exception:
+        db.rollback()
+        raise
+
+    report["errors_truncated"] = (report["failed"] + report["duplicates"]) > len(report["errors"])
+    return report
@@ -0,0 +1,155 @@
+import contextlib
+import contextvars
+import logging
+import os
+import re
+import time
+from collections import Counter
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("query_profiler")
+
+# ==========================================
+#   DETECTOR DE N+1 Y CONSULTAS LENTAS
+# ==========================================
+# Modo de perfilado para desarrollo / canary (QUERY_PROFILING=1):
+#   - Agrupa las sentencias SQL de cada petición por "forma" (el SQL con
+#     los valores reemplazados por ?). Si una misma forma se repite
+#     N_PLUS_ONE_THRESHOLD veces o más, se registra como posible N+1 con el
+#     endpoint que la originó.
+#   - Cada sentencia que tarda más de SLOW_QUERY_MS se registra al momento,
+#     también con su endpoint.
+#   - La respuesta lleva X-Query-Count para verlo desde el navegador.
+# Apagado no instala nada (cero costo en producción).
+#
+# Para pruebas / scripts de CI está query_budget(), que falla si un bloque
+# ejecuta más sentencias de las permitidas:
+#
+#     with query_budget(engine, 6):
+#         client.get("/dashboard/stats", headers=auth)
+
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", "0").lower() in ("1", "true", "yes")
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "5"))
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|:\w+|\$\d+")
+_IN_LISTS = re.compile(r"\((?:\s*\?\s*,)+\s*\?\s*\)")
+_SPACES = re.compile(r"\s+")
+
+def statement_shape(statement: str) -> str:
+    """SQL sin valores: 'WHERE id = 7' y 'WHERE id = 9' tienen la misma forma."""
+    shape = _LITERALS.sub("?", statement)
+    shape = _IN_LISTS.sub("(?)", shape)
+    return _SPACES.sub(" ", shape).strip()
+
+class QueryProfile:
+    def __init__(self, endpoint: str = ""):
+        self.endpoint = endpoint
+        self.shapes: Counter = Counter()
+        self.total = 0
+        self.seconds = 0.0
+
+    def record(self, statement: str, elapsed: float):
+        self.total += 1
+        self.seconds += elapsed
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, threshold: int = N_PLUS_ONE_THRESHOLD) -> List[Tuple[str, int]]:
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+    def report(self) -> str:
+        lines = [f"{self.total} sentencias ({self.seconds * 1000:.1f} ms) en {self.endpoint or 'bloque'}"]
+        for shape, n in self.shapes.most_common(10):
+            lines.append(f"  {n:>4}x {shape[:160]}")
+        return "\n".join(lines)
+
+_current_profile: contextvars.ContextVar[Optional[QueryProfile]] = contextvars.ContextVar("query_profile", default=None)
+
+def _listen(engine: Engine, on_statement) -> Tuple:
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profiler_started", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get("profiler_started")
+        if started:
+            on_statement(statement, time.perf_counter() - started.pop())
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    return before, after
+
+def _unlisten(engine: Engine, listeners: Tuple):
+    before, after = listeners
+    event.remove(engine, "before_cursor_execute", before)
+    event.remove(engine, "after_cursor_execute", after)
+
+# --- Modo perfilado (middleware) ---
+def install_profiler(engine: Engine):
+    """Registra cada sentencia en el perfil de la petición en curso y avisa de las lentas."""
+
+    def on_statement(statement: str, elapsed: float):
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.record(statement, elapsed)
+        if elapsed * 1000 >= SLOW_QUERY_MS:
+            endpoint = profile.endpoint if profile else "fuera de petición"
+            logger.warning("Consulta lenta (%.0f ms) en %s: %s", elapsed * 1000, endpoint, statement_shape(statement)[:300])
+
+    _listen(engine, on_statement)
+
+class QueryProfilerMiddleware:
+    """Perfil SQL por petición: avisa de posibles N+1 y agrega X-Query-Count (ASGI puro)."""
+
+    def __init__(self, app, threshold: int = N_PLUS_ONE_THRESHOLD):
+        self.app = app
+        self.threshold = threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = QueryProfile(f"{scope.get('method', '')} {scope['path']}")
+        token = _current_profile.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # Las rutas sync ya terminaron de consultar al empezar la respuesta
+                headers = list(message.get("headers", []))
+                headers.append((b"x-query-count", str(profile.total).encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                profile.endpoint = f"{scope.get('method', '')} {route}"
+            for shape, n in profile.repeated(self.threshold):
+                logger.warning("Posible N+1 en %s: %dx %s", profile.endpoint, n, shape[:300])
+
+# --- Presupuesto de consultas (pruebas / CI) ---
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+@contextlib.contextmanager
+def query_budget(engine: Engine, max_queries: int, max_repeats: Optional[int] = None, label: str = "") -> Iterator[QueryProfile]:
+    """Falla si el bloque ejecuta más de max_queries sentencias (o repite una forma más de max_repeats)."""
+    profile = QueryProfile(label)
+    listeners = _listen(engine, profile.record)
+    try:
+        yield profile
+    finally:
+        _unlisten(engine, listeners)
+
+    if profile.total > max_queries:
+        raise QueryBudgetExceeded(f"Presupuesto de {max_queries} consultas superado\n{profile.report()}")
+    if max_repeats is not None:
+        repeated = profile.repeated(max_repeats + 1)
+        if repeated:
+            raise QueryBudgetExceeded(f"Forma repetida más de {max_repeats} veces (N+1)\n{profile.report()}")
@@ -0,0 +1,67 @@
+import logging
+import os
+from typing import Callable, Optional
+
+from fastapi import Depends
+from sqlalchemy.orm import Session
+
+from .auth import get_current_user
+from .database import DATABASE_READ_URL, ReadSessionLocal, SessionLocal
+from .principals import Principal
+from .response_cache import response_cache
+
+logger = logging.getLogger("replica")
+
+# ==========================================
+#   RÉPLICA DE LECTURA + READ-YOUR-WRITES
+# ==========================================
+# Con DATABASE_READ_URL definido, los endpoints de reportes
+# (/dashboard/stats, /sales/stats, /sales/export, lecturas de /admin/*)
+# usan get_read_db y leen de la réplica, así no compiten con el checkout
+# (create_sale) por el primario.
+#
+# La réplica va atrasada unos milisegundos/segundos. Para que un usuario
+# vea siempre sus propias escrituras, cada endpoint que escribe llama a
+# note_write(user_id) después del commit; durante READ_YOUR_WRITES_SECONDS
+# las lecturas de ese usuario vuelven al primario. La marca se guarda en
+# el backend de response_cache (Redis si RESPONSE_CACHE_URL está definido),
+# así vale para todos los workers.
+#
+# Sin réplica todo va al primario y note_write no hace nada.
+#
+# Probar en local con dos bases (primario + réplica "atrasada"):
+#     python bench/check_read_replica.py
+
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "10"))
+KEY_PREFIX = "ryw"
+
+def replica_enabled() -> bool:
+    return bool(DATABASE_READ_URL)
+
+def note_write(user_id: Optional[int]):
+    """Marca que el usuario acaba de escribir: sus lecturas van al primario por un rato."""
+    if not replica_enabled() or user_id is None:
+        return
+    try:
+        response_cache.backend.set(f"{KEY_PREFIX}:{user_id}", b"1", READ_YOUR_WRITES_SECONDS)
+    except Exception as e:
+        logger.warning("No se pudo marcar la escritura del usuario %s: %s", user_id, e)
+
+def recently_wrote(user_id: int) -> bool:
+    try:
+        return response_cache.backend.get(f"{KEY_PREFIX}:{user_id}") is not None
+    except Exception:
+        return True # Sin saberlo, lo seguro es leer del primario
+
+def read_session_factory(user_id: int) -> Callable[[], Session]:
+    """Réplica, salvo que el usuario haya escrito hace poco (o no haya réplica)."""
+    if not replica_enabled() or recently_wrote(user_id):
+        return SessionLocal
+    return ReadSessionLocal
+
+def get_read_db(current_user: Principal = Depends(get_current_user)):
+    db = read_session_factory(current_user.id)()
+    try:
+        yield db
+    finally:
+        db.close()
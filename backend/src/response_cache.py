@@ -0,0 +1,191 @@
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+from .ttl_cache import TTLCache
+
+logger = logging.getLogger("response_cache")
+
+# ==========================================
+#   CACHÉ DE RESPUESTAS INVALIDADA POR ESCRITURA
+# ==========================================
+# /dashboard/stats, /sales/stats y /admin/stats solo cambian cuando hay una
+# venta, un movimiento de stock o una escritura de productos, pero el
+# frontend los pide en cada carga de página. Guardamos la respuesta ya
+# serializada por usuario ("scope") y la invalidamos explícitamente desde
+# los endpoints que escriben.
+#
+# Invalidación por generación: cada scope tiene un contador de versión
+# (INCR atómico); la versión forma parte de la clave, así invalidar es O(1)
+# y las entradas viejas simplemente expiran o salen del LRU.
+#
+# Backend intercambiable con semántica tipo Redis (get / set con TTL /
+# incr). Por defecto es un LRU en memoria del proceso; con
+# RESPONSE_CACHE_URL=redis://... se comparte entre workers (requiere el
+# paquete "redis"). El TTL es solo una red de seguridad para datos que
+# dependen de la hora (ej: "ventas de hoy" al cambiar el día).
+
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "60"))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2048"))
+RESPONSE_CACHE_URL = os.getenv("RESPONSE_CACHE_URL", "")
+KEY_PREFIX = "resp"
+GLOBAL_SCOPE = "global" # Respuestas de toda la plataforma (/admin/stats)
+
+class CacheBackend:
+    """Interfaz mínima (subconjunto de comandos de Redis) que usa ResponseCache."""
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+class MemoryBackend(CacheBackend):
+    """Backend del proceso: valores en un TTLCache (ver ttl_cache.py) + contadores de versión."""
+
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE):
+        self._data = TTLCache(maxsize)
+        self._counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def evictions(self) -> int:
+        return self._data.evictions
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            if key in self._counters:
+                # Igual que Redis: un contador se lee como texto
+                return str(self._counters[key]).encode()
+        return self._data.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self._data.set(key, value, ttl)
+
+    def incr(self, key: str) -> int:
+        # Los contadores de versión no expiran ni entran al LRU
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def clear(self):
+        self._data.clear()
+        with self._lock:
+            self._counters.clear()
+
+class RedisBackend(CacheBackend):
+    """Adaptador para un cliente compatible con redis-py (redis.Redis, fakeredis, etc.)."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(key, value, px=max(int(ttl * 1000), 1))
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+
+    def clear(self):
+        for key in self.client.scan_iter(f"{KEY_PREFIX}:*"):
+            self.client.delete(key)
+
+def backend_from_env(url: str = RESPONSE_CACHE_URL) -> CacheBackend:
+    if not url:
+        return MemoryBackend()
+    try:
+        import redis
+    except ImportError:
+        logger.warning("RESPONSE_CACHE_URL definido pero falta el paquete 'redis'; se usa caché en memoria")
+        return MemoryBackend()
+    return RedisBackend(redis.Redis.from_url(url))
+
+class ResponseCache:
+    def __init__(self, backend: Optional[CacheBackend] = None, ttl: float = RESPONSE_CACHE_TTL):
+        self.backend = backend or MemoryBackend()
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def _count(self, attr: str):
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + 1)
+
+    def _version(self, scope: str) -> str:
+        value = self.backend.get(f"{KEY_PREFIX}:v:{scope}")
+        return value.decode() if isinstance(value, bytes) else str(value or 0)
+
+    def _key(self, scope: str, name: str, params: Dict[str, Any]) -> str:
+        args = "&".join(f"{k}={params[k]}" for k in sorted(params))
+        return f"{KEY_PREFIX}:{scope}:{self._version(scope)}:{name}:{args}"
+
+    def get_or_compute(self, scope: Any, name: str, compute: Callable[[], Any], **params) -> Any:
+        """Devuelve la respuesta cacheada del scope o la calcula y la guarda (ya serializable a JSON)."""
+        scope = str(scope)
+        try:
+            key = self._key(scope, name, params)
+            cached = self.backend.get(key)
+        except Exception as e:
+            # Si el backend externo falla, se responde sin caché
+            logger.warning("Caché de respuestas no disponible: %s", e)
+            self._count("errors")
+            return compute()
+
+        if cached is not None:
+            self._count("hits")
+            return json.loads(cached)
+
+        self._count("misses")
+        value = jsonable_encoder(compute())
+        try:
+            self.backend.set(key, json.dumps(value).encode("utf-8"), self.ttl)
+        except Exception as e:
+            logger.warning("No se pudo guardar en la caché de respuestas: %s", e)
+            self._count("errors")
+        return value
+
+    def invalidate(self, scope: Any):
+        try:
+            self.backend.incr(f"{KEY_PREFIX}:v:{scope}")
+        except Exception as e:
+            logger.warning("No se pudo invalidar la caché de respuestas: %s", e)
+            self._count("errors")
+        self._count("invalidations")
+
+    def invalidate_user(self, user_id: Optional[int]):
+        """Llamar después de cualquier escritura que cambie ventas, stock o productos del usuario."""
+        if user_id is not None:
+            self.invalidate(user_id)
+        self.invalidate(GLOBAL_SCOPE) # Los totales de plataforma también cambian
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            "invalidations": self.invalidations,
+            "errors": self.errors,
+        }
+
+response_cache = ResponseCache(backend_from_env())
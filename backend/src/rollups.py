@@ -0,0 +1,110 @@
+import argparse
+from datetime import date, datetime
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from .db_utils import upsert_increment
+from .models import DailySalesRollup, Sale, SaleItem, Product
+
+# ==========================================
+#   RESUMEN DIARIO DE VENTAS (MANTENIMIENTO)
+# ==========================================
+# record_sale() se llama desde create_sale antes del commit, por lo que el
+# rollup queda consistente con la venta (misma transacción).
+# rebuild_rollups() recalcula todo desde Sale/SaleItem. La carga inicial
+# de los datos históricos la hace la migración 0007; a mano solo hace
+# falta si se sospecha de un descuadre:
+#
+#     python -m src.rollups            # todos los usuarios
+#     python -m src.rollups --user 7   # solo un usuario
+
+def record_sale(
+    db: Session,
+    user_id: int,
+    day: date,
+    payment_method: str,
+    revenue: int,
+    profit: float,
+    units: int,
+    transactions: int = 1
+):
+    """Suma una venta al rollup del día con un UPSERT atómico (no se hace commit aquí)."""
+    upsert_increment(
+        db, DailySalesRollup,
+        keys={"user_id": user_id, "day": day, "payment_method": payment_method or "efectivo"},
+        increments={"revenue": revenue, "profit": profit, "units": units, "transactions": transactions}
+    )
+
+def _as_date(value) -> date:
+    # SQLite devuelve func.date() como texto, Postgres como date
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, str):
+        return date.fromisoformat(value)
+    return value
+
+def rebuild_rollups(db: Session, user_id: Optional[int] = None) -> int:
+    """Reconstruye el rollup desde las ventas existentes. Retorna la cantidad de filas escritas."""
+    delete_q = db.query(DailySalesRollup)
+    if user_id is not None:
+        delete_q = delete_q.filter(DailySalesRollup.user_id == user_id)
+    delete_q.delete(synchronize_session=False)
+
+    sale_day = func.date(Sale.date)
+    method = func.coalesce(Sale.payment_method, "efectivo")
+
+    # 1. Ingresos y transacciones (nivel venta)
+    sales_q = db.query(
+        Sale.user_id, sale_day, method,
+        func.coalesce(func.sum(Sale.total_amount), 0),
+        func.count(Sale.id)
+    ).filter(Sale.user_id.isnot(None))
+    if user_id is not None:
+        sales_q = sales_q.filter(Sale.user_id == user_id)
+
+    rows: Dict[Tuple, Dict] = {}
+    for uid, day, pm, revenue, count in sales_q.group_by(Sale.user_id, sale_day, method):
+        rows[(uid, _as_date(day), pm)] = {
+            "user_id": uid, "day": _as_date(day), "payment_method": pm,
+            "revenue": revenue, "profit": 0.0, "units": 0, "transactions": count
+        }
+
+    # 2. Utilidad y unidades (nivel item), mismo criterio que create_sale
+    items_q = db.query(
+        Sale.user_id, sale_day, method,
+        func.coalesce(func.sum((SaleItem.unit_price - func.coalesce(SaleItem.cost_price, Product.cost_price, 0)) * SaleItem.quantity), 0),
+        func.coalesce(func.sum(SaleItem.quantity), 0)
+    ).join(SaleItem, SaleItem.sale_id == Sale.id).outerjoin(
+        Product, SaleItem.product_id == Product.id
+    ).filter(Sale.user_id.isnot(None))
+    if user_id is not None:
+        items_q = items_q.filter(Sale.user_id == user_id)
+
+    for uid, day, pm, profit, units in items_q.group_by(Sale.user_id, sale_day, method):
+        row = rows.get((uid, _as_date(day), pm))
+        if row is not None:
+            row["profit"] = profit
+            row["units"] = units
+
+    if rows:
+        db.execute(insert(DailySalesRollup), list(rows.values()))
+    db.commit()
+    return len(rows)
+
+if __name__ == "__main__":
+    from .database import SessionLocal, engine
+    from .migrations import run_migrations
+
+    parser = argparse.ArgumentParser(description="Reconstruye el resumen diario de ventas")
+    parser.add_argument("--user", type=int, default=None, help="ID de usuario (por defecto todos)")
+    args = parser.parse_args()
+
+    run_migrations(engine)
+    session = SessionLocal()
+    try:
+        written = rebuild_rollups(session, args.user)
+        print(f"Rollup reconstruido: {written} filas")
+    finally:
+        session.close()
@@ -0,0 +1,148 @@
+from collections import OrderedDict
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import insert, update, bindparam
+from sqlalchemy.orm import Session
+
+from .conditional import bump_catalog_version
+from .counters import bump
+from .events import publish_user_event, sale_event
+from .inventory import adjust_valuation, stock_value
+from .models import Product, Sale, SaleItem, MovementHistory
+from .rollups import record_sale
+from .schemas import SaleCreate
+
+# ==========================================
+#        PIPELINE DE VENTAS (CHECKOUT)
+# ==========================================
+# Toda la venta ocurre en UNA transacción:
+#   1. Se cargan todos los productos del carrito con un solo IN (...) y
+#      SELECT ... FOR UPDATE (orden por id para evitar deadlocks).
+#   2. El stock se descuenta con un UPDATE condicional (stock >= cantidad)
+#      en lote; si alguna fila no se actualiza es que otra caja vendió antes.
+#   3. Items y movimientos se insertan en bloque (executemany).
+#   4. Se actualizan el resumen diario, la fecha de última venta, la
+#      valorización del inventario y los contadores de plataforma, y
+#      recién ahí se hace commit.
+# Si algo falla no queda ninguna venta "vacía" guardada.
+
+IVA_RATE = 0.19
+
+_decrement_stock = (
+    update(Product.__table__)
+    .where(Product.__table__.c.id == bindparam("pid"))
+    .where(Product.__table__.c.stock >= bindparam("qty"))
+    .values(
+        stock=Product.__table__.c.stock - bindparam("qty"),
+        last_sold_at=bindparam("sold_at")
+    )
+)
+
+def _merge_cart(sale_data: SaleCreate) -> "OrderedDict[int, int]":
+    # Si el mismo producto viene dos veces en el carrito, se suma
+    cart: "OrderedDict[int, int]" = OrderedDict()
+    for item in sale_data.items:
+        if item.quantity <= 0:
+            raise HTTPException(status_code=400, detail="La cantidad debe ser mayor a 0")
+        cart[item.product_id] = cart.get(item.product_id, 0) + item.quantity
+    return cart
+
+def process_sale(db: Session, user_id: int, sale_data: SaleCreate) -> Sale:
+    """Registra una venta completa (stock, items, historial y resumen) con un único commit."""
+    cart = _merge_cart(sale_data)
+    if not cart:
+        raise HTTPException(status_code=400, detail="El carrito está vacío")
+
+    try:
+        # 1. Carga y bloqueo de todos los productos del carrito
+        products = db.query(Product).filter(
+            Product.id.in_(list(cart.keys())),
+            Product.user_id == user_id
+        ).order_by(Product.id).with_for_update().all()
+        by_id = {p.id: p for p in products}
+
+        for product_id, quantity in cart.items():
+            product = by_id.get(product_id)
+            if not product:
+                raise HTTPException(status_code=404, detail=f"Producto {product_id} no encontrado")
+            if product.stock < quantity:
+                raise HTTPException(status_code=400, detail=f"Stock insuficiente para {product.name}")
+
+        # 2. Descuento atómico de stock (protege también a motores sin FOR UPDATE)
+        sold_at = datetime.now()
+        result = db.execute(
+            _decrement_stock,
+            [{"pid": pid, "qty": qty, "sold_at": sold_at} for pid, qty in sorted(cart.items())]
+        )
+        if db.get_bind().dialect.supports_sane_multi_rowcount and result.rowcount != len(cart):
+            raise HTTPException(status_code=409, detail="El stock cambió durante la venta, intenta nuevamente")
+
+        # 3. Cabecera de la venta
+        net_amount = 0
+        sale_profit = 0
+        units_sold = 0
+        cost_sold = 0
+        for product_id, quantity in cart.items():
+            product = by_id[product_id]
+            net_amount += product.sale_price * quantity
+            sale_profit += (product.sale_price - (product.cost_price or 0)) * quantity
+            units_sold += quantity
+            cost_sold += stock_value(quantity, product.cost_price)
+
+        new_sale = Sale(
+            user_id=user_id,
+            date=sold_at,
+            total_amount=int(net_amount + net_amount * IVA_RATE),
+            payment_method=sale_data.payment_method
+        )
+        db.add(new_sale)
+        db.flush()
+
+        # 4. Items y movimientos en bloque
+        db.execute(insert(SaleItem), [
+            {
+                "sale_id": new_sale.id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "unit_price": by_id[product_id].sale_price,
+                "cost_price": by_id[product_id].cost_price,
+            }
+            for product_id, quantity in cart.items()
+        ])
+        db.execute(insert(MovementHistory), [
+            {
+                "product_id": product_id,
+                "user_id": user_id,
+                "movement_type": "venta",
+                "quantity_changed": quantity,
+                "final_stock": by_id[product_id].stock - quantity,
+                "timestamp": new_sale.date,
+            }
+            for product_id, quantity in cart.items()
+        ])
+
+        # 5. Resumen diario y valorización en la misma transacción
+        record_sale(
+            db,
+            user_id=user_id,
+            day=new_sale.date.date(),
+            payment_method=new_sale.payment_method,
+            revenue=new_sale.total_amount,
+            profit=sale_profit,
+            units=units_sold
+        )
+        adjust_valuation(db, user_id, -cost_sold)
+        bump(db, sales=1, revenue=new_sale.total_amount)
+        bump_catalog_version(db, user_id)
+
+        stock_changes = [(pid, by_id[pid].stock - qty) for pid, qty in cart.items()]
+        db.commit()
+
+    except Exception:
+        db.rollback()
+        raise
+
+    # 6. Aviso en vivo a las otras pantallas del usuario (ver events.py)
+    publish_user_event(user_id, sale_event(new_sale, stock_changes))
+    return new_sale
@@ -1,5 +1,7 @@
+import hashlib
+import hmac
 from datetime import datetime, timedelta, timezone
-from typing import Union, Any
+from typing import Union, Any, Dict, Optional
 from jose import jwt
 from passlib.context import CryptContext
 
@@ -11,6 +13,10 @@ ALGORITHM = "HS256"
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 12  # 12 horas
 
+# Token para abrir el stream SSE (va en la URL): dura segundos y solo sirve para eso
+STREAM_TOKEN_SCOPE = "stream"
+STREAM_TOKEN_EXPIRE_SECONDS = 60
+
 def get_password_hash(password: str) -> str:
     # Aseguramos que sea string antes de hashear
     return pwd_context.hash(str(password))
@@ -18,7 +24,13 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
-def create_access_token(subject: Union[str, Any], expires_delta: timedelta = None) -> str:
+def session_key(hashed_password: str) -> str:
+    # Huella de la cuenta para el claim 'sid' del token. Cambia si la cuenta se
+    # borra y el email se vuelve a registrar (aunque la base reutilice el id,
+    # ej: SQLite) o si cambia la contraseña: los tokens anteriores dejan de valer.
+    return hmac.new(SECRET_KEY.encode(), (hashed_password or "").encode(), hashlib.sha256).hexdigest()[:16]
+
+def create_access_token(subject: Union[str, Any], expires_delta: timedelta = None, claims: Optional[Dict[str, Any]] = None) -> str:
     # Usamos timezone.utc para evitar advertencias en versiones nuevas de Python
     now = datetime.now(timezone.utc)
     
@@ -29,5 +41,15 @@ def create_access_token(subject: Union[str, Any], expires_delta: timedelta = Non
     
     # 'subject' suele ser el ID o email del usuario
     to_encode = {"exp": expire, "sub": str(subject)}
+    # Claims extra (ej: 'uid', 'sid') para resolver al usuario sin buscar por email
+    if claims:
+        to_encode.update(claims)
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
\ No newline at end of file
+    return encoded_jwt
+
+def create_stream_token(subject: Union[str, Any], user_id: int, sid: Optional[str] = None) -> str:
+    return create_access_token(
+        subject,
+        expires_delta=timedelta(seconds=STREAM_TOKEN_EXPIRE_SECONDS),
+        claims={"uid": user_id, "sid": sid, "scope": STREAM_TOKEN_SCOPE}
+    )
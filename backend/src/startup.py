@@ -0,0 +1,61 @@
+import logging
+import os
+import time
+
+from sqlalchemy.engine import Engine
+
+from .migrations import pending_migrations, run_migrations
+from .pool_budget import describe, pool_capacity
+
+logger = logging.getLogger("startup")
+
+# ==========================================
+#        ARRANQUE RÁPIDO (COLD START)
+# ==========================================
+# Importar src.main ya no toca la base de datos. Todo lo que necesita
+# conexión corre en el lifespan de FastAPI, antes de aceptar peticiones:
+#   - MIGRATE_ON_STARTUP=1 (por defecto): aplica migraciones pendientes.
+#     Con =0 solo revisa si hay pendientes y lo advierte (para hostings
+#     donde las migraciones corren en un paso de release:
+#     "python -m src.migrations").
+#   - POOL_WARMUP: cuántas conexiones del pool se abren de antemano, así
+#     la primera petición no paga el handshake TCP/TLS con la base.
+# Los módulos pesados (google.genai, openpyxl) se importan recién en su
+# primer uso (ver ai.py, exports.py, product_import.py).
+
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1").lower() in ("1", "true", "yes")
+POOL_WARMUP = int(os.getenv("POOL_WARMUP", "2"))
+
+def check_schema(engine: Engine, migrate: bool = MIGRATE_ON_STARTUP):
+    if migrate:
+        applied = run_migrations(engine)
+        if applied:
+            logger.info("Migraciones aplicadas al arrancar: %s", applied)
+        return
+
+    pending = pending_migrations(engine)
+    if pending:
+        logger.warning(
+            "Hay migraciones pendientes (%s). Ejecuta: python -m src.migrations",
+            ", ".join(f"{version:04d}_{name}" for version, name, _ in pending)
+        )
+
+def warm_pool(engine: Engine, connections: int = POOL_WARMUP):
+    """Abre `connections` conexiones a la vez y las devuelve al pool ya listas."""
+    # Sin pool propio (NullPool / PgBouncer) no hay nada que precalentar
+    connections = min(connections, pool_capacity(engine))
+    opened = []
+    try:
+        for _ in range(max(connections, 0)):
+            conn = engine.connect()
+            opened.append(conn)
+            conn.exec_driver_sql("SELECT 1")
+    finally:
+        for conn in opened:
+            conn.close()
+
+def prepare_database(engine: Engine, migration_engine: Engine = None):
+    started = time.perf_counter()
+    check_schema(migration_engine or engine)
+    warm_pool(engine)
+    logger.info("Base de datos lista en %.0f ms (%s)", (time.perf_counter() - started) * 1000, describe(engine))
@@ -0,0 +1,137 @@
+from datetime import date, datetime, timedelta
+from typing import Dict, Any
+
+from sqlalchemy import func, desc, case, or_
+from sqlalchemy.orm import Session
+
+from .models import Product, Sale, SaleItem, DailySalesRollup
+
+# ==========================================
+#     MOTOR DE ESTADÍSTICAS DE VENTAS
+# ==========================================
+# Antes /sales/stats hacía ~10 consultas sueltas + 1 por cada venta del
+# historial (lazy-load de sale.items). Aquí todo se resuelve con consultas
+# agrupadas usando agregados condicionales (SUM(CASE ...)):
+#   1. KPIs (ingresos, utilidad, unidades, medios de pago) desde el resumen
+#      diario DailySalesRollup, que mantiene create_sale (ver rollups.py)
+#   2. Historial con conteo/utilidad por venta en un solo GROUP BY
+#   3. Top productos del mes
+
+LOW_STOCK_THRESHOLD = 5 # Bajo este stock un producto se considera crítico
+
+def _periods(now: datetime) -> Dict[str, datetime]:
+    start_of_day = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    start_of_month = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    start_of_week = start_of_day - timedelta(days=start_of_day.weekday())
+    return {"day": start_of_day, "week": start_of_week, "month": start_of_month}
+
+def _payment_filters(column):
+    # Mismo criterio flexible que antes (mayúsculas / con o sin tilde)
+    pm = func.lower(func.coalesce(column, ""))
+    is_cash = pm.like("%efectivo%")
+    is_debit = or_(pm.like("%debito%"), pm.like("%débito%"))
+    return is_cash, is_debit
+
+def rollup_kpis(db: Session, user_id: int, today: date, month_start: date) -> Dict[str, Any]:
+    """Todos los KPIs del encabezado leyendo el resumen diario (pocas filas por usuario)."""
+    R = DailySalesRollup
+    in_month = R.day >= month_start
+    is_cash, is_debit = _payment_filters(R.payment_method)
+    row = db.query(
+        func.sum(case((R.day == today, R.revenue), else_=0)),
+        func.sum(case((in_month, R.revenue), else_=0)),
+        func.sum(case((in_month, R.transactions), else_=0)),
+        func.sum(case((in_month, R.profit), else_=0)),
+        func.sum(R.profit),
+        func.sum(case((in_month, R.units), else_=0)),
+        func.sum(case((in_month & is_cash, R.transactions), else_=0)),
+        func.sum(case((in_month & is_debit & ~is_cash, R.transactions), else_=0)),
+    ).filter(R.user_id == user_id).one()
+
+    return {
+        "today_income": row[0] or 0,
+        "month_income": row[1] or 0,
+        "transactions": row[2] or 0,
+        "month_profit": row[3] or 0,
+        "total_profit": row[4] or 0,
+        "items_sold": row[5] or 0,
+        "payment_methods": {"efectivo": row[6] or 0, "debito": row[7] or 0},
+    }
+
+def sales_history(db: Session, user_id: int, range: str, periods: Dict[str, datetime]):
+    """Historial de ventas con items y utilidad agregados en la misma consulta (sin N+1)."""
+    # 1. Primero las ventas del rango (o las 20 más nuevas) sobre el índice
+    #    (user_id, date); así el JOIN/GROUP BY con los items solo toca esas
+    #    filas y no todo el historial del usuario
+    sales = db.query(
+        Sale.id, Sale.date, Sale.total_amount, Sale.payment_method
+    ).filter(Sale.user_id == user_id)
+
+    if range == "daily":
+        sales = sales.filter(Sale.date >= periods["day"])
+    elif range == "weekly":
+        sales = sales.filter(Sale.date >= periods["week"])
+    elif range == "monthly":
+        sales = sales.filter(Sale.date >= periods["month"])
+    else:
+        sales = sales.order_by(Sale.date.desc(), Sale.id.desc()).limit(20)
+    sales = sales.subquery()
+
+    # 2. Agregado de items solo para esas ventas
+    item_count = func.coalesce(func.sum(SaleItem.quantity), 0)
+    profit = func.coalesce(
+        func.sum((SaleItem.unit_price - func.coalesce(SaleItem.cost_price, 0)) * SaleItem.quantity), 0
+    )
+    query = db.query(
+        sales.c.id, sales.c.date, sales.c.total_amount, sales.c.payment_method, item_count, profit
+    ).outerjoin(SaleItem, SaleItem.sale_id == sales.c.id).group_by(
+        sales.c.id, sales.c.date, sales.c.total_amount, sales.c.payment_method
+    ).order_by(sales.c.date.desc(), sales.c.id.desc())
+
+    return [
+        {
+            "id": r[0],
+            "date": r[1],
+            "total": r[2],
+            "items_count": r[4],
+            "payment_method": r[3] or "Efectivo",
+            "profit": r[5]
+        }
+        for r in query.all()
+    ]
+
+def top_products(db: Session, user_id: int, start_of_month: datetime, limit: int = 5):
+    rows = db.query(
+        Product.name,
+        func.sum(SaleItem.quantity).label("total_sold")
+    ).join(SaleItem.product).join(SaleItem.sale).filter(
+        Sale.user_id == user_id,
+        Sale.date >= start_of_month
+    ).group_by(Product.name).order_by(desc("total_sold")).limit(limit).all()
+
+    return [{"name": t[0], "sold": t[1]} for t in rows]
+
+def compute_sales_stats(db: Session, user_id: int, range: str = "recent", now: datetime = None) -> Dict[str, Any]:
+    """Arma la respuesta completa de /sales/stats con 3 consultas fijas, sin importar el volumen."""
+    periods = _periods(now or datetime.now())
+
+    kpis = rollup_kpis(db, user_id, periods["day"].date(), periods["month"].date())
+
+    transactions = kpis["transactions"]
+    month_income = kpis["month_income"]
+    month_profit = kpis["month_profit"]
+
+    items_per_basket = round(kpis["items_sold"] / transactions, 1) if transactions > 0 else 0
+    margin_percent = round((month_profit / month_income * 100), 1) if month_income > 0 else 0
+
+    return {
+        "today_income": kpis["today_income"],
+        "month_income": month_income,
+        "month_profit": month_profit,
+        "total_profit": kpis["total_profit"],
+        "sales_history": sales_history(db, user_id, range, periods),
+        "top_products": top_products(db, user_id, periods["month"]),
+        "items_per_basket": items_per_basket,
+        "margin_percent": margin_percent,
+        "payment_methods": kpis["payment_methods"]
+    }
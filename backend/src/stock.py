@@ -0,0 +1,107 @@
+from datetime import datetime
+from typing import Any, Dict, List
+
+from sqlalchemy import insert, update, bindparam
+from sqlalchemy.orm import Session
+
+from .conditional import bump_catalog_version
+from .events import publish_user_event, stock_event
+from .inventory import adjust_valuation, stock_value
+from .models import Product, MovementHistory
+
+# ==========================================
+#     MOVIMIENTOS DE STOCK EN LOTE (ESCÁNER)
+# ==========================================
+# Una sesión de escáner (ej: toma de inventario de 2.000 items) se envía
+# en UNA petición:
+#   1. Todos los códigos se resuelven con un solo IN (...) y FOR UPDATE,
+#      solo dentro del inventario del usuario autenticado.
+#   2. Los movimientos se aplican en orden sobre el stock en memoria (un
+#      mismo código puede venir varias veces).
+#   3. Stock final con un UPDATE en lote, historial con un INSERT masivo,
+#      ajuste de la valorización y un único commit.
+# Cada línea recibe su resultado (ok / no encontrado / inválido).
+
+VALID_MOVEMENTS = ("suma", "resta", "set")
+MAX_BATCH_SIZE = 5000
+
+_set_stock = (
+    update(Product.__table__)
+    .where(Product.__table__.c.id == bindparam("pid"))
+    .values(stock=bindparam("new_stock"))
+)
+
+def _apply_movement(stock: int, movement_type: str, quantity: int) -> int:
+    # Misma regla que /update-stock: "resta" nunca deja stock negativo
+    if movement_type == "suma":
+        return stock + quantity
+    if movement_type == "resta":
+        return max(stock - quantity, 0)
+    return quantity
+
+def apply_stock_batch(db: Session, user_id: int, movements: List[Any], all_or_nothing: bool = False) -> Dict[str, Any]:
+    """Aplica una lista de movimientos (barcode, movement_type, quantity) en una transacción."""
+    barcodes = {m.barcode for m in movements}
+    products = db.query(Product).filter(
+        Product.user_id == user_id,
+        Product.barcode.in_(barcodes)
+    ).order_by(Product.id).with_for_update().all()
+    by_barcode = {p.barcode: p for p in products}
+
+    stock = {p.id: p.stock for p in products}
+    results = []
+    history = []
+    now = datetime.now()
+
+    for index, movement in enumerate(movements):
+        product = by_barcode.get(movement.barcode)
+        line = {"index": index, "barcode": movement.barcode}
+
+        if product is None:
+            results.append({**line, "status": "not_found", "detail": "Producto no encontrado"})
+            continue
+        if movement.movement_type not in VALID_MOVEMENTS or movement.quantity < 0:
+            results.append({**line, "status": "invalid", "detail": "Movimiento o cantidad inválida"})
+            continue
+
+        stock[product.id] = _apply_movement(stock[product.id], movement.movement_type, movement.quantity)
+        history.append({
+            "product_id": product.id,
+            "user_id": user_id,
+            "movement_type": movement.movement_type,
+            "quantity_changed": movement.quantity,
+            "final_stock": stock[product.id],
+            "timestamp": now,
+        })
+        results.append({**line, "status": "ok", "product_id": product.id, "final_stock": stock[product.id]})
+
+    failed = sum(1 for r in results if r["status"] != "ok")
+    if all_or_nothing and failed:
+        db.rollback()
+        for r in results:
+            if r["status"] == "ok":
+                r["status"] = "skipped"
+                r.pop("final_stock", None)
+        return {"applied": 0, "failed": failed, "results": results}
+
+    try:
+        changed = [
+            {"pid": p.id, "new_stock": stock[p.id]}
+            for p in products if stock[p.id] != p.stock
+        ]
+        if changed:
+            db.execute(_set_stock, changed)
+            adjust_valuation(db, user_id, sum(
+                stock_value(stock[p.id] - p.stock, p.cost_price) for p in products
+            ))
+        if history:
+            db.execute(insert(MovementHistory), history)
+            bump_catalog_version(db, user_id)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if changed:
+        publish_user_event(user_id, stock_event([(c["pid"], c["new_stock"]) for c in changed]))
+    return {"applied": len(history), "failed": failed, "results": results}
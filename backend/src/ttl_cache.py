@@ -0,0 +1,58 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+# ==========================================
+#       LRU EN MEMORIA CON EXPIRACIÓN
+# ==========================================
+# Base común de las cachés del proceso: usuarios autenticados
+# (principals.py), respuestas (response_cache.MemoryBackend) e insights
+# de IA (ai_cache.py). Cada entrada vence a su TTL (reloj monotónico) y,
+# pasado `maxsize`, sale la usada hace más tiempo. Un lock simple la hace
+# segura desde el threadpool; en el event loop nunca está disputado.
+
+class TTLCache:
+    """LRU acotado con TTL por entrada."""
+
+    def __init__(self, maxsize: int, ttl: float = 0):
+        self.maxsize = maxsize
+        self.ttl = ttl # TTL por defecto de set()
+        self.evictions = 0
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        """Guarda `value` por `ttl` segundos (o el TTL por defecto). Con TTL <= 0 no guarda."""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
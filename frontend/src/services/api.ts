@@ -55,6 +55,56 @@ export const updateStock = async (data: {
   });
 };
 
+// Sesión de escáner completa en una sola petición (resultado por línea)
+export const updateStockBatch = async (
+  movements: { barcode: string; movement_type: string; quantity: number }[],
+  allOrNothing = false
+) => {
+  return request('/update-stock/batch', {
+    method: 'POST',
+    body: JSON.stringify({ movements, all_or_nothing: allOrNothing }),
+  });
+};
+
+// Cambios de stock / ventas / productos en vivo (Server-Sent Events).
+// EventSource no permite cabeceras: se pide un token corto (solo sirve para
+// el stream y vence en segundos) y ese va en la URL, nunca el token de sesión.
+// Si la conexión se cae y el navegador no puede reconectar (token vencido),
+// se pide otro token y se abre de nuevo.
+// Retorna la función para cerrar la conexión (ej: en el cleanup de un useEffect).
+export const subscribeEvents = (
+  onEvent: (event: { type: string; [key: string]: any }) => void
+) => {
+  let source: EventSource | null = null;
+  let closed = false;
+  let retry: ReturnType<typeof setTimeout> | undefined;
+
+  const open = async () => {
+    try {
+      const { stream_token } = await request('/events/token', { method: 'POST' });
+      if (closed) return;
+      source = new EventSource(`${API_URL}/events/stream?stream_token=${encodeURIComponent(stream_token)}`);
+      ['stock', 'sale', 'product', 'catalog', 'resync'].forEach((type) => {
+        source!.addEventListener(type, (e) => onEvent(JSON.parse((e as MessageEvent).data)));
+      });
+      source.onerror = () => {
+        if (source?.readyState === EventSource.CLOSED && !closed) {
+          retry = setTimeout(open, 3000);
+        }
+      };
+    } catch {
+      if (!closed) retry = setTimeout(open, 10000);
+    }
+  };
+
+  open();
+  return () => {
+    closed = true;
+    clearTimeout(retry);
+    source?.close();
+  };
+};
+
 export const createTicket = async (data: { user_id: number; issue_type: string; message: string }) => {
   return request('/tickets', {
     method: 'POST',